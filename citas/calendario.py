@@ -0,0 +1,123 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.exportaciones import tamano_lote
+
+from . import catalogos
+from .models import Cita
+
+VISTAS = ('semana', 'mes')
+
+# Columnas que necesita el calendario; nombre y apellido salen del JOIN con pacientes y el color
+# del catálogo de estados, así cada rango se resuelve con una sola consulta sobre (fecha, hora_inicio)
+CAMPOS = ('id', 'fecha', 'hora_inicio', 'hora_fin', 'estado_id', 'tipo_cita_id', 'paciente__nombre', 'paciente__apellido')
+
+
+def rango(vista, fecha):
+    """Devuelve (desde, hasta), inclusive, de la semana (lunes a domingo) o del mes que contiene `fecha`."""
+    if vista == 'semana':
+        desde = fecha - datetime.timedelta(days=fecha.weekday())
+        return desde, desde + datetime.timedelta(days=6)
+    desde = fecha.replace(day=1)
+    siguiente = (desde + datetime.timedelta(days=32)).replace(day=1)
+    return desde, siguiente - datetime.timedelta(days=1)
+
+
+def citas_del_rango(desde, hasta):
+    return (
+        Cita.objects
+        .filter(fecha__gte=desde, fecha__lte=hasta)
+        .order_by('fecha', 'hora_inicio', 'id')
+        .values_list(*CAMPOS)
+    )
+
+
+def eventos(desde, hasta):
+    """Citas del rango en formato compacto para dibujar el calendario en el navegador."""
+    estados = catalogos.filas('estados')
+    tipos = catalogos.filas('tipos_cita')
+    resultado = []
+    for cita_id, fecha, inicio, fin, estado_id, tipo_id, nombre, apellido in citas_del_rango(desde, hasta):
+        estado = estados.get(estado_id, {})
+        resultado.append({
+            'id': cita_id,
+            'fecha': fecha.isoformat(),
+            'inicio': inicio.strftime('%H:%M'),
+            'fin': fin.strftime('%H:%M'),
+            'paciente': f'{nombre} {apellido}',
+            'tipo': tipos.get(tipo_id, {}).get('nombre'),
+            'estado': estado.get('nombre'),
+            'color': estado.get('color'),
+        })
+    return resultado
+
+
+# --- iCalendar (RFC 5545) --- #
+
+def _escapar(texto):
+    return (
+        str(texto).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _plegar(linea):
+    # Las líneas no pueden superar 75 octetos; las continuaciones empiezan con un espacio
+    datos = linea.encode('utf-8')
+    partes = []
+    while len(datos) > 75:
+        corte = 75 if not partes else 74
+        # No partir un carácter multibyte por la mitad
+        while corte > 0 and (datos[corte] & 0xC0) == 0x80:
+            corte -= 1
+        partes.append(datos[:corte])
+        datos = datos[corte:]
+    partes.append(datos)
+    return b'\r\n '.join(partes).decode('utf-8') + '\r\n'
+
+
+def _utc(fecha, hora):
+    momento = timezone.make_aware(datetime.datetime.combine(fecha, hora))
+    return momento.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def lineas_ics(desde, hasta, dominio):
+    """
+    Genera el calendario cita a cita para enviarlo con StreamingHttpResponse: las citas se leen
+    por lotes con .iterator(), así que ni el queryset ni el archivo completo quedan en memoria.
+    """
+    estados = catalogos.filas('estados')
+    tipos = catalogos.filas('tipos_cita')
+    sello = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    yield ''.join(_plegar(linea) for linea in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Servicio Medico//Citas//ES',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_escapar(f"Citas {desde:%d/%m/%Y} - {hasta:%d/%m/%Y}")}',
+    ))
+
+    libres = getattr(settings, 'CITAS_ESTADOS_LIBRES', ('Cancelada',))
+    citas = citas_del_rango(desde, hasta).iterator(chunk_size=tamano_lote())
+    for cita_id, fecha, inicio, fin, estado_id, tipo_id, nombre, apellido in citas:
+        estado = estados.get(estado_id, {}).get('nombre', '')
+        tipo = tipos.get(tipo_id, {}).get('nombre', '')
+        lineas = [
+            'BEGIN:VEVENT',
+            f'UID:cita-{cita_id}@{dominio}',
+            f'DTSTAMP:{sello}',
+            f'DTSTART:{_utc(fecha, inicio)}',
+            f'DTEND:{_utc(fecha, fin)}',
+            f'SUMMARY:{_escapar(f"{nombre} {apellido} - {tipo}")}',
+            f'DESCRIPTION:{_escapar(f"Estado: {estado}")}',
+        ]
+        if estado in libres:
+            lineas.append('STATUS:CANCELLED')
+        lineas.append('END:VEVENT')
+        # Un bloque por cita: evita enviar al servidor un fragmento por cada línea
+        yield ''.join(_plegar(linea) for linea in lineas)
+
+    yield _plegar('END:VCALENDAR')
@@ -0,0 +1,150 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import EstadoCita, TipoCita, MotivoCita, TipoNota
+
+# Catálogo -> (modelo, campos cargados). Son tablas pequeñas que casi nunca cambian.
+CATALOGOS = {
+    'estados': (EstadoCita, ('id', 'nombre', 'color')),
+    'tipos_cita': (TipoCita, ('id', 'nombre', 'duracion_estimada')),
+    'motivos': (MotivoCita, ('id', 'nombre')),
+    'tipos_nota': (TipoNota, ('id', 'nombre')),
+}
+CATALOGO_POR_MODELO = {modelo: nombre for nombre, (modelo, _) in CATALOGOS.items()}
+
+TIPO_NOTA_SISTEMA = 'Sistema'
+
+# Las filas viven en memoria del proceso; en la caché compartida solo se guarda la versión de
+# cada catálogo, que cambia al guardar o borrar una fila (ver citas.signals). Así todos los
+# procesos descartan su copia sin tener que serializar los catálogos completos.
+_locales = {}
+_lock = threading.Lock()
+
+
+def _clave_version(catalogo):
+    return f'citas:catalogos:{catalogo}:version'
+
+
+def _version(catalogo):
+    clave = _clave_version(catalogo)
+    version = cache.get(clave)
+    if version is None:
+        # Caché vacía o expulsada: una versión nueva invalida cualquier copia local previa
+        cache.add(clave, time.time_ns(), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def filas(catalogo, recargar=False):
+    """
+    Devuelve {id: {campo: valor}} del catálogo, recargándolo si su versión cambió o si se
+    pide `recargar` (p. ej. al buscar una fila que la copia local todavía no tiene).
+    """
+    ahora = time.monotonic()
+    local = _locales.get(catalogo)
+    # CATALOGOS_CACHE_TIMEOUT acota la vida de la copia local aunque no llegue una invalidación
+    vigente = local is not None and ahora - local[2] < getattr(settings, 'CATALOGOS_CACHE_TIMEOUT', 3600)
+    # La versión vive en la caché compartida (una consulta con DatabaseCache): se revisa como
+    # mucho cada CATALOGOS_REVISION_VERSION segundos. Una fila nueva no espera a la revisión,
+    # porque fila() e id_por_nombre() recargan ante un id o nombre desconocido; los que siguen
+    # sin aparecer tras la recarga se recuerdan hasta la revisión siguiente.
+    if not recargar and vigente and ahora - local[3] < getattr(settings, 'CATALOGOS_REVISION_VERSION', 5):
+        return local[1]
+
+    version = _version(catalogo)
+    if not recargar and vigente and version is not None and local[0] == version:
+        with _lock:
+            _locales[catalogo] = (version, local[1], local[2], ahora, set())
+        return local[1]
+
+    modelo, campos = CATALOGOS[catalogo]
+    datos = {fila['id']: fila for fila in modelo.objects.values(*campos)}
+    # Una recarga por una fila desconocida no es una revisión: los fallos recordados se mantienen
+    fallos = local[4] if recargar and local is not None else set()
+    with _lock:
+        _locales[catalogo] = (version, datos, ahora, ahora, fallos)
+    return datos
+
+
+def ids(catalogo):
+    """Devuelve {nombre: id} del catálogo."""
+    return {fila['nombre']: id_fila for id_fila, fila in filas(catalogo).items()}
+
+
+def _buscar(catalogo, clave, buscar):
+    """
+    Aplica `buscar` a las filas del catálogo. Una fila que falta puede ser nueva y la
+    invalidación aún no llegó a este proceso (o se perdió): antes de darla por inexistente se
+    recarga el catálogo una vez, y si sigue faltando no se vuelve a recargar por la misma
+    `clave` hasta la próxima revisión de la versión.
+    """
+    resultado = buscar(filas(catalogo))
+    local = _locales.get(catalogo)
+    if resultado is not None or (local is not None and clave in local[4]):
+        return resultado
+
+    resultado = buscar(filas(catalogo, recargar=True))
+    if resultado is None:
+        with _lock:
+            local = _locales.get(catalogo)
+            if local is not None:
+                local[4].add(clave)
+    return resultado
+
+
+def id_por_nombre(catalogo, nombre):
+    def buscar(datos):
+        return next((id_fila for id_fila, fila in datos.items() if fila['nombre'] == nombre), None)
+    return _buscar(catalogo, ('nombre', nombre), buscar)
+
+
+def fila(catalogo, id_fila):
+    try:
+        id_fila = int(id_fila)
+    except (TypeError, ValueError):
+        return None
+    return _buscar(catalogo, ('id', id_fila), lambda datos: datos.get(id_fila))
+
+
+def invalidar(catalogo):
+    # La copia de este proceso se descarta ya; los demás la descartan al revisar la versión
+    with _lock:
+        _locales.pop(catalogo, None)
+    clave = _clave_version(catalogo)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), timeout=None)
+
+
+# --- Atajos usados por las vistas --- #
+
+def ids_estados():
+    return ids('estados')
+
+
+def id_estado(nombre):
+    return id_por_nombre('estados', nombre)
+
+
+def estado(estado_id):
+    return fila('estados', estado_id)
+
+
+def invalidar_estados():
+    invalidar('estados')
+
+
+def id_tipo_nota_sistema():
+    """Id del TipoNota de las notas automáticas; se crea la primera vez que hace falta."""
+    tipo_nota_id = id_por_nombre('tipos_nota', TIPO_NOTA_SISTEMA)
+    if tipo_nota_id is None:
+        tipo_nota, _ = TipoNota.objects.get_or_create(
+            nombre=TIPO_NOTA_SISTEMA,
+            defaults={'descripcion': 'Notas generadas automáticamente por el sistema'}
+        )
+        tipo_nota_id = tipo_nota.id
+    return tipo_nota_id
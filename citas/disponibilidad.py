@@ -0,0 +1,142 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .catalogos import id_estado
+from .models import Cita
+
+PREFIJO_CACHE = 'citas:ocupacion'
+
+def _minutos(hora):
+    if isinstance(hora, str):
+        hora = datetime.time.fromisoformat(hora)
+    return hora.hour * 60 + hora.minute
+
+
+def _hora(minutos):
+    return f'{minutos // 60:02d}:{minutos % 60:02d}'
+
+
+def clave_ocupacion(fecha):
+    return f'{PREFIJO_CACHE}:{fecha.isoformat()}'
+
+
+def invalidar(*fechas):
+    cache.delete_many([clave_ocupacion(fecha) for fecha in fechas if fecha])
+
+
+def horario(fecha):
+    """
+    Tramos de atención del día como [(inicio, fin)] en minutos desde medianoche, según
+    settings.CITAS_HORARIO (los días sin entrada no tienen atención).
+    """
+    tramos = settings.CITAS_HORARIO.get(fecha.weekday(), [])
+    return [(_minutos(inicio), _minutos(fin)) for inicio, fin in tramos]
+
+
+def _segmentos(intervalos):
+    """
+    Barrido de eventos: convierte los intervalos ocupados de un día en segmentos disjuntos
+    [(inicio, fin, citas_simultaneas)], ordenados y sin huecos de ocupación cero.
+    """
+    eventos = {}
+    for inicio, fin in intervalos:
+        eventos[inicio] = eventos.get(inicio, 0) + 1
+        eventos[fin] = eventos.get(fin, 0) - 1
+
+    segmentos = []
+    activos = 0
+    anterior = None
+    for minuto in sorted(eventos):
+        if activos > 0 and anterior is not None and minuto > anterior:
+            segmentos.append((anterior, minuto, activos))
+        activos += eventos[minuto]
+        anterior = minuto
+    return segmentos
+
+
+def ocupacion(fechas):
+    """
+    Devuelve {fecha: segmentos} para las fechas pedidas. Las que no están en caché se
+    resuelven con una sola consulta sobre el índice (fecha, hora_inicio).
+    """
+    fechas = list(fechas)
+    en_cache = cache.get_many([clave_ocupacion(fecha) for fecha in fechas])
+    resultado = {fecha: en_cache[clave_ocupacion(fecha)] for fecha in fechas if clave_ocupacion(fecha) in en_cache}
+
+    faltantes = [fecha for fecha in fechas if fecha not in resultado]
+    if faltantes:
+        citas = Cita.objects.filter(fecha__in=faltantes)
+        for nombre in getattr(settings, 'CITAS_ESTADOS_LIBRES', ('Cancelada',)):
+            estado_id = id_estado(nombre)
+            if estado_id is not None:
+                citas = citas.exclude(estado_id=estado_id)
+
+        intervalos = {fecha: [] for fecha in faltantes}
+        for fecha, hora_inicio, hora_fin in citas.values_list('fecha', 'hora_inicio', 'hora_fin'):
+            intervalos[fecha].append((_minutos(hora_inicio), _minutos(hora_fin)))
+
+        nuevos = {fecha: _segmentos(intervalos[fecha]) for fecha in faltantes}
+        cache.set_many(
+            {clave_ocupacion(fecha): segmentos for fecha, segmentos in nuevos.items()},
+            getattr(settings, 'CITAS_DISPONIBILIDAD_CACHE_TIMEOUT', 300),
+        )
+        resultado.update(nuevos)
+    return resultado
+
+
+def _turnos_del_dia(tramos, segmentos, duracion, paso, capacidad, desde_minuto=0):
+    turnos = []
+    for apertura, cierre in tramos:
+        # Los segmentos están ordenados: basta un índice que avanza junto con los turnos
+        indice = 0
+        inicio = apertura
+        while inicio + duracion <= cierre:
+            if inicio >= desde_minuto:
+                fin = inicio + duracion
+                while indice < len(segmentos) and segmentos[indice][1] <= inicio:
+                    indice += 1
+                libre = True
+                j = indice
+                while j < len(segmentos) and segmentos[j][0] < fin:
+                    if segmentos[j][2] >= capacidad:
+                        libre = False
+                        break
+                    j += 1
+                if libre:
+                    turnos.append({'inicio': _hora(inicio), 'fin': _hora(fin)})
+            inicio += paso
+    return turnos
+
+
+def turnos_disponibles(desde, hasta, duracion=None):
+    """
+    Turnos libres entre `desde` y `hasta` (inclusive) para una cita de `duracion` minutos.
+
+    Devuelve [{'fecha': date, 'turnos': [{'inicio': 'HH:MM', 'fin': 'HH:MM'}]}]. Un turno está
+    libre si en ningún momento se alcanza CITAS_CAPACIDAD citas simultáneas. En el día de hoy
+    solo se ofrecen turnos que aún no han comenzado.
+    """
+    duracion = duracion or getattr(settings, 'CITAS_DURACION_POR_DEFECTO', 30)
+    paso = getattr(settings, 'CITAS_INTERVALO_TURNOS', 15)
+    capacidad = getattr(settings, 'CITAS_CAPACIDAD', 1)
+
+    fechas = [desde + datetime.timedelta(days=n) for n in range((hasta - desde).days + 1)]
+    laborables = [fecha for fecha in fechas if horario(fecha)]
+    ocupados = ocupacion(laborables)
+
+    ahora = timezone.localtime()
+    dias = []
+    for fecha in fechas:
+        desde_minuto = 0
+        if fecha == ahora.date():
+            desde_minuto = ahora.hour * 60 + ahora.minute + 1
+        elif fecha < ahora.date():
+            desde_minuto = 24 * 60
+        dias.append({
+            'fecha': fecha,
+            'turnos': _turnos_del_dia(horario(fecha), ocupados.get(fecha, []), duracion, paso, capacidad, desde_minuto),
+        })
+    return dias
@@ -57,34 +57,28 @@ class CitaForm(forms.ModelForm):
         fecha = cleaned_data.get('fecha')
         hora_inicio = cleaned_data.get('hora_inicio')
         hora_fin = cleaned_data.get('hora_fin')
-        paciente = cleaned_data.get('paciente')
 
         # Validar que la hora de fin sea posterior a la hora de inicio
         if hora_inicio and hora_fin and hora_fin <= hora_inicio:
             raise ValidationError('La hora de fin debe ser posterior a la hora de inicio.')
 
-        # Validar que no haya citas solapadas para el mismo paciente
-        if fecha and hora_inicio and hora_fin and paciente:
-            citas_solapadas = Cita.objects.filter(
-                paciente=paciente,
-                fecha=fecha,
-                hora_inicio__lt=hora_fin,
-                hora_fin__gt=hora_inicio
-            )
-            
-            # Excluir la instancia actual si estamos editando
-            if self.instance.pk:
-                citas_solapadas = citas_solapadas.exclude(pk=self.instance.pk)
-                
-            if citas_solapadas.exists():
-                raise ValidationError('El paciente ya tiene una cita programada en este horario.')
-
         # Validar que la fecha no sea en el pasado SOLO para nuevas citas
         if not self.instance.pk and fecha and fecha < timezone.now().date():
             raise ValidationError('No se pueden programar citas en fechas pasadas.')
 
         return cleaned_data
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sin validate_unique ni las restricciones de Meta: el solapamiento (y la unicidad
+        # paciente/fecha/hora) lo garantiza citas_sin_solapamiento en la base de datos y las
+        # vistas traducen el IntegrityError a MENSAJE_SOLAPAMIENTO. Así se evita una consulta
+        # de verificación previa en cada guardado.
+        self.instance.validar_restricciones = False
+
+    def validate_unique(self):
+        pass
+
     def clean_fecha(self):
         fecha = self.cleaned_data.get('fecha')
         # Validar que la fecha no sea en el pasado SOLO para nuevas citas
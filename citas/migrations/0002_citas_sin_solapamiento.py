@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:50
+
+import citas.models
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+
+
+def verificar_solapamientos(apps, schema_editor):
+    """
+    Aborta la migración con un mensaje claro si ya existen citas solapadas,
+    en lugar del error genérico de PostgreSQL al crear la restricción.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT a.id, b.id
+            FROM citas a
+            JOIN citas b ON a.paciente_id = b.paciente_id AND a.id < b.id AND a.fecha = b.fecha
+            WHERE a.hora_inicio < b.hora_fin AND b.hora_inicio < a.hora_fin
+            ORDER BY a.id, b.id
+            LIMIT 20
+            """
+        )
+        pares = cursor.fetchall()
+    if pares:
+        listado = ', '.join(f'{a}/{b}' for a, b in pares)
+        raise RuntimeError(
+            f'Existen citas solapadas para un mismo paciente (ids {listado}). '
+            'Corrija o cancele esas citas antes de aplicar esta migración.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0001_initial'),
+    ]
+
+    operations = [
+        # Necesaria para combinar la igualdad sobre paciente_id con && sobre rangos en un índice GiST
+        BtreeGistExtension(),
+        migrations.RunPython(verificar_solapamientos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[('paciente', '='), (citas.models.RangoHorario('fecha', 'hora_inicio', 'hora_fin'), '&&')], name='citas_sin_solapamiento', violation_error_message='El paciente ya tiene una cita programada en este horario.'),
+        ),
+    ]
@@ -1,6 +1,34 @@
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
 from django.db import models
 from pacientes.models import Paciente
 
+MENSAJE_SOLAPAMIENTO = 'El paciente ya tiene una cita programada en este horario.'
+
+
+def es_solapamiento(exc):
+    """Indica si un IntegrityError viene de citas_sin_solapamiento o de la unicidad paciente/fecha/hora."""
+    causa = getattr(exc, '__cause__', None)
+    codigo = getattr(causa, 'pgcode', None)
+    restriccion = getattr(getattr(causa, 'diag', None), 'constraint_name', None) or ''
+    if codigo == '23P01':  # exclusion_violation
+        return restriccion == 'citas_sin_solapamiento'
+    return codigo == '23505' and restriccion.startswith('citas_paciente_id_fecha_hora_inicio')
+
+
+class RangoHorario(models.Func):
+    # tsrange(fecha + hora_inicio, fecha + hora_fin), semiabierto [inicio, fin)
+    function = 'TSRANGE'
+    output_field = DateTimeRangeField()
+
+    def __init__(self, fecha, hora_inicio, hora_fin, **extra):
+        super().__init__(
+            models.ExpressionWrapper(models.F(fecha) + models.F(hora_inicio), output_field=models.DateTimeField()),
+            models.ExpressionWrapper(models.F(fecha) + models.F(hora_fin), output_field=models.DateTimeField()),
+            **extra,
+        )
+
+
 class EstadoCita(models.Model):
     nombre = models.CharField(max_length=50, unique=True)
     descripcion = models.TextField(blank=True, null=True)
@@ -59,10 +87,36 @@ class Cita(models.Model):
     
     def __str__(self):
         return f"Cita de {self.paciente} el {self.fecha} a las {self.hora_inicio}"
+
+    # False: full_clean() no consulta las restricciones de Meta y se deja a la base de datos
+    # rechazar el solapamiento al guardar (ver CitaForm)
+    validar_restricciones = True
+
+    def validate_constraints(self, exclude=None):
+        if self.validar_restricciones:
+            super().validate_constraints(exclude=exclude)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Fecha con la que se cargó: si la cita se mueve de día hay que liberar también el anterior
+        instancia._fecha_original = instancia.__dict__.get('fecha')
+        return instancia
     
     class Meta:
         db_table = 'citas'
         unique_together = ('paciente', 'fecha', 'hora_inicio')
+        constraints = [
+            # Un paciente no puede tener dos citas que se solapen (índice GiST, requiere btree_gist)
+            ExclusionConstraint(
+                name='citas_sin_solapamiento',
+                expressions=[
+                    ('paciente', RangeOperators.EQUAL),
+                    (RangoHorario('fecha', 'hora_inicio', 'hora_fin'), RangeOperators.OVERLAPS),
+                ],
+                violation_error_message=MENSAJE_SOLAPAMIENTO,
+            ),
+        ]
         indexes = [
             models.Index(fields=['fecha', 'hora_inicio']),
             models.Index(fields=['estado']),
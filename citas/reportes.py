@@ -0,0 +1,7 @@
+from .models import Cita
+
+
+def contexto_citas(parametros):
+    return {
+        'citas': Cita.objects.all().select_related('paciente', 'tipo_cita', 'motivo', 'estado').order_by('-fecha', '-hora_inicio'),
+    }
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Cita, EstadoCita, TipoCita, MotivoCita, TipoNota
+from . import catalogos, disponibilidad
+
+
+@receiver(post_save, sender=EstadoCita)
+@receiver(post_delete, sender=EstadoCita)
+@receiver(post_save, sender=TipoCita)
+@receiver(post_delete, sender=TipoCita)
+@receiver(post_save, sender=MotivoCita)
+@receiver(post_delete, sender=MotivoCita)
+@receiver(post_save, sender=TipoNota)
+@receiver(post_delete, sender=TipoNota)
+def invalidar_catalogo(sender, instance, **kwargs):
+    """
+    Cambia la versión del catálogo para que cada proceso recargue su copia local
+    """
+    catalogo = catalogos.CATALOGO_POR_MODELO[sender]
+    transaction.on_commit(lambda: catalogos.invalidar(catalogo))
+
+
+@receiver(post_save, sender=Cita)
+@receiver(post_delete, sender=Cita)
+def invalidar_ocupacion(sender, instance, **kwargs):
+    """
+    Descarta la ocupación cacheada del día de la cita (y del día original si se movió)
+    """
+    fechas = (instance.fecha, getattr(instance, '_fecha_original', None))
+    transaction.on_commit(lambda: disponibilidad.invalidar(*fechas))
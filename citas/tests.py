@@ -1,3 +1,175 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from pacientes.models import Paciente
+
+from . import catalogos
+from .forms import CitaForm
+from .models import Cita, EstadoCita, MotivoCita, TipoCita
+from .views import estadisticas_citas
+
+# Caché local en las pruebas: con DatabaseCache cada lectura de la caché también sería una consulta
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def _invalidar_catalogos():
+    # El rollback de cada prueba no dispara las invalidaciones de on_commit
+    for catalogo in catalogos.CATALOGOS:
+        catalogos.invalidar(catalogo)
+
+
+@override_settings(CACHES=CACHE_LOCAL, CITAS_ESTADISTICAS_TTL=0)
+class IndexCitasConsultasTests(TestCase):
+    """El listado de citas resuelve los contadores por estado con un único agregado condicional."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin_citas', 'admin@example.com', 'clave-segura')
+        estados = [EstadoCita.objects.create(nombre=nombre) for nombre in ('Programada', 'Completada', 'Cancelada')]
+        cls.tipo = TipoCita.objects.create(nombre='Consulta general', duracion_estimada=30)
+        cls.motivo = MotivoCita.objects.create(nombre='Control')
+        cls.estados = estados
+        cls.paciente = Paciente.objects.create(
+            numero_documento='12345678', nombre='Ana', apellido='Pérez',
+            fecha_nacimiento=datetime.date(1990, 1, 1), genero='F',
+        )
+        for dia in range(6):
+            cls._crear_cita(dia)
+
+    @classmethod
+    def _crear_cita(cls, dia):
+        return Cita.objects.create(
+            paciente=cls.paciente, tipo_cita=cls.tipo, motivo=cls.motivo,
+            fecha=datetime.date(2025, 1, 1) + datetime.timedelta(days=dia),
+            hora_inicio=datetime.time(8), hora_fin=datetime.time(8, 30),
+            estado=cls.estados[dia % len(cls.estados)],
+        )
+
+    def setUp(self):
+        cache.clear()
+        _invalidar_catalogos()
+        self.client.force_login(self.usuario)
+
+    def _consultas_index(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(reverse('citas:index'))
+        self.assertEqual(response.status_code, 200)
+        return capturadas
+
+    def test_estadisticas_en_una_consulta(self):
+        catalogos.ids('estados')
+        with self.assertNumQueries(1):
+            estadisticas = estadisticas_citas()
+        self.assertEqual(estadisticas, {'total': 6, 'pendientes': 2, 'completadas': 2, 'canceladas': 2})
+
+    def test_index_numero_de_consultas_constante(self):
+        # Primera petición: carga sesión y catálogos en memoria del proceso
+        self._consultas_index()
+        # Sesión, usuario (con su perfil), página del listado, contadores, citas de hoy y
+        # estados para el modal
+        with self.assertNumQueries(6):
+            self.client.get(reverse('citas:index'))
+
+        agregados = [q['sql'] for q in self._consultas_index() if 'COUNT(' in q['sql'].upper()]
+        self.assertEqual(len(agregados), 1, agregados)
+
+        # Más citas no agregan consultas (ni contadores por estado ni N+1 en el listado)
+        antes = len(self._consultas_index())
+        for dia in range(6, 20):
+            self._crear_cita(dia)
+        with self.assertNumQueries(antes):
+            self.client.get(reverse('citas:index'))
+
+
+class CitaFormConsultasTests(TestCase):
+    """El formulario no consulta la tabla de citas: el solapamiento lo resuelve la restricción."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.paciente = Paciente.objects.create(
+            numero_documento='87654321', nombre='Luis', apellido='Gómez',
+            fecha_nacimiento=datetime.date(1985, 5, 5), genero='M',
+        )
+        cls.tipo = TipoCita.objects.create(nombre='Control', duracion_estimada=30)
+        cls.motivo = MotivoCita.objects.create(nombre='Seguimiento')
+        cls.estado = EstadoCita.objects.create(nombre='Programada')
+
+    def _datos(self):
+        return {
+            'paciente': self.paciente.pk, 'tipo_cita': self.tipo.pk, 'motivo': self.motivo.pk,
+            'fecha': (timezone.now().date() + datetime.timedelta(days=1)).isoformat(),
+            'hora_inicio': '09:00', 'hora_fin': '09:30', 'estado': self.estado.pk,
+        }
+
+    def test_validar_no_consulta_citas(self):
+        form = CitaForm(data=self._datos())
+        with CaptureQueriesContext(connection) as capturadas:
+            self.assertTrue(form.is_valid(), form.errors)
+        sobre_citas = [q['sql'] for q in capturadas if 'FROM "citas"' in q['sql']]
+        self.assertEqual(sobre_citas, [])
+
+    def test_validar_edicion_no_consulta_citas(self):
+        cita = CitaForm(data=self._datos()).save()
+        datos = dict(self._datos(), hora_fin='10:00')
+        form = CitaForm(data=datos, instance=cita)
+        with CaptureQueriesContext(connection) as capturadas:
+            self.assertTrue(form.is_valid(), form.errors)
+        sobre_citas = [q['sql'] for q in capturadas if 'FROM "citas"' in q['sql']]
+        self.assertEqual(sobre_citas, [])
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class CatalogosTests(TestCase):
+    """Una fila que la copia local no tiene se busca en la base antes de darla por inexistente."""
+
+    def setUp(self):
+        _invalidar_catalogos()
+
+    def test_estado_nuevo_sin_invalidacion(self):
+        programada = EstadoCita.objects.create(nombre='Programada')
+        self.assertEqual(catalogos.estado(programada.pk)['nombre'], 'Programada')
+
+        # bulk_create no emite señales: la versión del catálogo no cambia, como cuando la
+        # invalidación se hizo en otro proceso y no llegó a este
+        nuevo, = EstadoCita.objects.bulk_create([EstadoCita(nombre='Confirmada')])
+        self.assertEqual(catalogos.estado(nuevo.pk)['nombre'], 'Confirmada')
+        self.assertEqual(catalogos.id_estado('Confirmada'), nuevo.pk)
+        self.assertIsNone(catalogos.estado(nuevo.pk + 1000))
+
+    def test_fila_inexistente_no_recarga_de_nuevo(self):
+        EstadoCita.objects.create(nombre='Programada')
+        self.assertIsNone(catalogos.estado(1000))
+        self.assertIsNone(catalogos.id_estado('Inexistente'))
+
+        # Hasta la próxima revisión de la versión, los fallos no vuelven a la base
+        with self.assertNumQueries(0):
+            self.assertIsNone(catalogos.estado(1000))
+            self.assertIsNone(catalogos.id_estado('Inexistente'))
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class DisponibilidadTests(TestCase):
+    """Parámetros mal formados de la consulta de turnos libres."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin_turnos', 'turnos@example.com', 'clave-segura')
+
+    def setUp(self):
+        _invalidar_catalogos()
+        self.client.force_login(self.usuario)
+
+    def test_tipo_cita_no_numerico(self):
+        response = self.client.get(reverse('citas:disponibilidad'), {'tipo_cita': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tipo_cita_inexistente(self):
+        response = self.client.get(reverse('citas:disponibilidad'), {'tipo_cita': 999})
+        self.assertEqual(response.status_code, 404)
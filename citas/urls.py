@@ -11,6 +11,9 @@ urlpatterns = [
     path('<int:cita_id>/destroy/', views.destroy, name='destroy'),
     path('search/', views.search, name='search'),
     path('hoy/', views.citas_hoy, name='hoy'),
+    path('disponibilidad/', views.disponibilidad, name='disponibilidad'),
+    path('calendario/', views.calendario_citas, name='calendario'),
+    path('calendario/ics/', views.calendario_ics, name='calendario_ics'),
     path('<int:cita_id>/estado/<int:estado_id>/', views.cambiar_estado, name='cambiar_estado'),
     
     # URLs AJAX para crear tipos, motivos y estados
@@ -18,6 +21,7 @@ urlpatterns = [
     path('ajax/crear-motivo-cita/', views.crear_motivo_cita_ajax, name='crear_motivo_cita_ajax'),
     path('ajax/crear-estado-cita/', views.crear_estado_cita_ajax, name='crear_estado_cita_ajax'),
     path('ajax/cambiar-estado/', views.cambiar_estado_ajax, name='cambiar_estado_ajax'),
+    path('ajax/cambiar-estado-masivo/', views.cambiar_estado_masivo, name='cambiar_estado_masivo'),
 
     # URLs de Exportación
     path('exportar/pdf/', views.exportar_citas_pdf, name='exportar_citas_pdf'),
@@ -3,29 +3,60 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from django.utils import timezone
 from django.db.models import Q, Count
-from django.db import transaction
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse, Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 import json
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from io import BytesIO
 import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from sistema_medico.settings import BASE_DIR
+from django.conf import settings
+from django.core.cache import cache
 
 from django.contrib.auth.decorators import login_required
 
+from core.transacciones import atomic_con_reintentos, es_conflicto_serializacion
+from core.paginacion import KeysetPaginator
+from core.exportaciones import exportar_excel, tamano_lote
+from core.reportes import exportar_pdf
 from core.decorators import personal_medico_required
+from core import estadisticas as estadisticas_dashboard
 
-from .models import Cita, EstadoCita, TipoCita, MotivoCita, NotaCita, TipoNota
+from .models import Cita, EstadoCita, TipoCita, MotivoCita, NotaCita, MENSAJE_SOLAPAMIENTO, es_solapamiento
 from .forms import CitaForm, EstadoCitaForm, TipoCitaForm, MotivoCitaForm
+from . import calendario, catalogos
+from .catalogos import id_estado, id_tipo_nota_sistema
+from .disponibilidad import turnos_disponibles, invalidar as invalidar_ocupacion
 from pacientes.models import Paciente
+from pacientes.busqueda import buscar_pacientes
+
+CLAVE_ESTADISTICAS = 'citas:estadisticas_index'
+
+# Filtros de la vista index -> nombre del EstadoCita
+FILTROS_ESTADO = {
+    'pendientes': 'Programada',
+    'completadas': 'Completada',
+    'canceladas': 'Cancelada',
+}
+
+def estadisticas_citas():
+    """
+    Cuenta el total de citas y las de cada estado de FILTROS_ESTADO con un único
+    agregado condicional, cacheado durante CITAS_ESTADISTICAS_TTL segundos.
+    """
+    estadisticas = cache.get(CLAVE_ESTADISTICAS)
+    if estadisticas is None:
+        estadisticas = Cita.objects.aggregate(
+            total=Count('id'),
+            **{
+                filtro: Count('id', filter=Q(estado_id=id_estado(nombre)))
+                for filtro, nombre in FILTROS_ESTADO.items()
+            }
+        )
+        ttl = getattr(settings, 'CITAS_ESTADISTICAS_TTL', 30)
+        if ttl:
+            cache.set(CLAVE_ESTADISTICAS, estadisticas, ttl)
+    return estadisticas
 
 @personal_medico_required
 def index(request):
@@ -34,48 +65,38 @@ def index(request):
     query = request.GET.get('q')
     
     # Construir la consulta base para todas las citas
-    citas_list = Cita.objects.all().select_related('paciente', 'tipo_cita', 'motivo', 'estado').order_by('-fecha', '-hora_inicio')
+    citas_list = Cita.objects.all().select_related('paciente', 'tipo_cita', 'motivo', 'estado')
     
-    # Aplicar filtro por estado si se especifica
-    if estado_filtro:
-        if estado_filtro == 'pendientes':
-            citas_list = citas_list.filter(estado__nombre='Programada')
-        elif estado_filtro == 'completadas':
-            citas_list = citas_list.filter(estado__nombre='Completada')
-        elif estado_filtro == 'canceladas':
-            citas_list = citas_list.filter(estado__nombre='Cancelada')
+    # Aplicar filtro por estado si se especifica (por id, sin join contra estados_cita)
+    if estado_filtro in FILTROS_ESTADO:
+        citas_list = citas_list.filter(estado_id=id_estado(FILTROS_ESTADO[estado_filtro]))
     
     # Aplicar búsqueda si se especifica
     if query:
         citas_list = citas_list.filter(
-            Q(paciente__nombre__icontains=query) |
-            Q(paciente__apellido__icontains=query) |
+            Q(paciente__in=buscar_pacientes(query).values('id')) |
             Q(tipo_cita__nombre__icontains=query) |
             Q(motivo__nombre__icontains=query)
         )
     
-    # Paginación
-    paginator = Paginator(citas_list, 10)  # Mostrar 10 citas por página
-    page_number = request.GET.get('page')
-    citas = paginator.get_page(page_number)
+    # Paginación por clave sobre el índice (fecha, hora_inicio), sin OFFSET ni COUNT(*)
+    paginator = KeysetPaginator(citas_list, ('-fecha', '-hora_inicio', '-id'), 10)  # Mostrar 10 citas por página
+    citas = paginator.get_page(request.GET.get('cursor'))
     
     # Obtener citas de hoy
     hoy = timezone.now().date()
     citas_hoy = Cita.objects.filter(fecha=hoy).select_related('paciente', 'tipo_cita', 'motivo', 'estado').order_by('hora_inicio')
     
-    # Obtener estadísticas
-    total_citas = Cita.objects.count()
-    citas_pendientes = Cita.objects.filter(estado__nombre='Programada').count()
-    citas_completadas = Cita.objects.filter(estado__nombre='Completada').count()
-    citas_canceladas = Cita.objects.filter(estado__nombre='Cancelada').count()
+    # Obtener estadísticas en una sola consulta
+    estadisticas = estadisticas_citas()
     
     context = {
         'citas': citas,
         'citas_hoy': citas_hoy,
-        'total_citas': total_citas,
-        'citas_pendientes': citas_pendientes,
-        'citas_completadas': citas_completadas,
-        'citas_canceladas': citas_canceladas,
+        'total_citas': estadisticas['total'],
+        'citas_pendientes': estadisticas['pendientes'],
+        'citas_completadas': estadisticas['completadas'],
+        'citas_canceladas': estadisticas['canceladas'],
         'hoy': hoy,
         'query': query,
         'estados_cita': EstadoCita.objects.all() # Añadir todos los estados para el modal
@@ -84,23 +105,20 @@ def index(request):
     return render(request, 'citas/index.html', context)
 
 @personal_medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def create(request):
     if request.method == 'POST':
         form = CitaForm(request.POST)
         if form.is_valid():
             try:
-                cita = form.save()
+                # Savepoint: si la restricción de solapamiento falla, la transacción sigue utilizable
+                with transaction.atomic():
+                    cita = form.save()
                 
                 # Crear nota automática de creación
-                tipo_nota, created = TipoNota.objects.get_or_create(
-                    nombre='Sistema',
-                    defaults={'descripcion': 'Notas generadas automáticamente por el sistema'}
-                )
-                
                 NotaCita.objects.create(
                     cita=cita,
-                    tipo_nota=tipo_nota,
+                    tipo_nota_id=id_tipo_nota_sistema(),
                     contenido=f"Cita creada el {timezone.now().strftime('%Y-%m-%d %H:%M')}"
                 )
                 
@@ -110,7 +128,11 @@ def create(request):
             except ValidationError as e:
                 messages.error(request, f'Error de validación: {", ".join(e.messages)}')
             except IntegrityError as e:
-                messages.error(request, 'Error de integridad de datos. La cita podría solaparse con otra existente.')
+                if es_solapamiento(e):
+                    form.add_error(None, MENSAJE_SOLAPAMIENTO)
+                    messages.error(request, MENSAJE_SOLAPAMIENTO)
+                else:
+                    messages.error(request, 'Error de integridad de datos. La cita podría solaparse con otra existente.')
             except Exception as e:
                 messages.error(request, f'Error inesperado al crear la cita: {str(e)}')
                 # Re-lanzar la excepción para que se revierta la transacción
@@ -138,6 +160,7 @@ def create(request):
 @login_required
 @require_http_methods(["POST"])
 @csrf_exempt
+@atomic_con_reintentos
 def crear_tipo_cita_ajax(request):
     try:
         data = json.loads(request.body)
@@ -155,6 +178,9 @@ def crear_tipo_cita_ajax(request):
                 'errors': form.errors
             })
     except Exception as e:
+        # Los conflictos de serialización se reintentan en atomic_con_reintentos
+        if es_conflicto_serializacion(e):
+            raise
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -163,6 +189,7 @@ def crear_tipo_cita_ajax(request):
 @login_required
 @require_http_methods(["POST"])
 @csrf_exempt
+@atomic_con_reintentos
 def crear_motivo_cita_ajax(request):
     try:
         data = json.loads(request.body)
@@ -180,6 +207,9 @@ def crear_motivo_cita_ajax(request):
                 'errors': form.errors
             })
     except Exception as e:
+        # Los conflictos de serialización se reintentan en atomic_con_reintentos
+        if es_conflicto_serializacion(e):
+            raise
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -188,6 +218,7 @@ def crear_motivo_cita_ajax(request):
 @login_required
 @require_http_methods(["POST"])
 @csrf_exempt
+@atomic_con_reintentos
 def crear_estado_cita_ajax(request):
     try:
         data = json.loads(request.body)
@@ -205,6 +236,9 @@ def crear_estado_cita_ajax(request):
                 'errors': form.errors
             })
     except Exception as e:
+        # Los conflictos de serialización se reintentan en atomic_con_reintentos
+        if es_conflicto_serializacion(e):
+            raise
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -213,7 +247,7 @@ def crear_estado_cita_ajax(request):
 @login_required
 @require_http_methods(["POST"])
 @csrf_exempt
-@transaction.atomic
+@atomic_con_reintentos
 def cambiar_estado_ajax(request):
     try:
         data = json.loads(request.body)
@@ -221,35 +255,119 @@ def cambiar_estado_ajax(request):
         estado_id = data.get('estado_id')
 
         cita = get_object_or_404(Cita, id=cita_id)
-        nuevo_estado = get_object_or_404(EstadoCita, id=estado_id)
-        
-        estado_anterior = cita.estado
+        nuevo_estado = catalogos.estado(estado_id)
+        if nuevo_estado is None:
+            raise Http404('El estado indicado no existe.')
 
-        if estado_anterior.id == nuevo_estado.id:
+        if cita.estado_id == nuevo_estado['id']:
             return JsonResponse({'success': True, 'message': 'El estado ya es el actual.'})
 
-        cita.estado = nuevo_estado
+        estado_anterior = catalogos.estado(cita.estado_id)
+        cita.estado_id = nuevo_estado['id']
         cita.save()
 
-        tipo_nota, _ = TipoNota.objects.get_or_create(
-            nombre='Sistema', 
-            defaults={'descripcion': 'Notas generadas automáticamente por el sistema'}
-        )
         NotaCita.objects.create(
             cita=cita,
-            tipo_nota=tipo_nota,
-            contenido=f"Estado cambiado de '{estado_anterior.nombre}' a '{nuevo_estado.nombre}' por {request.user.username}."
+            tipo_nota_id=id_tipo_nota_sistema(),
+            contenido=f"Estado cambiado de '{estado_anterior['nombre']}' a '{nuevo_estado['nombre']}' por {request.user.username}."
         )
 
         return JsonResponse({
             'success': True,
-            'nuevo_estado_nombre': nuevo_estado.nombre,
-            'nuevo_estado_color': nuevo_estado.color
+            'nuevo_estado_nombre': nuevo_estado['nombre'],
+            'nuevo_estado_color': nuevo_estado['color']
         })
 
     except Exception as e:
+        # Los conflictos de serialización se reintentan en atomic_con_reintentos
+        if es_conflicto_serializacion(e):
+            raise
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
+@personal_medico_required
+@require_http_methods(["POST"])
+@atomic_con_reintentos
+def cambiar_estado_masivo(request):
+    """
+    Cambia el estado de varias citas en una sola transacción.
+
+    Recibe JSON {"cita_ids": [...], "estado_id": n} y responde con el resultado de cada id:
+    'actualizada', 'sin_cambios' (ya tenía ese estado) o 'no_encontrada'. Se usa un único
+    UPDATE ... WHERE id IN (...) y las notas de auditoría se insertan con bulk_create.
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict) or not isinstance(data.get('cita_ids', []), list):
+            raise TypeError
+        estado_id = int(data.get('estado_id'))
+        cita_ids = list(dict.fromkeys(int(cita_id) for cita_id in data.get('cita_ids', [])))
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Se esperaba {"cita_ids": [...], "estado_id": n}.'}, status=400)
+
+    maximo = getattr(settings, 'CITAS_CAMBIO_MASIVO_MAXIMO', 500)
+    if not cita_ids or len(cita_ids) > maximo:
+        return JsonResponse({'success': False, 'error': f'Indique entre 1 y {maximo} citas.'}, status=400)
+
+    nuevo_estado = catalogos.estado(estado_id)
+    if nuevo_estado is None:
+        return JsonResponse({'success': False, 'error': 'El estado indicado no existe.'}, status=404)
+
+    # Bloquea solo las filas de citas (no las de estados) hasta el fin de la transacción
+    actuales = {
+        cita_id: (estado_anterior_id, fecha)
+        for cita_id, estado_anterior_id, fecha in Cita.objects
+        .select_for_update()
+        .filter(id__in=cita_ids)
+        .values_list('id', 'estado_id', 'fecha')
+    }
+
+    resultados = {}
+    a_actualizar = []
+    for cita_id in cita_ids:
+        if cita_id not in actuales:
+            resultados[cita_id] = 'no_encontrada'
+        elif actuales[cita_id][0] == nuevo_estado['id']:
+            resultados[cita_id] = 'sin_cambios'
+        else:
+            resultados[cita_id] = 'actualizada'
+            a_actualizar.append(cita_id)
+
+    if a_actualizar:
+        ahora = timezone.now()
+        Cita.objects.filter(id__in=a_actualizar).update(estado_id=nuevo_estado['id'], updated_at=ahora)
+
+        # catalogos.estado recarga el catálogo si un estado anterior aún no está en la copia local
+        anteriores = {
+            estado_anterior_id: catalogos.estado(estado_anterior_id)
+            for estado_anterior_id in {actuales[cita_id][0] for cita_id in a_actualizar}
+        }
+        tipo_nota_id = id_tipo_nota_sistema()
+        NotaCita.objects.bulk_create([
+            NotaCita(
+                cita_id=cita_id,
+                tipo_nota_id=tipo_nota_id,
+                contenido=f"Estado cambiado de '{anteriores[actuales[cita_id][0]]['nombre']}' a '{nuevo_estado['nombre']}' por {request.user.username}."
+            )
+            for cita_id in a_actualizar
+        ])
+
+        # update() no emite post_save: se invalidan a mano las cachés que dependen del estado
+        fechas = {actuales[cita_id][1] for cita_id in a_actualizar}
+
+        def invalidar():
+            estadisticas_dashboard.invalidar(estadisticas_dashboard.CLAVE_CITAS_PENDIENTES, estadisticas_dashboard.CLAVE_ULTIMAS_CITAS)
+            cache.delete(CLAVE_ESTADISTICAS)
+            invalidar_ocupacion(*fechas)
+
+        transaction.on_commit(invalidar)
+
+    return JsonResponse({
+        'success': True,
+        'estado': nuevo_estado,
+        'actualizadas': len(a_actualizar),
+        'resultados': [{'cita_id': cita_id, 'resultado': resultados[cita_id]} for cita_id in cita_ids],
+    })
+
 @personal_medico_required
 def show(request, cita_id):
     try:
@@ -264,7 +382,7 @@ def show(request, cita_id):
         return redirect('citas:index')
 
 @personal_medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def edit(request, cita_id):
     cita = get_object_or_404(Cita, id=cita_id)
     
@@ -272,17 +390,13 @@ def edit(request, cita_id):
         form = CitaForm(request.POST, instance=cita)
         if form.is_valid():
             try:
-                form.save()
+                with transaction.atomic():
+                    form.save()
                 
                 # Crear nota de edición
-                tipo_nota, created = TipoNota.objects.get_or_create(
-                    nombre='Sistema',
-                    defaults={'descripcion': 'Notas generadas automáticamente por el sistema'}
-                )
-                
                 NotaCita.objects.create(
                     cita=cita,
-                    tipo_nota=tipo_nota,
+                    tipo_nota_id=id_tipo_nota_sistema(),
                     contenido=f"Cita modificada el {timezone.now().strftime('%Y-%m-%d %H:%M')}"
                 )
                 
@@ -292,7 +406,11 @@ def edit(request, cita_id):
             except ValidationError as e:
                 messages.error(request, f'Error de validación: {", ".join(e.messages)}')
             except IntegrityError as e:
-                messages.error(request, 'Error de integridad de datos. La cita podría solaparse con otra existente.')
+                if es_solapamiento(e):
+                    form.add_error(None, MENSAJE_SOLAPAMIENTO)
+                    messages.error(request, MENSAJE_SOLAPAMIENTO)
+                else:
+                    messages.error(request, 'Error de integridad de datos. La cita podría solaparse con otra existente.')
             except Exception as e:
                 messages.error(request, f'Error inesperado al actualizar la cita: {str(e)}')
                 raise
@@ -317,7 +435,7 @@ def edit(request, cita_id):
     })
 
 @personal_medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def destroy(request, cita_id):
     cita = get_object_or_404(Cita, id=cita_id)
     
@@ -331,6 +449,8 @@ def destroy(request, cita_id):
             return redirect('citas:index')
             
         except Exception as e:
+            if es_conflicto_serializacion(e):
+                raise
             messages.error(request, f'Error al eliminar la cita: {str(e)}')
             return redirect('citas:show', cita_id=cita_id)
     
@@ -357,6 +477,89 @@ def search(request):
         'query': query
     })
 
+@personal_medico_required
+def disponibilidad(request):
+    """
+    Turnos libres en JSON. Parámetros: desde, hasta (YYYY-MM-DD, por defecto hoy),
+    tipo_cita (usa su duracion_estimada) o duracion en minutos.
+    """
+    try:
+        desde = datetime.date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else timezone.localdate()
+        hasta = datetime.date.fromisoformat(request.GET['hasta']) if request.GET.get('hasta') else desde
+        duracion = int(request.GET['duracion']) if request.GET.get('duracion') else None
+        tipo_cita_id = int(request.GET['tipo_cita']) if request.GET.get('tipo_cita') else None
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos.'}, status=400)
+
+    max_dias = getattr(settings, 'CITAS_DISPONIBILIDAD_MAX_DIAS', 31)
+    if hasta < desde or (hasta - desde).days >= max_dias:
+        return JsonResponse({'error': f'El rango debe ser de 1 a {max_dias} días.'}, status=400)
+    if duracion is not None and duracion <= 0:
+        return JsonResponse({'error': 'La duración debe ser mayor que cero.'}, status=400)
+
+    if duracion is None and tipo_cita_id is not None:
+        tipo_cita = catalogos.fila('tipos_cita', tipo_cita_id)
+        if tipo_cita is None:
+            raise Http404('El tipo de cita indicado no existe.')
+        duracion = tipo_cita['duracion_estimada']
+
+    dias = turnos_disponibles(desde, hasta, duracion)
+    return JsonResponse({
+        'duracion': duracion or getattr(settings, 'CITAS_DURACION_POR_DEFECTO', 30),
+        'dias': [
+            {'fecha': dia['fecha'].isoformat(), 'turnos': dia['turnos']}
+            for dia in dias
+        ],
+    })
+
+def _rango_calendario(request):
+    """Lee vista (semana|mes) y fecha, o desde/hasta explícitos. Lanza ValueError si no son válidos."""
+    if request.GET.get('desde') or request.GET.get('hasta'):
+        desde = datetime.date.fromisoformat(request.GET.get('desde', ''))
+        hasta = datetime.date.fromisoformat(request.GET.get('hasta', ''))
+    else:
+        vista = request.GET.get('vista', 'semana')
+        if vista not in calendario.VISTAS:
+            raise ValueError(vista)
+        fecha = datetime.date.fromisoformat(request.GET['fecha']) if request.GET.get('fecha') else timezone.localdate()
+        desde, hasta = calendario.rango(vista, fecha)
+
+    if hasta < desde or (hasta - desde).days >= getattr(settings, 'CITAS_CALENDARIO_MAX_DIAS', 62):
+        raise ValueError('rango')
+    return desde, hasta
+
+@personal_medico_required
+def calendario_citas(request):
+    """
+    Citas de una semana o un mes en JSON. Parámetros: vista (semana|mes), fecha (YYYY-MM-DD,
+    por defecto hoy) o bien desde y hasta.
+    """
+    try:
+        desde, hasta = _rango_calendario(request)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos.'}, status=400)
+
+    return JsonResponse({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'citas': calendario.eventos(desde, hasta),
+    })
+
+@personal_medico_required
+def calendario_ics(request):
+    """El mismo rango que calendario_citas como archivo iCalendar, enviado por partes."""
+    try:
+        desde, hasta = _rango_calendario(request)
+    except ValueError:
+        return HttpResponseBadRequest('Parámetros inválidos.')
+
+    response = StreamingHttpResponse(
+        calendario.lineas_ics(desde, hasta, request.get_host().split(':')[0]),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="citas_{desde:%Y%m%d}_{hasta:%Y%m%d}.ics"'
+    return response
+
 @personal_medico_required
 def citas_hoy(request):
     try:
@@ -374,37 +577,36 @@ def citas_hoy(request):
         return redirect('citas:index')
 
 @personal_medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def cambiar_estado(request, cita_id, estado_id):
     try:
         cita = get_object_or_404(Cita, id=cita_id)
-        estado = get_object_or_404(EstadoCita, id=estado_id)
+        estado = catalogos.estado(estado_id)
+        if estado is None:
+            raise Http404('El estado indicado no existe.')
         
         # Guardar el estado anterior para la nota
-        estado_anterior = cita.estado.nombre
+        estado_anterior = catalogos.estado(cita.estado_id)['nombre']
         
-        cita.estado = estado
+        cita.estado_id = estado['id']
         cita.save()
         
         # Crear nota de cambio de estado
-        tipo_nota, created = TipoNota.objects.get_or_create(
-            nombre='Sistema',
-            defaults={'descripcion': 'Notas generadas automáticamente por el sistema'}
-        )
-        
         NotaCita.objects.create(
             cita=cita,
-            tipo_nota=tipo_nota,
-            contenido=f"Estado cambiado de '{estado_anterior}' a '{estado.nombre}' el {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+            tipo_nota_id=id_tipo_nota_sistema(),
+            contenido=f"Estado cambiado de '{estado_anterior}' a '{estado['nombre']}' el {timezone.now().strftime('%Y-%m-%d %H:%M')}"
         )
         
-        messages.success(request, f'Estado de cita actualizado a {estado.nombre}.')
+        messages.success(request, f'Estado de cita actualizado a {estado["nombre"]}.')
         
     except ValidationError as e:
         messages.error(request, f'Error de validación: {", ".join(e.messages)}')
     except IntegrityError as e:
         messages.error(request, 'Error de integridad de datos al cambiar el estado.')
     except Exception as e:
+        if es_conflicto_serializacion(e):
+            raise
         messages.error(request, f'Error inesperado al cambiar el estado: {str(e)}')
     
     return redirect('citas:show', cita_id=cita_id)
@@ -413,48 +615,13 @@ def cambiar_estado(request, cita_id, estado_id):
 
 @personal_medico_required
 def exportar_citas_pdf(request):
-    citas = Cita.objects.all().select_related('paciente', 'tipo_cita', 'motivo', 'estado').order_by('-fecha', '-hora_inicio')
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'citas': citas,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('citas/pdf_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="reporte_citas_{}.pdf"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'citas')
 
 @personal_medico_required
 def exportar_citas_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="listado_citas_{}.xlsx"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Citas"
-    ws.freeze_panes = 'A2'
-    headers = ['Paciente', 'Tipo de Cita', 'Motivo', 'Fecha', 'Hora Inicio', 'Hora Fin', 'Estado']
-    ws.append(headers)
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="0d6efd", end_color="0d6efd", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
     citas = Cita.objects.all().select_related('paciente', 'tipo_cita', 'motivo', 'estado').order_by('-fecha', '-hora_inicio')
-    for cita in citas:
-        ws.append([
+    filas = (
+        [
             f"{cita.paciente.nombre} {cita.paciente.apellido}",
             cita.tipo_cita.nombre,
             cita.motivo.nombre,
@@ -462,20 +629,12 @@ def exportar_citas_excel(request):
             cita.hora_inicio,
             cita.hora_fin,
             cita.estado.nombre
-        ])
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-    wb.save(response)
-    return response
+        ]
+        for cita in citas.iterator(chunk_size=tamano_lote())
+    )
+    headers = ['Paciente', 'Tipo de Cita', 'Motivo', 'Fecha', 'Hora Inicio', 'Hora Fin', 'Estado']
+    return exportar_excel(
+        'listado_citas_{}.xlsx'.format(datetime.datetime.now().strftime("%Y%m%d")),
+        "Citas", headers, filas, centrar=True,
+        request=request, tipo='citas',
+    )
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin
-from .models import PerfilUsuario
+from .models import PerfilUsuario, TrabajoExportacion, RegistroBaja
 
 
 class PerfilUsuarioInline(admin.StackedInline):
@@ -25,3 +25,18 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
     list_filter = ('rol', 'created_at')
     search_fields = ('usuario__username', 'usuario__first_name', 'usuario__last_name')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'usuario', 'estado', 'duracion', 'tamano', 'created_at', 'finalizado_en')
+    list_filter = ('estado', 'tipo', 'created_at')
+    search_fields = ('usuario__username', 'nombre_archivo')
+    readonly_fields = ('created_at', 'iniciado_en', 'finalizado_en', 'duracion', 'tamano', 'intentos')
+
+
+@admin.register(RegistroBaja)
+class RegistroBajaAdmin(admin.ModelAdmin):
+    list_display = ('modelo', 'objeto_id', 'eliminado_en')
+    list_filter = ('modelo', 'eliminado_en')
+    search_fields = ('modelo', 'objeto_id')
@@ -0,0 +1,344 @@
+import hashlib
+import json
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from .paginacion import KeysetPaginator
+from .roles import tiene_rol
+
+VERSION = 'v1'
+
+ROLES_PERSONAL = ('admin', 'medico', 'recepcionista')
+ROLES_MEDICOS = ('admin', 'medico')
+
+# `campos` asocia cada campo público con un lookup de .values() o con una expresión agregada;
+# `por_defecto` son los que se devuelven sin ?campos=. `version` es el campo que cambia con cada
+# modificación de la fila y alimenta el ETag. `dependencias` son las versiones (lookups o
+# expresiones) de las filas relacionadas de las que salen otros campos, como el stock del saldo o
+# el nombre del estado: también entran en el ETag. El último campo de `orden` debe ser único.
+Recurso = namedtuple('Recurso', ['modelo', 'campos', 'por_defecto', 'orden', 'version', 'roles', 'dependencias'],
+                     defaults=((),))
+
+_CAMPOS_PACIENTES = {
+    'id': 'id',
+    'numero_documento': 'numero_documento',
+    'nombre': 'nombre',
+    'apellido': 'apellido',
+    'fecha_nacimiento': 'fecha_nacimiento',
+    'genero': 'genero',
+    'email': 'email',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+_CAMPOS_CITAS = {
+    'id': 'id',
+    'paciente_id': 'paciente_id',
+    'paciente_documento': 'paciente__numero_documento',
+    'fecha': 'fecha',
+    'hora_inicio': 'hora_inicio',
+    'hora_fin': 'hora_fin',
+    'tipo_cita': 'tipo_cita__nombre',
+    'motivo': 'motivo__nombre',
+    'estado': 'estado__nombre',
+    'observaciones': 'observaciones',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+_CAMPOS_HISTORIALES = {
+    'id': 'id',
+    'paciente_id': 'paciente_id',
+    'paciente_documento': 'paciente__numero_documento',
+    'alergias': ArrayAgg('alergias__nombre', distinct=True, default=[]),
+    'enfermedades_preexistentes': ArrayAgg('enfermedades_preexistentes__nombre', distinct=True, default=[]),
+    'medicamentos_actuales': ArrayAgg('medicamentos_actuales__codigo', distinct=True, default=[]),
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+_CAMPOS_MEDICAMENTOS = {
+    'id': 'id',
+    'codigo': 'codigo',
+    'nombre': 'nombre',
+    'descripcion': 'descripcion',
+    'categoria': 'categoria__nombre',
+    'proveedor': 'proveedor__nombre',
+    'precio_unitario': 'precio_unitario',
+    'stock_minimo': 'stock_minimo',
+    'stock': 'saldo__cantidad',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+_CAMPOS_INVENTARIO = {
+    'id': 'id',
+    'medicamento_id': 'medicamento_id',
+    'medicamento_codigo': 'medicamento__codigo',
+    'cantidad': 'cantidad',
+    'fecha_caducidad': 'fecha_caducidad',
+    'lote': 'lote',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+_CAMPOS_MOVIMIENTOS = {
+    'id': 'id',
+    'medicamento_id': 'medicamento_id',
+    'medicamento_codigo': 'medicamento__codigo',
+    'tipo': 'tipo',
+    'cantidad': 'cantidad',
+    'fecha': 'fecha',
+    'descripcion': 'descripcion',
+    'usuario': 'usuario',
+    'updated_at': 'updated_at',
+}
+
+RECURSOS = {
+    'pacientes': Recurso('pacientes.models.Paciente', _CAMPOS_PACIENTES, tuple(_CAMPOS_PACIENTES),
+                         ('id',), 'updated_at', ROLES_PERSONAL),
+    'citas': Recurso('citas.models.Cita', _CAMPOS_CITAS, tuple(_CAMPOS_CITAS),
+                     ('id',), 'updated_at', ROLES_PERSONAL,
+                     ('paciente__updated_at', 'tipo_cita__updated_at', 'motivo__updated_at', 'estado__updated_at')),
+    # Mismos joins que los ArrayAgg de sus campos: un nombre de alergia cambiado también cambia el ETag
+    'historiales': Recurso('historiales.models.HistorialMedico', _CAMPOS_HISTORIALES, tuple(_CAMPOS_HISTORIALES),
+                           ('id',), 'updated_at', ROLES_MEDICOS,
+                           ('paciente__updated_at', Max('alergias__updated_at'),
+                            Max('enfermedades_preexistentes__updated_at'), Max('medicamentos_actuales__updated_at'))),
+    # El stock vive en StockMedicamento: StockMedicamento.aplicar no toca Medicamento.updated_at
+    'medicamentos': Recurso('inventario.models.Medicamento', _CAMPOS_MEDICAMENTOS, tuple(_CAMPOS_MEDICAMENTOS),
+                            ('id',), 'updated_at', ROLES_PERSONAL,
+                            ('saldo__updated_at', 'categoria__updated_at', 'proveedor__updated_at')),
+    'inventario': Recurso('inventario.models.Inventario', _CAMPOS_INVENTARIO, tuple(_CAMPOS_INVENTARIO),
+                          ('id',), 'updated_at', ROLES_PERSONAL, ('medicamento__updated_at',)),
+    'movimientos': Recurso('inventario.models.MovimientoInventario', _CAMPOS_MOVIMIENTOS, tuple(_CAMPOS_MOVIMIENTOS),
+                           ('id',), 'updated_at', ROLES_PERSONAL, ('medicamento__updated_at',)),
+}
+
+
+class ErrorApi(Exception):
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def _error(mensaje, status):
+    return JsonResponse({'error': mensaje}, status=status)
+
+
+def _autorizar(request, recurso):
+    if not request.user.is_authenticated:
+        raise ErrorApi('Autenticación requerida.', 401)
+    if not tiene_rol(request, recurso.roles):
+        raise ErrorApi('No tienes los permisos necesarios para este recurso.', 403)
+
+
+def _recurso(nombre):
+    try:
+        return RECURSOS[nombre]
+    except KeyError:
+        raise ErrorApi(f'Recurso desconocido: {nombre}.', 404)
+
+
+def _campos_pedidos(request, recurso):
+    if not request.GET.get('campos'):
+        return list(recurso.por_defecto)
+    campos = [campo.strip() for campo in request.GET['campos'].split(',') if campo.strip()]
+    desconocidos = [campo for campo in campos if campo not in recurso.campos]
+    if desconocidos:
+        raise ErrorApi(
+            f'Campos desconocidos: {", ".join(desconocidos)}. Disponibles: {", ".join(recurso.campos)}.'
+        )
+    return list(dict.fromkeys(campos))
+
+
+def _limite(request):
+    por_defecto = getattr(settings, 'API_LIMITE_POR_DEFECTO', 100)
+    maximo = getattr(settings, 'API_LIMITE_MAXIMO', 1000)
+    try:
+        limite = int(request.GET.get('limite', por_defecto))
+    except ValueError:
+        raise ErrorApi('El límite debe ser un número entero.')
+    if not 1 <= limite <= maximo:
+        raise ErrorApi(f'El límite debe estar entre 1 y {maximo}.')
+    return limite
+
+
+def leer_filas(queryset, recurso, campos):
+    """
+    Ejecuta .values() con los campos pedidos y devuelve dicts con los nombres públicos.
+    Las expresiones se anotan con un alias propio porque no pueden llevar el nombre de un campo del modelo.
+    """
+    lookups = [recurso.campos[campo] for campo in campos if isinstance(recurso.campos[campo], str)]
+    expresiones = {f'_api_{campo}': recurso.campos[campo] for campo in campos if not isinstance(recurso.campos[campo], str)}
+    filas = []
+    for fila in queryset.values('pk', *lookups, **expresiones):
+        filas.append((fila['pk'], {
+            campo: fila[recurso.campos[campo] if isinstance(recurso.campos[campo], str) else f'_api_{campo}']
+            for campo in campos
+        }))
+    return filas
+
+
+def _versiones(recurso):
+    """
+    Argumentos de .values() para leer la versión de cada fila junto con las de sus dependencias;
+    devuelve (lookups, expresiones, claves) con `claves` en el orden en que se arma la versión.
+    """
+    lookups = [recurso.version] + [d for d in recurso.dependencias if isinstance(d, str)]
+    expresiones = {
+        f'_version_{indice}': dependencia
+        for indice, dependencia in enumerate(recurso.dependencias)
+        if not isinstance(dependencia, str)
+    }
+    return lookups, expresiones, lookups + list(expresiones)
+
+
+def _etag(*partes):
+    contenido = json.dumps(partes, cls=DjangoJSONEncoder, sort_keys=True)
+    return f'"{hashlib.sha256(contenido.encode("utf-8")).hexdigest()}"'
+
+
+def _url(request, **parametros):
+    consulta = request.GET.copy()
+    for clave, valor in parametros.items():
+        consulta[clave] = valor
+    return request.build_absolute_uri(f'{request.path}?{consulta.urlencode()}')
+
+
+def _responder(request, datos, etag, ultima=None):
+    """Responde 304 si el cliente ya tiene esta versión; `datos` solo se llama en caso contrario."""
+    ultima = int(ultima.timestamp()) if ultima else None
+    respuesta = get_conditional_response(request, etag=etag, last_modified=ultima)
+    if respuesta is None:
+        respuesta = JsonResponse(datos())
+        if ultima is not None:
+            respuesta['Last-Modified'] = http_date(ultima)
+    respuesta['ETag'] = etag
+    # Las respuestas dependen del usuario: se pueden guardar pero hay que revalidarlas
+    respuesta['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(respuesta, ('Cookie',))
+    return respuesta
+
+
+def _manejar_errores(vista):
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        try:
+            return vista(request, *args, **kwargs)
+        except ErrorApi as e:
+            return _error(str(e), e.status)
+    return envoltura
+
+
+@gzip_page
+@require_GET
+@_manejar_errores
+def indice(request):
+    """Lista los recursos disponibles y sus campos."""
+    if not request.user.is_authenticated:
+        raise ErrorApi('Autenticación requerida.', 401)
+    return JsonResponse({
+        'version': VERSION,
+        'recursos': {
+            nombre: {'url': request.build_absolute_uri(f'{nombre}/'), 'campos': list(recurso.campos)}
+            for nombre, recurso in RECURSOS.items()
+        },
+    })
+
+
+@gzip_page
+@require_GET
+@_manejar_errores
+def lista(request, recurso):
+    """
+    Página de un recurso. Parámetros: campos (separados por comas), limite y cursor.
+
+    Primero se lee solo la clave de orden y la versión de las filas de la página; con eso se
+    calcula el ETag y, si coincide con If-None-Match, se responde 304 sin leer el resto de columnas.
+    """
+    nombre = recurso
+    recurso = _recurso(nombre)
+    _autorizar(request, recurso)
+    campos = _campos_pedidos(request, recurso)
+    limite = _limite(request)
+
+    queryset = import_string(recurso.modelo).objects.all()
+    lookups, expresiones, claves = _versiones(recurso)
+    paginator = KeysetPaginator(queryset.values(*recurso.orden, 'pk', *lookups, **expresiones), recurso.orden, limite)
+    pagina = paginator.get_page(request.GET.get('cursor'))
+
+    versiones = [(fila['pk'], [fila[clave] for clave in claves]) for fila in pagina]
+    etag = _etag(VERSION, nombre, campos, versiones, pagina.cursor_anterior is None, pagina.cursor_siguiente is None)
+
+    def datos():
+        ids = [pk for pk, _ in versiones]
+        por_id = dict(leer_filas(queryset.filter(pk__in=ids), recurso, campos)) if ids else {}
+        return {
+            'resultados': [por_id[pk] for pk in ids if pk in por_id],
+            'anterior': _url(request, cursor=pagina.cursor_anterior) if pagina.has_previous() else None,
+            'siguiente': _url(request, cursor=pagina.cursor_siguiente) if pagina.has_next() else None,
+        }
+
+    # Sin Last-Modified: una baja no cambia la fecha máxima de la página, pero sí el ETag
+    return _responder(request, datos, etag)
+
+
+@gzip_page
+@require_GET
+@_manejar_errores
+def detalle(request, recurso, pk):
+    nombre = recurso
+    recurso = _recurso(nombre)
+    _autorizar(request, recurso)
+    campos = _campos_pedidos(request, recurso)
+
+    queryset = import_string(recurso.modelo).objects.filter(pk=pk)
+    lookups, expresiones, claves = _versiones(recurso)
+    fila = queryset.values('pk', *lookups, **expresiones).first()
+    if fila is None:
+        raise ErrorApi('No encontrado.', 404)
+
+    versiones = [fila[clave] for clave in claves]
+    etag = _etag(VERSION, nombre, campos, fila['pk'], versiones)
+    # Last-Modified es la más reciente de la fila y sus dependencias (las relaciones opcionales vienen en None)
+    ultima = max((version for version in versiones if version is not None), default=None)
+    return _responder(request, lambda: leer_filas(queryset, recurso, campos)[0][1], etag, ultima)
+
+
+@gzip_page
+@require_GET
+@_manejar_errores
+def cambios(request, recurso):
+    """
+    Feed de cambios del recurso desde la marca `desde` (ISO 8601, vacía para la carga inicial),
+    en NDJSON y por partes. La última línea trae la marca para la próxima lectura.
+    """
+    from . import cambios as feed
+
+    nombre = recurso
+    recurso = _recurso(nombre)
+    _autorizar(request, recurso)
+    campos = _campos_pedidos(request, recurso)
+    try:
+        desde, hasta = feed.ventana(feed.leer_marca(request.GET.get('desde')))
+    except feed.MarcaInvalida:
+        raise ErrorApi('La marca `desde` debe ser una fecha ISO 8601.')
+
+    respuesta = StreamingHttpResponse(
+        feed.lineas_ndjson([nombre], desde, hasta, campos),
+        content_type='application/x-ndjson; charset=utf-8',
+    )
+    respuesta['Cache-Control'] = 'no-store'
+    return respuesta
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('', api.indice, name='indice'),
+    path('<slug:recurso>/', api.lista, name='lista'),
+    path('<slug:recurso>/<int:pk>/', api.detalle, name='detalle'),
+    path('<slug:recurso>/cambios/', api.cambios, name='cambios'),
+]
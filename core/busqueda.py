@@ -0,0 +1,160 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Q, Window
+
+from pacientes.busqueda import buscar_pacientes
+from pacientes.models import Paciente
+from citas.models import Cita
+from historiales.models import HistorialMedico
+
+CATEGORIAS = ('pacientes', 'citas', 'historiales')
+
+# Hilos compartidos por todas las búsquedas del proceso; cada uno usa su propia conexión
+_ejecutor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'BUSQUEDA_MAX_HILOS', 6),
+    thread_name_prefix='busqueda',
+)
+
+
+def _ids_pacientes(query):
+    # Una sola búsqueda de pacientes, completa y en orden de relevancia, para las tres categorías
+    return list(buscar_pacientes(query).values_list('id', flat=True))
+
+
+def _pagina_con_total(queryset, limite):
+    # El total viaja en cada fila como función de ventana: sin COUNT aparte
+    resultados = list(queryset.annotate(total_busqueda=Window(Count('*')))[:limite])
+    return resultados, resultados[0].total_busqueda if resultados else 0
+
+
+def _buscar_pacientes(query, limite, ids):
+    pacientes = Paciente.objects.in_bulk(ids[:limite])
+    return [pacientes[id] for id in ids[:limite] if id in pacientes], len(ids)
+
+
+def _buscar_citas(query, limite, ids):
+    citas = Cita.objects.filter(
+        Q(paciente_id__in=ids) |
+        Q(motivo__nombre__icontains=query) |
+        Q(motivo__descripcion__icontains=query)
+    )
+    return _pagina_con_total(
+        citas.select_related('paciente', 'estado', 'motivo').order_by('-fecha', '-hora_inicio'), limite,
+    )
+
+
+def _buscar_historiales(query, limite, ids):
+    # Subconsultas sobre las tablas intermedias en lugar de joins M2M + DISTINCT
+    historiales = HistorialMedico.objects.filter(
+        Q(paciente_id__in=ids) |
+        Q(id__in=HistorialMedico.alergias.through.objects.filter(
+            alergia__nombre__icontains=query).values('historialmedico_id')) |
+        Q(id__in=HistorialMedico.enfermedades_preexistentes.through.objects.filter(
+            enfermedad__nombre__icontains=query).values('historialmedico_id')) |
+        Q(id__in=HistorialMedico.medicamentos_actuales.through.objects.filter(
+            medicamento__nombre__icontains=query).values('historialmedico_id'))
+    )
+    return _pagina_con_total(historiales.select_related('paciente').order_by('-updated_at'), limite)
+
+
+BUSCADORES = {
+    'pacientes': _buscar_pacientes,
+    'citas': _buscar_citas,
+    'historiales': _buscar_historiales,
+}
+
+
+def _en_hilo(funcion, *args, timeout_ms=None):
+    """Ejecuta una consulta en un hilo del pool, con statement_timeout si hay presupuesto."""
+    close_old_connections()
+    try:
+        with transaction.atomic():
+            if timeout_ms and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL statement_timeout = %s', [int(timeout_ms)])
+            return funcion(*args)
+    finally:
+        close_old_connections()
+
+
+def _lanzar(funcion, *args, timeout_ms=None):
+    if getattr(settings, 'BUSQUEDA_CONCURRENTE', False):
+        return _ejecutor.submit(_en_hilo, funcion, *args, timeout_ms=timeout_ms)
+
+    # Modo secuencial (por defecto, y el único válido en pruebas dentro de una transacción,
+    # cuyas filas no ven las conexiones de los hilos): misma conexión de la petición
+    futuro = Future()
+    try:
+        futuro.set_result(funcion(*args))
+    except Exception as exc:
+        futuro.set_exception(exc)
+    return futuro
+
+
+def buscar(query, limite=10, presupuesto_ms=None):
+    """
+    Búsqueda global en pacientes, citas e historiales.
+
+    Devuelve {'resultados': {categoria: [...]}, 'totales': {categoria: n},
+    'incompletas': [categorias], 'duracion_ms': n}. Con `presupuesto_ms` las categorías
+    que no terminan a tiempo se devuelven vacías y se listan en 'incompletas'.
+    """
+    inicio = time.monotonic()
+    respuesta = {
+        'resultados': {categoria: [] for categoria in CATEGORIAS},
+        'totales': {categoria: 0 for categoria in CATEGORIAS},
+        'incompletas': [],
+    }
+    query = (query or '').strip()
+    if not query:
+        respuesta['duracion_ms'] = 0
+        return respuesta
+
+    def restante_ms():
+        if presupuesto_ms is None:
+            return None
+        return max(1, presupuesto_ms - (time.monotonic() - inicio) * 1000)
+
+    def esperar(futuros):
+        return wait(futuros, timeout=restante_ms() / 1000 if presupuesto_ms else None)
+
+    # Primero los pacientes coincidentes: las tres categorías filtran por esos ids
+    futuro_ids = _lanzar(_ids_pacientes, query, timeout_ms=restante_ms())
+    terminados, _ = esperar([futuro_ids])
+    try:
+        if not terminados:
+            raise TimeoutError
+        ids = futuro_ids.result()
+    except Exception:
+        if presupuesto_ms is None:
+            raise
+        respuesta['incompletas'] = list(CATEGORIAS)
+        respuesta['duracion_ms'] = round((time.monotonic() - inicio) * 1000, 1)
+        return respuesta
+
+    futuros = {
+        _lanzar(BUSCADORES[categoria], query, limite, ids, timeout_ms=restante_ms()): categoria
+        for categoria in CATEGORIAS
+    }
+    terminados, pendientes = esperar(futuros)
+
+    for futuro in terminados:
+        categoria = futuros[futuro]
+        try:
+            resultados, total = futuro.result()
+        except Exception:
+            if presupuesto_ms is None:
+                raise
+            respuesta['incompletas'].append(categoria)
+            continue
+        respuesta['resultados'][categoria] = resultados
+        respuesta['totales'][categoria] = total
+
+    for futuro in pendientes:
+        respuesta['incompletas'].append(futuros[futuro])
+
+    respuesta['duracion_ms'] = round((time.monotonic() - inicio) * 1000, 1)
+    return respuesta
@@ -0,0 +1,185 @@
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+from collections import namedtuple
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, IntegerField, Max, Value
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+
+# Tablas de las que depende cada reporte; si cambia alguna, cambia la huella y con ella la clave
+FUENTES = {
+    'citas': ('citas.Cita', 'citas.EstadoCita', 'citas.TipoCita', 'citas.MotivoCita', 'pacientes.Paciente'),
+    'pacientes': ('pacientes.Paciente', 'pacientes.Direccion', 'pacientes.Telefono', 'pacientes.TipoTelefono',
+                  'pacientes.Ciudad', 'pacientes.Estado', 'pacientes.Pais'),
+    'historial': ('historiales.HistorialMedico', 'historiales.Alergia', 'historiales.Enfermedad',
+                  'inventario.Medicamento', 'pacientes.Paciente'),
+    'historiales': ('historiales.HistorialMedico', 'historiales.Alergia', 'historiales.Enfermedad',
+                    'inventario.Medicamento', 'pacientes.Paciente'),
+    'stock': ('inventario.Medicamento', 'inventario.StockMedicamento', 'inventario.Categoria', 'inventario.Proveedor'),
+    'medicamentos': ('inventario.Medicamento', 'inventario.Categoria', 'inventario.Proveedor'),
+    'proveedores': ('inventario.Proveedor',),
+    'categorias': ('inventario.Categoria',),
+    'inventario': ('inventario.Inventario', 'inventario.Medicamento'),
+}
+
+Entrada = namedtuple('Entrada', ['clave', 'ruta', 'nombre_archivo', 'content_type', 'ultima_modificacion'])
+
+
+def _directorio():
+    return Path(getattr(settings, 'REPORTES_CACHE_DIR', Path(settings.BASE_DIR) / 'privado' / 'cache_reportes'))
+
+
+def _rutas(clave):
+    carpeta = _directorio() / clave[:2]
+    return carpeta / clave, carpeta / f'{clave}.json'
+
+
+def huella(tipo):
+    """
+    Devuelve (máximo updated_at, total de filas) de cada tabla fuente del reporte, en una sola
+    consulta (UNION ALL de un agregado por tabla). Las altas, ediciones y bajas cambian la huella.
+    """
+    consultas = [
+        apps.get_model(etiqueta).objects.order_by()
+        .annotate(fuente=Value(indice, output_field=IntegerField()))
+        .values('fuente')
+        .annotate(ultima=Max('updated_at'), total=Count('pk'))
+        .values_list('fuente', 'ultima', 'total')
+        for indice, etiqueta in enumerate(FUENTES[tipo])
+    ]
+    filas = consultas[0].union(*consultas[1:], all=True) if len(consultas) > 1 else consultas[0]
+    resultado = {fuente: (ultima, total) for fuente, ultima, total in filas}
+    # Una tabla vacía no devuelve fila en el GROUP BY
+    return [resultado.get(indice, (None, 0)) for indice in range(len(FUENTES[tipo]))]
+
+
+def calcular_clave(formato, tipo, parametros=None):
+    """
+    Clave del reporte: formato + tipo + parámetros + huella de los datos + fecha local (la edad de
+    los pacientes o el vencimiento del inventario dependen del día). Devuelve (clave, ultima_modificacion).
+    """
+    valores = huella(tipo)
+    hoy = timezone.localdate()
+    # El contenido cambia también al cambiar el día, así que Last-Modified nunca es anterior a la medianoche
+    fechas = [ultima for ultima, _ in valores if ultima is not None]
+    fechas.append(timezone.make_aware(datetime.datetime.combine(hoy, datetime.time.min)))
+    contenido = json.dumps({
+        'formato': formato,
+        'tipo': tipo,
+        'parametros': parametros or {},
+        'huella': [[ultima.isoformat() if ultima else None, total] for ultima, total in valores],
+        'fecha': hoy.isoformat(),
+    }, sort_keys=True)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest(), max(fechas)
+
+
+def obtener(clave):
+    """Devuelve la entrada cacheada o None. Cada acierto actualiza el mtime, que sirve de marca LRU."""
+    ruta, ruta_meta = _rutas(clave)
+    try:
+        with open(ruta_meta, encoding='utf-8') as f:
+            meta = json.load(f)
+        os.utime(ruta)
+    except (OSError, ValueError):
+        return None
+    return Entrada(
+        clave, ruta, meta['nombre_archivo'], meta['content_type'],
+        parse_datetime(meta['ultima_modificacion']) if meta['ultima_modificacion'] else None,
+    )
+
+
+def guardar(clave, ultima_modificacion, nombre_archivo, content_type, escribir):
+    """
+    Guarda un reporte en la caché. `escribir(archivo)` vuelca el contenido en el archivo abierto;
+    se escribe en un temporal y se renombra, así un lector concurrente nunca ve un archivo a medias.
+    """
+    ruta, ruta_meta = _rutas(clave)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            escribir(archivo)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+    meta = {
+        'nombre_archivo': nombre_archivo,
+        'content_type': content_type,
+        'ultima_modificacion': ultima_modificacion.isoformat() if ultima_modificacion else None,
+    }
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+        json.dump(meta, archivo)
+    os.replace(temporal, ruta_meta)
+
+    desalojar()
+    return Entrada(clave, ruta, nombre_archivo, content_type, ultima_modificacion)
+
+
+def desalojar(tamano_maximo=None):
+    """Elimina los reportes usados hace más tiempo hasta que la caché quepa en REPORTES_CACHE_TAMANO_MAXIMO."""
+    if tamano_maximo is None:
+        tamano_maximo = getattr(settings, 'REPORTES_CACHE_TAMANO_MAXIMO', 200 * 1024 * 1024)
+    directorio = _directorio()
+    if not directorio.exists():
+        return 0
+
+    archivos = []
+    total = 0
+    for ruta in directorio.glob('*/*'):
+        if ruta.suffix in ('.json', '.tmp'):
+            continue
+        try:
+            estado = ruta.stat()
+        except OSError:
+            continue
+        archivos.append((estado.st_mtime, estado.st_size, ruta))
+        total += estado.st_size
+
+    eliminados = 0
+    for _, tamano, ruta in sorted(archivos):
+        if total <= tamano_maximo:
+            break
+        for archivo in (ruta, ruta.with_name(f'{ruta.name}.json')):
+            try:
+                archivo.unlink()
+            except OSError:
+                pass
+        total -= tamano
+        eliminados += 1
+    return eliminados
+
+
+def responder(request, entrada, nombre_archivo=None):
+    """Sirve una entrada con ETag y Last-Modified; responde 304 si el cliente ya tiene esa versión."""
+    etag = f'"{entrada.clave}"'
+    ultima = int(entrada.ultima_modificacion.timestamp()) if entrada.ultima_modificacion else None
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=ultima)
+    if no_modificado is not None:
+        no_modificado['ETag'] = etag
+        return no_modificado
+
+    response = FileResponse(
+        open(entrada.ruta, 'rb'),
+        as_attachment=True,
+        filename=nombre_archivo or entrada.nombre_archivo,
+        content_type=entrada.content_type,
+    )
+    response['ETag'] = etag
+    if ultima is not None:
+        response['Last-Modified'] = http_date(ultima)
+    # El navegador puede guardar la descarga pero debe revalidarla en cada uso
+    response['Cache-Control'] = 'private, no-cache'
+    return response
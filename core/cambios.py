@@ -0,0 +1,156 @@
+import datetime
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from .api import RECURSOS, leer_filas
+from .exportaciones import tamano_lote
+from .models import RegistroBaja
+
+
+class MarcaInvalida(ValueError):
+    pass
+
+
+def etiqueta(modelo):
+    return modelo._meta.label_lower
+
+
+def modelos_rastreados():
+    """{etiqueta del modelo: nombre del recurso} de los modelos cuyas bajas se registran."""
+    return {etiqueta(import_string(recurso.modelo)): nombre for nombre, recurso in RECURSOS.items()}
+
+
+def leer_marca(texto):
+    """Convierte la marca recibida (ISO 8601) en datetime con zona horaria; vacía = desde el principio."""
+    if not texto:
+        return None
+    marca = parse_datetime(texto)
+    if marca is None:
+        raise MarcaInvalida(texto)
+    if timezone.is_naive(marca):
+        marca = timezone.make_aware(marca)
+    return marca
+
+
+def _inicio_transaccion_abierta_mas_antigua():
+    """
+    Inicio de la transacción de escritura más antigua aún abierta en la base (None si no hay o
+    fuera de PostgreSQL). Solo cuentan las que ya tienen xid, es decir, las que escribieron algo.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT min(xact_start) FROM pg_stat_activity
+            WHERE datname = current_database() AND pid <> pg_backend_pid() AND backend_xid IS NOT NULL
+            """
+        )
+        return cursor.fetchone()[0]
+
+
+def ventana(desde=None):
+    """
+    Devuelve (desde, hasta) para una lectura del feed. Una transacción sin confirmar puede haber
+    escrito un updated_at anterior a ahora; si la lectura lo pasara de largo, la fila no volvería a
+    verse. Por eso `hasta` no supera el inicio de la transacción de escritura más antigua que sigue
+    abierta (sus filas tienen updated_at posterior a ese inicio) y además queda CAMBIOS_MARGEN
+    segundos en el pasado, que cubren la diferencia entre el reloj de la aplicación y el de la base.
+    Las filas de una transacción larga entran, así, en la lectura siguiente a su confirmación.
+    """
+    margen = datetime.timedelta(seconds=getattr(settings, 'CAMBIOS_MARGEN', 5))
+    hasta = timezone.now()
+    abierta = _inicio_transaccion_abierta_mas_antigua()
+    if abierta is not None and abierta < hasta:
+        hasta = abierta
+    hasta -= margen
+    if desde is not None and desde > hasta:
+        hasta = desde
+    return desde, hasta
+
+
+def _lookups_version(recurso):
+    # La versión propia y las de sus dependencias como lookups filtrables (Max('x') -> 'x')
+    return [recurso.version] + [
+        dependencia if isinstance(dependencia, str) else dependencia.get_source_expressions()[0].name
+        for dependencia in recurso.dependencias
+    ]
+
+
+def _en_ventana(modelo, recurso, desde, hasta):
+    """
+    Filtro de las filas cuya versión o la de alguna dependencia cae en (desde, hasta]: un cambio
+    de stock solo toca el saldo, pero el medicamento tiene que volver a enviarse. Cada dependencia
+    va en su propia subconsulta de ids para no multiplicar filas con los joins M2M.
+    """
+    condicion = Q()
+    for indice, lookup in enumerate(_lookups_version(recurso)):
+        rango = {f'{lookup}__lte': hasta}
+        if desde is not None:
+            rango[f'{lookup}__gt'] = desde
+        if indice == 0:
+            condicion |= Q(**rango)
+        else:
+            condicion |= Q(pk__in=modelo.objects.filter(**rango).values('pk'))
+    return condicion
+
+
+def eventos(nombre, desde, hasta, campos=None):
+    """
+    Genera los cambios de un recurso en (desde, hasta]: primero las altas y modificaciones,
+    con los campos pedidos, y después las bajas. Una fila modificada y luego eliminada en la
+    ventana solo aparece como baja, así que aplicar los eventos en orden deja el destino al día.
+    """
+    recurso = RECURSOS[nombre]
+    modelo = import_string(recurso.modelo)
+    campos = list(campos or recurso.por_defecto)
+    lote = tamano_lote()
+
+    cambiados = modelo.objects.filter(_en_ventana(modelo, recurso, desde, hasta))
+    ids = cambiados.order_by(recurso.version, 'pk').values_list('pk', flat=True)
+
+    # Los ids se recorren con un cursor de servidor y las filas completas se leen por lotes,
+    # así la memoria depende del tamaño del lote y no del volumen de cambios
+    pendientes = []
+    for pk in ids.iterator(chunk_size=lote):
+        pendientes.append(pk)
+        if len(pendientes) >= lote:
+            yield from _altas(modelo, recurso, nombre, campos, pendientes)
+            pendientes = []
+    if pendientes:
+        yield from _altas(modelo, recurso, nombre, campos, pendientes)
+
+    bajas = RegistroBaja.objects.filter(modelo=etiqueta(modelo), eliminado_en__lte=hasta)
+    if desde is not None:
+        bajas = bajas.filter(eliminado_en__gt=desde)
+    for objeto_id, eliminado_en in bajas.order_by('eliminado_en', 'id').values_list('objeto_id', 'eliminado_en').iterator(chunk_size=lote):
+        yield {'op': 'baja', 'recurso': nombre, 'id': objeto_id, 'eliminado_en': eliminado_en}
+
+
+def _altas(modelo, recurso, nombre, campos, ids):
+    por_id = dict(leer_filas(modelo.objects.filter(pk__in=ids), recurso, campos))
+    for pk in ids:
+        if pk in por_id:
+            yield {'op': 'cambio', 'recurso': nombre, 'id': pk, 'datos': por_id[pk]}
+
+
+def lineas_ndjson(nombres, desde, hasta, campos=None):
+    """Un objeto JSON por línea; la última lleva la marca a usar como `desde` en la próxima lectura."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for nombre in nombres:
+        for evento in eventos(nombre, desde, hasta, campos):
+            yield encoder.encode(evento) + '\n'
+    yield json.dumps({'op': 'marca', 'hasta': hasta.isoformat()}) + '\n'
+
+
+def purgar_bajas():
+    """Elimina las lápidas con más de CAMBIOS_RETENCION_DIAS; un consumidor más atrasado debe recargar todo."""
+    limite = timezone.now() - datetime.timedelta(days=getattr(settings, 'CAMBIOS_RETENCION_DIAS', 30))
+    return RegistroBaja.objects.filter(eliminado_en__lt=limite).delete()[0]
@@ -4,6 +4,8 @@ from django.urls import reverse_lazy
 from django.contrib import messages
 from functools import wraps
 
+from .roles import tiene_rol
+
 def role_required(allowed_roles=[]):
     """
     Decorador para vistas basadas en funciones que comprueba si el usuario tiene uno de los roles permitidos o es un superusuario.
@@ -14,12 +16,8 @@ def role_required(allowed_roles=[]):
             if not request.user.is_authenticated:
                 return redirect(reverse_lazy('core:login'))
 
-            # Los superusuarios siempre tienen acceso
-            if request.user.is_superuser:
-                return view_func(request, *args, **kwargs)
-
-            # Si el perfil del usuario está en los roles permitidos, se ejecuta la vista
-            if hasattr(request.user, 'perfilusuario') and request.user.perfilusuario.rol in allowed_roles:
+            # Superusuario o rol permitido (request.rol, cargado con el usuario: sin consultas extra)
+            if tiene_rol(request, allowed_roles):
                 return view_func(request, *args, **kwargs)
             else:
                 # Si no tiene el rol, se muestra un mensaje y se redirige
@@ -43,13 +41,7 @@ class RoleRequiredMixin(UserPassesTestMixin):
         if not self.request.user.is_authenticated:
             return False
         
-        # Los superusuarios siempre tienen acceso
-        if self.request.user.is_superuser:
-            return True
-            
-        if hasattr(self.request.user, 'perfilusuario'):
-            return self.request.user.perfilusuario.rol in self.allowed_roles
-        return False
+        return tiene_rol(self.request, self.allowed_roles)
 
     def handle_no_permission(self):
         """
@@ -0,0 +1,102 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from pacientes.models import Paciente
+from citas.models import Cita
+from citas.catalogos import id_estado
+from historiales.models import HistorialMedico
+
+# Las claves se invalidan desde core.signals cuando cambian pacientes, citas o historiales
+CLAVE_TOTAL_PACIENTES = 'dashboard:total_pacientes'
+CLAVE_CITAS_PENDIENTES = 'dashboard:citas_pendientes'
+CLAVE_TOTAL_HISTORIALES = 'dashboard:total_historiales'
+CLAVE_ULTIMAS_CITAS = 'dashboard:ultimas_citas'
+CLAVE_ULTIMOS_PACIENTES = 'dashboard:ultimos_pacientes'
+
+ESTADO_PENDIENTE = 'Programada'
+
+# Backends cuyo incr() es atómico entre procesos (LocMemCache lo es dentro de su único proceso).
+# En los demás, como DatabaseCache, incr() es leer y escribir: dos altas simultáneas perderían una.
+BACKENDS_INCR_ATOMICO = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 3600)
+
+
+def clave_citas_hoy(fecha=None):
+    # La fecha forma parte de la clave: a medianoche (hora de Caracas) se usa una clave nueva
+    fecha = fecha or timezone.localdate()
+    return f'dashboard:citas_hoy:{fecha.isoformat()}'
+
+
+def _segundos_hasta_medianoche():
+    ahora = timezone.localtime()
+    manana = timezone.make_aware(datetime.datetime.combine(ahora.date() + datetime.timedelta(days=1), datetime.time.min))
+    return max(1, int((manana - ahora).total_seconds()))
+
+
+def _calcular(clave):
+    if clave == CLAVE_TOTAL_PACIENTES:
+        return Paciente.objects.count()
+    if clave == CLAVE_CITAS_PENDIENTES:
+        return Cita.objects.filter(estado_id=id_estado(ESTADO_PENDIENTE)).count()
+    if clave == CLAVE_TOTAL_HISTORIALES:
+        return HistorialMedico.objects.count()
+    if clave == CLAVE_ULTIMAS_CITAS:
+        return list(Cita.objects.select_related('paciente', 'estado', 'motivo').order_by('-fecha')[:5])
+    if clave == CLAVE_ULTIMOS_PACIENTES:
+        return list(Paciente.objects.order_by('-created_at')[:5])
+    return Cita.objects.filter(fecha=timezone.localdate()).count()
+
+
+def obtener_estadisticas():
+    """
+    Devuelve los datos del dashboard desde la caché, calculando solo las claves ausentes.
+    """
+    hoy = clave_citas_hoy()
+    claves = {
+        'total_pacientes': CLAVE_TOTAL_PACIENTES,
+        'citas_hoy': hoy,
+        'citas_pendientes': CLAVE_CITAS_PENDIENTES,
+        'total_historiales': CLAVE_TOTAL_HISTORIALES,
+        'ultimas_citas': CLAVE_ULTIMAS_CITAS,
+        'ultimos_pacientes': CLAVE_ULTIMOS_PACIENTES,
+    }
+    en_cache = cache.get_many(claves.values())
+
+    datos = {}
+    for nombre, clave in claves.items():
+        if clave not in en_cache:
+            en_cache[clave] = _calcular(clave)
+            timeout = _segundos_hasta_medianoche() if clave == hoy else _timeout()
+            cache.set(clave, en_cache[clave], timeout)
+        datos[nombre] = en_cache[clave]
+    return datos
+
+
+def ajustar(clave, delta):
+    """
+    Aplica un incremento a un contador cacheado; si no está en caché se recalculará al leerlo.
+    Sin incr() atómico se borra la clave: un recuento en la próxima lectura es exacto, un
+    incremento perdido dejaría el contador mal hasta que venza.
+    """
+    if settings.CACHES['default']['BACKEND'] not in BACKENDS_INCR_ATOMICO:
+        cache.delete(clave)
+        return
+    try:
+        cache.incr(clave, delta)
+    except ValueError:
+        pass
+
+
+def invalidar(*claves):
+    cache.delete_many(claves)
@@ -0,0 +1,100 @@
+import itertools
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
+
+from . import cache_reportes
+
+CONTENT_TYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def tamano_lote():
+    """Filas por viaje a la base de datos al recorrer querysets con .iterator()."""
+    return getattr(settings, 'EXPORTACION_TAMANO_LOTE', 2000)
+
+
+def _anchos(encabezados, muestra):
+    # Ancho de cada columna según el encabezado y una muestra de filas, no la hoja completa
+    anchos = [len(str(encabezado)) for encabezado in encabezados]
+    for fila in muestra:
+        for indice, valor in enumerate(fila):
+            if valor is not None and indice < len(anchos):
+                anchos[indice] = max(anchos[indice], len(str(valor)))
+    return [ancho + 2 for ancho in anchos]
+
+
+def escribir_excel(destino, titulo_hoja, encabezados, filas, color_encabezado='0d6efd', centrar=False):
+    """
+    Escribe un libro de una hoja en modo write-only de openpyxl: las filas se vuelcan a disco
+    a medida que llegan, así que la memoria no crece con la cantidad de registros.
+    `filas` puede ser cualquier iterable (idealmente un generador sobre queryset.iterator()).
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=titulo_hoja)
+    ws.freeze_panes = 'A2'
+
+    filas = iter(filas)
+    muestra = list(itertools.islice(filas, getattr(settings, 'EXPORTACION_MUESTRA_ANCHOS', 200)))
+    for indice, ancho in enumerate(_anchos(encabezados, muestra), 1):
+        ws.column_dimensions[get_column_letter(indice)].width = ancho
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color=color_encabezado, end_color=color_encabezado, fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    fila_encabezado = []
+    for header in encabezados:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        fila_encabezado.append(cell)
+    ws.append(fila_encabezado)
+
+    for fila in itertools.chain(muestra, filas):
+        if centrar:
+            celdas = []
+            for valor in fila:
+                cell = WriteOnlyCell(ws, value=valor)
+                cell.alignment = header_alignment
+                celdas.append(cell)
+            ws.append(celdas)
+        else:
+            ws.append(fila)
+
+    wb.save(destino)
+
+
+def exportar_excel(nombre_archivo, titulo_hoja, encabezados, filas, color_encabezado='0d6efd', centrar=False,
+                   request=None, tipo=None, parametros=None):
+    """
+    Genera el Excel en un archivo temporal y lo envía en bloques con FileResponse
+    (una StreamingHttpResponse), sin mantener el libro ni el archivo en memoria.
+
+    Con `request` y `tipo` (una clave de core.cache_reportes.FUENTES) el libro se guarda en la
+    caché de reportes y se reutiliza, con ETag y Last-Modified, mientras los datos no cambien.
+    Como `filas` es un generador, en un acierto de caché no llega a ejecutarse ninguna consulta.
+    """
+    if request is not None and tipo and getattr(settings, 'REPORTES_CACHE_ACTIVA', True):
+        clave, ultima_modificacion = cache_reportes.calcular_clave('excel', tipo, parametros)
+        entrada = cache_reportes.obtener(clave)
+        if entrada is None:
+            entrada = cache_reportes.guardar(
+                clave, ultima_modificacion, nombre_archivo, CONTENT_TYPE_EXCEL,
+                lambda archivo: escribir_excel(archivo, titulo_hoja, encabezados, filas, color_encabezado, centrar),
+            )
+        return cache_reportes.responder(request, entrada, nombre_archivo)
+
+    archivo = tempfile.TemporaryFile()
+    escribir_excel(archivo, titulo_hoja, encabezados, filas, color_encabezado, centrar)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=nombre_archivo,
+        content_type=CONTENT_TYPE_EXCEL,
+    )
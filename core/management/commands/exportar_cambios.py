@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.api import RECURSOS
+from core.cambios import MarcaInvalida, leer_marca, lineas_ndjson, purgar_bajas, ventana
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta en NDJSON las altas, modificaciones y bajas desde una marca de tiempo. '
+        'Con --marcas guarda la marca de cada recurso para que la próxima ejecución continúe desde ahí.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recurso',
+            action='append',
+            choices=sorted(RECURSOS),
+            help='Recurso a exportar; se puede repetir. Por defecto, todos',
+        )
+        parser.add_argument('--desde', help='Marca inicial (ISO 8601). Sin marca se exporta todo')
+        parser.add_argument(
+            '--marcas',
+            help='Archivo JSON {recurso: marca}; se lee al empezar y se actualiza al terminar',
+        )
+        parser.add_argument('--salida', help='Archivo de salida. Por defecto, la salida estándar')
+        parser.add_argument(
+            '--purgar',
+            action='store_true',
+            help='Elimina además las lápidas más antiguas que CAMBIOS_RETENCION_DIAS',
+        )
+
+    def handle(self, *args, **options):
+        recursos = options['recurso'] or list(RECURSOS)
+        ruta_marcas = Path(options['marcas']) if options['marcas'] else None
+        marcas = {}
+        if ruta_marcas and ruta_marcas.exists():
+            marcas = json.loads(ruta_marcas.read_text(encoding='utf-8'))
+
+        try:
+            desde_comun = leer_marca(options['desde'])
+        except MarcaInvalida:
+            raise CommandError('--desde debe ser una fecha ISO 8601')
+
+        archivo = open(options['salida'], 'w', encoding='utf-8') if options['salida'] else None
+        if archivo:
+            escribir = archivo.write
+        else:
+            escribir = lambda linea: self.stdout.write(linea, ending='')
+        # Los mensajes van a stderr para no mezclarse con el NDJSON si la salida es stdout
+        try:
+            for nombre in recursos:
+                desde = desde_comun if options['desde'] else leer_marca(marcas.get(nombre))
+                desde, hasta = ventana(desde)
+                total = 0
+                for linea in lineas_ndjson([nombre], desde, hasta):
+                    escribir(linea)
+                    total += 1
+                marcas[nombre] = hasta.isoformat()
+                # La última línea es la marca, no un cambio
+                self.stderr.write(self.style.SUCCESS(f'{nombre}: {total - 1} cambios hasta {hasta.isoformat()}'))
+        finally:
+            if archivo:
+                archivo.close()
+
+        if ruta_marcas:
+            ruta_marcas.write_text(json.dumps(marcas, indent=2), encoding='utf-8')
+
+        if options['purgar']:
+            self.stderr.write(self.style.NOTICE(f'{purgar_bajas()} lápidas antiguas eliminadas'))
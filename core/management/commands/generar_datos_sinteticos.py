@@ -0,0 +1,427 @@
+import datetime
+import io
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from citas.catalogos import id_tipo_nota_sistema
+from citas.models import Cita, EstadoCita, MotivoCita, NotaCita, TipoCita, TipoNota
+from historiales.models import Alergia, Enfermedad, HistorialMedico
+from inventario.codigos import reservar_codigos
+from inventario.models import Categoria, Inventario, Medicamento, MovimientoInventario, Proveedor, StockMedicamento
+from pacientes.models import Ciudad, Direccion, Estado, Pais, Paciente, Telefono, TipoTelefono
+
+NOMBRES = [
+    'José', 'María', 'Luis', 'Ana', 'Carlos', 'Carmen', 'Juan', 'Rosa', 'Pedro', 'Luisa', 'Miguel', 'Elena',
+    'Jesús', 'Gabriela', 'Andrés', 'Daniela', 'Rafael', 'Valentina', 'Francisco', 'Andreína', 'Alejandro',
+    'Mariana', 'Jorge', 'Patricia', 'Ricardo', 'Isabel', 'Fernando', 'Sofía', 'Eduardo', 'Victoria',
+]
+APELLIDOS = [
+    'González', 'Rodríguez', 'Pérez', 'Hernández', 'García', 'Martínez', 'López', 'Díaz', 'Sánchez', 'Ramírez',
+    'Torres', 'Rojas', 'Flores', 'Morales', 'Castillo', 'Suárez', 'Mendoza', 'Gutiérrez', 'Medina', 'Romero',
+    'Blanco', 'Rivas', 'Silva', 'Méndez', 'Vargas', 'Herrera', 'Salazar', 'Marcano', 'Briceño', 'Guerrero',
+]
+CALLES = ['Av. Urdaneta', 'Av. Baralt', 'Calle Real', 'Av. Sucre', 'Av. Libertador', 'Calle Bolívar', 'Av. Fuerzas Armadas']
+ALERGIAS = [
+    'Penicilina', 'Amoxicilina', 'Sulfas', 'Aspirina', 'Ibuprofeno', 'Látex', 'Maní', 'Mariscos', 'Huevo',
+    'Leche', 'Polen', 'Ácaros', 'Picadura de abeja', 'Yodo', 'Gluten', 'Soya', 'Pelo de gato', 'Moho',
+]
+ENFERMEDADES = [
+    'Hipertensión arterial', 'Diabetes tipo 2', 'Asma', 'Hipotiroidismo', 'Artritis reumatoide', 'Migraña',
+    'Gastritis crónica', 'Dislipidemia', 'Insuficiencia renal crónica', 'EPOC', 'Epilepsia', 'Anemia',
+    'Obesidad', 'Depresión', 'Osteoporosis', 'Cardiopatía isquémica', 'Psoriasis', 'Rinitis alérgica',
+]
+CATEGORIAS = ['Analgésicos', 'Antibióticos', 'Vitaminas', 'Antihipertensivos', 'Antidiabéticos', 'Antialérgicos',
+              'Antiinflamatorios', 'Gastrointestinales']
+PROVEEDORES = ['Farmacéutica Nacional', 'Médica Distribuidora', 'Droguería Central', 'Laboratorios del Ávila',
+               'Suministros Clínicos', 'Distribuidora Andina']
+PRINCIPIOS = ['Ibuprofeno', 'Paracetamol', 'Amoxicilina', 'Losartán', 'Metformina', 'Loratadina', 'Omeprazol',
+              'Enalapril', 'Azitromicina', 'Diclofenac', 'Cetirizina', 'Atorvastatina', 'Vitamina C', 'Complejo B']
+PRESENTACIONES = ['100mg', '250mg', '400mg', '500mg', '850mg', '10mg', '50mg', 'jarabe', 'suspensión']
+
+
+@contextmanager
+def fechas_manuales(*modelos):
+    """
+    Desactiva auto_now/auto_now_add en los modelos indicados para que bulk_create respete las
+    fechas generadas (años de historia en lugar de todo creado "ahora").
+    """
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for modelo in modelos
+        for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera un conjunto de datos sintético y reproducible (misma semilla y fecha base = mismos datos) '
+        'para pruebas de rendimiento: pacientes con direcciones y teléfonos, historiales, citas con notas, '
+        'medicamentos, lotes y años de movimientos de inventario. Inserta con bulk_create por lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla del generador aleatorio')
+        parser.add_argument('--fecha-base', help='Fecha de referencia YYYY-MM-DD (por defecto hoy)')
+        parser.add_argument('--pacientes', type=int, default=1000)
+        parser.add_argument('--citas', type=int, default=5000)
+        parser.add_argument('--medicamentos', type=int, default=200)
+        parser.add_argument('--movimientos', type=int, default=20000)
+        parser.add_argument('--anios', type=int, default=3, help='Años de historia de citas y movimientos')
+        parser.add_argument('--historiales', type=float, default=0.7,
+                            help='Proporción de pacientes con historial médico (0 a 1)')
+        parser.add_argument('--tamano-lote', type=int, default=5000, help='Filas por INSERT')
+
+    def handle(self, *args, **options):
+        try:
+            self.fecha_base = (
+                datetime.date.fromisoformat(options['fecha_base']) if options['fecha_base'] else timezone.localdate()
+            )
+        except ValueError:
+            raise CommandError('--fecha-base debe tener el formato YYYY-MM-DD')
+
+        self.rng = random.Random(options['semilla'])
+        self.lote = max(1, options['tamano_lote'])
+        self.inicio_historia = self.fecha_base - datetime.timedelta(days=365 * max(1, options['anios']))
+        self.fin_agenda = self.fecha_base + datetime.timedelta(days=60)
+
+        # Un paciente tiene como mucho una cita por día (ver _citas): más citas no caben
+        dias_agenda = (self.fin_agenda - self.inicio_historia).days + 1
+        if options['pacientes'] > 0 and options['citas'] > options['pacientes'] * dias_agenda:
+            raise CommandError(
+                f"--citas no puede superar {options['pacientes'] * dias_agenda} "
+                f"({options['pacientes']} pacientes x {dias_agenda} días de agenda)"
+            )
+        self.stdout.write(self.style.NOTICE(
+            f"Semilla {options['semilla']}, fecha base {self.fecha_base.isoformat()}, lotes de {self.lote} filas"
+        ))
+
+        medicamentos = self._fase('Medicamentos', self._medicamentos, options['medicamentos'])
+        pacientes = self._fase('Pacientes', self._pacientes, options['pacientes'])
+        self._fase('Historiales', self._historiales, pacientes, options['historiales'])
+        self._fase('Lotes de inventario', self._lotes, medicamentos)
+        self._fase('Movimientos de inventario', self._movimientos, medicamentos, options['movimientos'])
+        self._fase('Citas y notas', self._citas, pacientes, options['citas'])
+
+        # bulk_create no emite post_save: se descartan estadísticas y catálogos cacheados
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Datos sintéticos generados'))
+
+    # --- Utilidades --- #
+
+    def _fase(self, titulo, funcion, *args):
+        inicio = time.monotonic()
+        with transaction.atomic():
+            resultado = funcion(*args)
+        total = len(resultado) if isinstance(resultado, list) else resultado
+        self.stdout.write(self.style.SUCCESS(f'{titulo}: {total} en {time.monotonic() - inicio:.1f} s'))
+        return resultado
+
+    def _insertar(self, modelo, filas, devolver=False):
+        """
+        bulk_create por lotes; acepta un generador para no tener todas las instancias en memoria.
+        Devuelve cuántas filas insertó, o la lista de instancias creadas si se pide `devolver`.
+        """
+        creados = [] if devolver else None
+        total = 0
+        pendientes = []
+        for fila in filas:
+            pendientes.append(fila)
+            if len(pendientes) >= self.lote:
+                lote = modelo.objects.bulk_create(pendientes)
+                total += len(lote)
+                if devolver:
+                    creados.extend(lote)
+                pendientes = []
+        if pendientes:
+            lote = modelo.objects.bulk_create(pendientes)
+            total += len(lote)
+            if devolver:
+                creados.extend(lote)
+        return creados if devolver else total
+
+    def _momento(self, fecha, hora=None):
+        if hora is None:
+            hora = datetime.time(self.rng.randint(7, 18), self.rng.randint(0, 59), self.rng.randint(0, 59))
+        return timezone.make_aware(datetime.datetime.combine(fecha, hora))
+
+    def _fecha_entre(self, desde, hasta):
+        return desde + datetime.timedelta(days=self.rng.randint(0, max(0, (hasta - desde).days)))
+
+    def _catalogo(self, modelo, nombres, **defaults):
+        existentes = {obj.nombre: obj for obj in modelo.objects.filter(nombre__in=nombres)}
+        faltantes = [modelo(nombre=nombre, **defaults) for nombre in nombres if nombre not in existentes]
+        for obj in modelo.objects.bulk_create(faltantes):
+            existentes[obj.nombre] = obj
+        return [existentes[nombre] for nombre in nombres]
+
+    # --- Fases --- #
+
+    def _pacientes(self, cantidad):
+        pais, _ = Pais.objects.get_or_create(nombre='Venezuela', defaults={'codigo_iso': 'VEN'})
+        estado, _ = Estado.objects.get_or_create(nombre='Distrito Capital', pais=pais)
+        ciudad, _ = Ciudad.objects.get_or_create(nombre='Caracas', estado=estado)
+        movil, fijo = self._catalogo(TipoTelefono, ['Móvil', 'Casa'])
+
+        # Documentos únicos de 8 dígitos (los que exige el formulario); se descartan los que ya existen
+        documentos = self.rng.sample(range(10_000_000, 100_000_000), cantidad + cantidad // 10 + 10)
+        usados = set()
+        for inicio in range(0, len(documentos), self.lote):
+            tramo = [str(numero) for numero in documentos[inicio:inicio + self.lote]]
+            usados.update(Paciente.objects.filter(numero_documento__in=tramo).values_list('numero_documento', flat=True))
+        documentos = [str(numero) for numero in documentos if str(numero) not in usados][:cantidad]
+
+        def filas():
+            for documento in documentos:
+                nombre = self.rng.choice(NOMBRES)
+                apellido = f'{self.rng.choice(APELLIDOS)} {self.rng.choice(APELLIDOS)}'
+                creado = self._momento(self._fecha_entre(self.inicio_historia, self.fecha_base))
+                yield Paciente(
+                    numero_documento=documento,
+                    nombre=nombre,
+                    apellido=apellido,
+                    fecha_nacimiento=self._fecha_entre(datetime.date(1935, 1, 1), datetime.date(2020, 12, 31)),
+                    genero=self.rng.choice('MF'),
+                    email=f'{documento}@correo.example' if self.rng.random() < 0.6 else None,
+                    created_at=creado,
+                    updated_at=creado,
+                )
+
+        with fechas_manuales(Paciente, Direccion, Telefono):
+            pacientes = self._insertar(Paciente, filas(), devolver=True)
+
+            self._insertar(Direccion, (
+                Direccion(
+                    paciente=paciente,
+                    ciudad=ciudad,
+                    direccion=f'{self.rng.choice(CALLES)}, casa {self.rng.randint(1, 999)}',
+                    codigo_postal=str(self.rng.randint(1010, 1090)),
+                    created_at=paciente.created_at,
+                    updated_at=paciente.created_at,
+                )
+                for paciente in pacientes
+            ))
+
+            def telefonos():
+                for paciente in pacientes:
+                    numeros = self.rng.sample(range(10_000_000), self.rng.choice((1, 1, 2)))
+                    for indice, numero in enumerate(numeros):
+                        tipo = movil if indice == 0 else fijo
+                        prefijo = self.rng.choice(('0412', '0414', '0424', '0416')) if tipo is movil else '0212'
+                        yield Telefono(
+                            paciente=paciente,
+                            tipo_telefono=tipo,
+                            numero=f'{prefijo}{numero:07d}',
+                            es_principal=indice == 0,
+                            created_at=paciente.created_at,
+                            updated_at=paciente.created_at,
+                        )
+
+            self._insertar(Telefono, telefonos())
+        return pacientes
+
+    def _historiales(self, pacientes, proporcion):
+        alergias = self._catalogo(Alergia, ALERGIAS)
+        enfermedades = self._catalogo(Enfermedad, ENFERMEDADES)
+        medicamentos = list(Medicamento.objects.order_by('id').values_list('id', flat=True)[:500])
+        con_historial = [paciente for paciente in pacientes if self.rng.random() < proporcion]
+
+        with fechas_manuales(HistorialMedico):
+            historiales = self._insertar(HistorialMedico, (
+                HistorialMedico(
+                    paciente=paciente,
+                    created_at=paciente.created_at,
+                    updated_at=self._momento(self._fecha_entre(paciente.created_at.date(), self.fecha_base)),
+                )
+                for paciente in con_historial
+            ), devolver=True)
+
+        # Reparto sesgado, como en la realidad: la mayoría sin alergias y unos pocos con varias
+        def relaciones(modelo_intermedio, campo, opciones, pesos):
+            for historial in historiales:
+                cantidad = self.rng.choices(range(len(pesos)), weights=pesos)[0]
+                for elegido in self.rng.sample(opciones, min(cantidad, len(opciones))):
+                    yield modelo_intermedio(historialmedico_id=historial.id, **{campo: elegido})
+
+        self._insertar(HistorialMedico.alergias.through, relaciones(
+            HistorialMedico.alergias.through, 'alergia_id', [a.id for a in alergias], (60, 25, 10, 5)))
+        self._insertar(HistorialMedico.enfermedades_preexistentes.through, relaciones(
+            HistorialMedico.enfermedades_preexistentes.through, 'enfermedad_id', [e.id for e in enfermedades], (45, 30, 15, 7, 3)))
+        if medicamentos:
+            self._insertar(HistorialMedico.medicamentos_actuales.through, relaciones(
+                HistorialMedico.medicamentos_actuales.through, 'medicamento_id', medicamentos, (50, 25, 15, 10)))
+        return historiales
+
+    def _medicamentos(self, cantidad):
+        categorias = self._catalogo(Categoria, CATEGORIAS)
+        proveedores = self._catalogo(Proveedor, PROVEEDORES)
+        codigos = reservar_codigos(cantidad)
+
+        with fechas_manuales(Medicamento):
+            medicamentos = self._insertar(Medicamento, (
+                Medicamento(
+                    nombre=f'{self.rng.choice(PRINCIPIOS)} {self.rng.choice(PRESENTACIONES)}',
+                    categoria=self.rng.choice(categorias),
+                    proveedor=self.rng.choice(proveedores),
+                    codigo=codigo,
+                    precio_unitario=Decimal(self.rng.randint(50, 50000)) / 100,
+                    stock_minimo=self.rng.choice((5, 10, 20, 50)),
+                    created_at=self._momento(self.inicio_historia),
+                    updated_at=self._momento(self.inicio_historia),
+                )
+                for codigo in codigos
+            ), devolver=True)
+        return medicamentos
+
+    def _lotes(self, medicamentos):
+        def filas():
+            for medicamento in medicamentos:
+                for numero in range(self.rng.randint(1, 4)):
+                    ingreso = self._fecha_entre(self.inicio_historia, self.fecha_base)
+                    momento = self._momento(ingreso)
+                    yield Inventario(
+                        medicamento=medicamento,
+                        cantidad=self.rng.randint(10, 500),
+                        fecha_caducidad=ingreso + datetime.timedelta(days=self.rng.randint(90, 1095)),
+                        lote=f'L{ingreso:%y%m}-{medicamento.id}-{numero + 1}',
+                        created_at=momento,
+                        updated_at=momento,
+                    )
+
+        with fechas_manuales(Inventario):
+            return self._insertar(Inventario, filas())
+
+    def _movimientos(self, medicamentos, cantidad):
+        """
+        Movimientos en orden cronológico repartidos en el periodo. Se lleva el saldo de cada
+        medicamento para que ninguna salida lo deje en negativo, y al final se cargan los saldos.
+        """
+        if not medicamentos:
+            return 0
+        saldos = {medicamento.id: 0 for medicamento in medicamentos}
+        ids = list(saldos)
+        inicio = self._momento(self.inicio_historia, datetime.time(0, 0))
+        duracion = (self._momento(self.fecha_base, datetime.time(0, 0)) - inicio).total_seconds()
+        desplazamientos = sorted(self.rng.uniform(0, duracion) for _ in range(cantidad))
+
+        def filas():
+            for segundos in desplazamientos:
+                momento = inicio + datetime.timedelta(seconds=int(segundos))
+                medicamento_id = self.rng.choice(ids)
+                salida = self.rng.randint(1, 30)
+                if self.rng.random() < 0.7 and saldos[medicamento_id] >= salida:
+                    tipo, cantidad_movida = 'salida', salida
+                    saldos[medicamento_id] -= salida
+                else:
+                    tipo, cantidad_movida = 'entrada', self.rng.randint(20, 300)
+                    saldos[medicamento_id] += cantidad_movida
+                yield MovimientoInventario(
+                    medicamento_id=medicamento_id,
+                    tipo=tipo,
+                    cantidad=cantidad_movida,
+                    fecha=momento,
+                    updated_at=momento,
+                    descripcion='Dispensación' if tipo == 'salida' else 'Reposición de inventario',
+                    usuario='generador',
+                )
+
+        with fechas_manuales(MovimientoInventario):
+            total = self._insertar(MovimientoInventario, filas())
+
+        # Medicamento.save() crea el saldo; con bulk_create hay que cargarlo aquí (en cero si no hay movimientos)
+        self._insertar(StockMedicamento, (
+            StockMedicamento(medicamento_id=medicamento_id, cantidad=saldo)
+            for medicamento_id, saldo in saldos.items()
+        ))
+        return total
+
+    def _citas(self, pacientes, cantidad):
+        if not pacientes or cantidad <= 0:
+            return 0
+        call_command('crear_datos_citas', stdout=io.StringIO())
+        estados = {estado.nombre: estado for estado in EstadoCita.objects.all()}
+        tipos = list(TipoCita.objects.all())
+        motivos = list(MotivoCita.objects.all())
+        tipo_nota, = self._catalogo(TipoNota, ['General'])
+        tipo_sistema_id = id_tipo_nota_sistema()
+        futuro = self.fin_agenda
+        # Resultado de las citas pasadas; las futuras quedan programadas
+        pasadas = [(estados.get('Completada'), 70), (estados.get('Cancelada'), 15), (estados.get('No asistió'), 15)]
+        pasadas = [(estado, peso) for estado, peso in pasadas if estado]
+        programada = estados.get('Programada') or next(iter(estados.values()))
+
+        # Un paciente no tiene dos citas el mismo día: así se respeta la restricción de solapamiento
+        ocupados = set()
+
+        def filas():
+            generadas = 0
+            while generadas < cantidad:
+                paciente = self.rng.choice(pacientes)
+                fecha = self._fecha_entre(self.inicio_historia, futuro)
+                if (paciente.id, fecha) in ocupados:
+                    continue
+                ocupados.add((paciente.id, fecha))
+                tipo = self.rng.choice(tipos)
+                inicio = datetime.time(self.rng.randint(8, 16), self.rng.choice((0, 15, 30, 45)))
+                fin = (datetime.datetime.combine(fecha, inicio)
+                       + datetime.timedelta(minutes=tipo.duracion_estimada or 30)).time()
+                if fin <= inicio:
+                    fin = datetime.time(23, 59)
+                if fecha < self.fecha_base and pasadas:
+                    estado = self.rng.choices([e for e, _ in pasadas], weights=[p for _, p in pasadas])[0]
+                else:
+                    estado = programada
+                creada = self._momento(max(self.inicio_historia, fecha - datetime.timedelta(days=self.rng.randint(1, 30))))
+                generadas += 1
+                yield Cita(
+                    paciente=paciente,
+                    tipo_cita=tipo,
+                    motivo=self.rng.choice(motivos),
+                    fecha=fecha,
+                    hora_inicio=inicio,
+                    hora_fin=fin,
+                    estado=estado,
+                    observaciones='Generada para pruebas de rendimiento' if self.rng.random() < 0.2 else None,
+                    created_at=creada,
+                    updated_at=max(creada, self._momento(min(fecha, self.fecha_base))),
+                )
+
+        with fechas_manuales(Cita, NotaCita):
+            citas = self._insertar(Cita, filas(), devolver=True)
+
+            def notas():
+                for cita in citas:
+                    if cita.estado_id != programada.id:
+                        yield NotaCita(
+                            cita=cita,
+                            tipo_nota_id=tipo_sistema_id,
+                            contenido=f"Estado cambiado de 'Programada' a '{cita.estado.nombre}' por generador.",
+                            created_at=cita.updated_at,
+                            updated_at=cita.updated_at,
+                        )
+                    for _ in range(self.rng.choice((0, 0, 1, 2))):
+                        yield NotaCita(
+                            cita=cita,
+                            tipo_nota=tipo_nota,
+                            contenido='Nota clínica de prueba.',
+                            created_at=cita.created_at,
+                            updated_at=cita.created_at,
+                        )
+
+            self._insertar(NotaCita, notas())
+        return citas
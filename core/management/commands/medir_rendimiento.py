@@ -0,0 +1,145 @@
+import io
+import json
+import platform
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+
+from core.rendimiento import ESCENARIOS, comparar, medir
+
+# Tamaños de generar_datos_sinteticos con --escala 1
+TAMANOS = {'pacientes': 1000, 'citas': 5000, 'medicamentos': 200, 'movimientos': 20000}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p95), consultas SQL y memoria pico de las vistas más usadas y de todas '
+        'las exportaciones sobre una base de pruebas poblada con generar_datos_sinteticos. '
+        'Emite JSON y, con --base, marca las regresiones respecto de una ejecución anterior.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1.0,
+                            help='Multiplicador del volumen de datos (1 = 1000 pacientes, 5000 citas...)')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--fecha-base', help='Fecha de referencia de los datos, YYYY-MM-DD. Fijarla hace comparables las ejecuciones')
+        parser.add_argument('--repeticiones', type=int, default=10)
+        parser.add_argument('--calentamiento', type=int, default=1, help='Peticiones descartadas antes de medir')
+        parser.add_argument('--escenario', action='append', choices=[e.nombre for e in ESCENARIOS],
+                            help='Escenario a medir; se puede repetir. Por defecto, todos')
+        parser.add_argument('--con-cache', action='store_true',
+                            help='No vaciar la caché entre peticiones (mide el camino caliente)')
+        parser.add_argument('--bd-actual', action='store_true',
+                            help='Usar la base configurada tal como está (sin crear ni poblar una base de pruebas); '
+                                 'crea en ella el superusuario medir_rendimiento si no existe')
+        parser.add_argument('--salida', help='Archivo JSON de resultados. Por defecto, la salida estándar')
+        parser.add_argument('--base', help='Resultados JSON anteriores con los que comparar')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento admitido de latencia y memoria antes de considerarlo regresión')
+
+    def handle(self, *args, **options):
+        base = None
+        if options['base']:
+            try:
+                base = json.loads(Path(options['base']).read_text(encoding='utf-8'))['resultados']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'No se pudo leer la base {options["base"]}: {e}')
+
+        setup_test_environment()
+        bases_creadas = None
+        try:
+            if not options['bd_actual']:
+                self.stderr.write(self.style.NOTICE('Creando la base de pruebas...'))
+                bases_creadas = setup_databases(verbosity=0, interactive=False)
+                self._poblar(options)
+            resultados = self._medir(options)
+        finally:
+            if bases_creadas is not None:
+                teardown_databases(bases_creadas, verbosity=0)
+            teardown_test_environment()
+
+        informe = {
+            'generado': timezone.now().isoformat(),
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'base_de_datos': connection.vendor,
+                'escala': None if options['bd_actual'] else options['escala'],
+                'semilla': options['semilla'],
+                'con_cache': options['con_cache'],
+                'repeticiones': options['repeticiones'],
+            },
+            'resultados': resultados,
+        }
+        texto = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options['salida']:
+            Path(options['salida']).write_text(texto + '\n', encoding='utf-8')
+            self.stderr.write(self.style.SUCCESS(f'Resultados guardados en {options["salida"]}'))
+        else:
+            self.stdout.write(texto)
+
+        if base is not None:
+            regresiones = comparar(resultados, base, options['tolerancia'])
+            for regresion in regresiones:
+                self.stderr.write(self.style.ERROR(f'Regresión: {regresion}'))
+            if regresiones:
+                raise CommandError(f'{len(regresiones)} regresiones respecto de {options["base"]}')
+            self.stderr.write(self.style.SUCCESS('Sin regresiones respecto de la base'))
+
+        # Un escenario que no responde 200 no mide lo que debe: la ejecución falla aunque no haya base
+        fallidos = [nombre for nombre, resultado in resultados.items() if 'fallo' in resultado]
+        if fallidos:
+            raise CommandError(f'Escenarios con respuestas de error: {", ".join(fallidos)}')
+
+    def _poblar(self, options):
+        tamanos = {clave: max(1, int(valor * options['escala'])) for clave, valor in TAMANOS.items()}
+        parametros = dict(tamanos, semilla=options['semilla'])
+        if options['fecha_base']:
+            parametros['fecha_base'] = options['fecha_base']
+        salida = io.StringIO()
+        call_command('generar_datos_sinteticos', stdout=salida, **parametros)
+        self.stderr.write(salida.getvalue(), ending='')
+
+    def _medir(self, options):
+        usuario = User.objects.filter(username='medir_rendimiento').first()
+        if usuario is None:
+            usuario = User.objects.create_superuser('medir_rendimiento', password=None)
+        cliente = Client()
+        cliente.force_login(usuario)
+
+        escenarios = [e for e in ESCENARIOS if not options['escenario'] or e.nombre in options['escenario']]
+        resultados = {}
+        # PDF en la petición y sin caché de reportes: se mide la generación, no la cola ni el acierto.
+        # El middleware de métricas se apaga para no sumar su costo ni mezclar estas peticiones.
+        with TemporaryDirectory() as carpeta, override_settings(
+            EXPORTACION_PDF_EN_SEGUNDO_PLANO=False,
+            REPORTES_CACHE_ACTIVA=options['con_cache'],
+            REPORTES_CACHE_DIR=carpeta,
+            METRICAS_ACTIVAS=False,
+        ):
+            for escenario in escenarios:
+                try:
+                    resultado = medir(cliente, escenario, max(1, options['repeticiones']),
+                                      max(0, options['calentamiento']), options['con_cache'])
+                except Exception as e:
+                    # Un escenario roto no invalida el resto de la ejecución
+                    resultado = {'omitido': f'{type(e).__name__}: {e}'}
+                resultados[escenario.nombre] = resultado
+                if 'omitido' in resultado:
+                    self.stderr.write(self.style.WARNING(f'{escenario.nombre}: omitido ({resultado["omitido"]})'))
+                    continue
+                estilo = self.style.ERROR if 'fallo' in resultado else self.style.SUCCESS
+                self.stderr.write(estilo(
+                    f"{escenario.nombre}: p50 {resultado['p50_ms']} ms, p95 {resultado['p95_ms']} ms, "
+                    f"{resultado['consultas']} consultas, {resultado['memoria_pico_kib']} KiB "
+                    f"({resultado.get('fallo', 'HTTP 200')})"
+                ))
+        return resultados
@@ -0,0 +1,161 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+from django.utils import timezone
+
+from core.models import TrabajoExportacion
+from core.reportes import devolver_a_la_cola, liberar_trabajos_colgados, purgar_trabajos_antiguos, reclamar_trabajos
+from core.transacciones import es_conflicto_serializacion
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre revisiones de trabajos colgados mientras el worker está en marcha
+REVISION_COLGADOS = 60
+
+
+def _inicializar_proceso():
+    # Los procesos del pool arrancan con 'spawn': cada uno configura Django y abre su propia conexión
+    import django
+    django.setup()
+
+
+def _crear_pool(procesos):
+    return ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_inicializar_proceso,
+    )
+
+
+def _procesar(trabajo_id):
+    from core.reportes import ejecutar_trabajo
+    close_old_connections()
+    try:
+        return ejecutar_trabajo(trabajo_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de exportaciones PDF con un pool de procesos (Ctrl+C para detener)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=getattr(settings, 'EXPORTACION_PROCESOS', 2),
+            help='Cantidad de procesos que generan reportes en paralelo',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=getattr(settings, 'EXPORTACION_INTERVALO', 2.0),
+            help='Segundos entre consultas a la cola cuando no hay trabajo',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa los trabajos pendientes y termina',
+        )
+
+    def handle(self, *args, **options):
+        procesos = max(1, options['procesos'])
+        intervalo = options['intervalo']
+
+        self._liberar_colgados()
+        purgados = purgar_trabajos_antiguos()
+        if purgados:
+            self.stdout.write(self.style.NOTICE(f'{purgados} exportaciones antiguas eliminadas'))
+        ultima_purga = ultima_revision = time.monotonic()
+
+        self.stdout.write(self.style.SUCCESS(f'Procesando exportaciones con {procesos} procesos'))
+        pool = _crear_pool(procesos)
+        en_curso = {}
+        try:
+            while True:
+                roto = False
+                libres = procesos - len(en_curso)
+                if libres > 0:
+                    try:
+                        for trabajo_id in reclamar_trabajos(libres):
+                            try:
+                                en_curso[pool.submit(_procesar, trabajo_id)] = trabajo_id
+                            except BrokenProcessPool:
+                                self._devolver([trabajo_id])
+                                roto = True
+                    except OperationalError as e:
+                        # Otro worker tomó la cola al mismo tiempo; se vuelve a intentar en la próxima vuelta
+                        if not es_conflicto_serializacion(e):
+                            raise
+
+                if not en_curso and not roto:
+                    if options['una_vez']:
+                        break
+                    time.sleep(intervalo)
+                elif en_curso:
+                    terminados, _ = wait(en_curso, timeout=intervalo, return_when=FIRST_COMPLETED)
+                    for futuro in terminados:
+                        trabajo_id = en_curso.pop(futuro)
+                        if isinstance(futuro.exception(), BrokenProcessPool):
+                            self._devolver([trabajo_id])
+                            roto = True
+                        else:
+                            self._registrar(trabajo_id, futuro)
+
+                if roto:
+                    # Un proceso murió (p. ej. falta de memoria) y el pool ya no acepta trabajos: no se
+                    # sabe cuál lo provocó, así que todos los que tenía vuelven a la cola con su intento
+                    # contado y el pool se recrea
+                    logger.error('El pool de exportaciones se rompió; se recrea')
+                    self._devolver(list(en_curso.values()))
+                    en_curso.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = _crear_pool(procesos)
+
+                if time.monotonic() - ultima_revision > REVISION_COLGADOS:
+                    self._liberar_colgados()
+                    ultima_revision = time.monotonic()
+                if time.monotonic() - ultima_purga > 3600:
+                    purgar_trabajos_antiguos()
+                    ultima_purga = time.monotonic()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Deteniendo; los trabajos en curso se terminarán antes de salir'))
+        finally:
+            pool.shutdown(wait=True)
+
+    def _liberar_colgados(self):
+        self._informar(*liberar_trabajos_colgados(), motivo='colgados')
+
+    def _devolver(self, trabajo_ids):
+        self._informar(*devolver_a_la_cola(TrabajoExportacion.objects.filter(pk__in=trabajo_ids)),
+                       motivo='interrumpidos')
+
+    def _informar(self, devueltos, fallidos, motivo):
+        if devueltos:
+            self.stdout.write(self.style.WARNING(f'{devueltos} trabajos {motivo} devueltos a la cola'))
+        if fallidos:
+            self.stdout.write(self.style.ERROR(f'{fallidos} trabajos {motivo} con error por agotar sus intentos'))
+
+    def _registrar(self, trabajo_id, futuro):
+        try:
+            estado = futuro.result()
+        except Exception as e:
+            # Falló fuera de ejecutar_trabajo (p. ej. al pasar el resultado entre procesos)
+            logger.exception('Fallo del proceso al generar la exportación %s', trabajo_id)
+            TrabajoExportacion.objects.filter(pk=trabajo_id).update(
+                estado=TrabajoExportacion.ESTADO_ERROR,
+                error=str(e) or e.__class__.__name__,
+                finalizado_en=timezone.now(),
+            )
+            estado = TrabajoExportacion.ESTADO_ERROR
+
+        if estado == TrabajoExportacion.ESTADO_COMPLETADO:
+            self.stdout.write(self.style.SUCCESS(f'Exportación {trabajo_id} completada'))
+        else:
+            self.stdout.write(self.style.ERROR(f'Exportación {trabajo_id} con error'))
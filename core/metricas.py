@@ -0,0 +1,166 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Literales y listas de parámetros se reemplazan para agrupar consultas iguales salvo por sus valores
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+_lock = threading.Lock()
+_muestras = {}  # vista -> deque de Muestra
+_lentas = {}    # vista -> [(duración, sql)] de las consultas más lentas vistas
+
+
+def plantilla(sql):
+    return _LISTAS.sub('(...)', _LITERALES.sub('?', sql))
+
+
+class RegistroConsultas:
+    """
+    Hook para connection.execute_wrapper: mide cada consulta ejecutada durante la petición.
+    `duplicadas` son sentencias repetidas con los mismos parámetros; `repetidas` agrupa por
+    plantilla, que es como se ve un N+1 (la misma consulta para cada fila de un listado).
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.tiempo = 0.0
+        self.consultas = []
+        self._exactas = Counter()
+        self._plantillas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.total += 1
+            self.tiempo += duracion
+            self.consultas.append((duracion, sql))
+            try:
+                self._exactas[(sql, repr(params))] += 1
+            except Exception:
+                pass
+            self._plantillas[plantilla(sql)] += 1
+
+    @property
+    def duplicadas(self):
+        return sum(veces - 1 for veces in self._exactas.values() if veces > 1)
+
+    def repetidas(self, umbral):
+        return [(sql, veces) for sql, veces in self._plantillas.most_common() if veces >= umbral]
+
+    def mas_lentas(self, cantidad):
+        return sorted(self.consultas, key=lambda consulta: consulta[0], reverse=True)[:cantidad]
+
+
+def registrar(vista, duracion, registro):
+    """Guarda la muestra de una petición en el almacén en memoria del proceso."""
+    ventana = getattr(settings, 'METRICAS_VENTANA', 200)
+    cantidad_lentas = getattr(settings, 'METRICAS_CONSULTAS_LENTAS', 5)
+    umbral = getattr(settings, 'METRICAS_UMBRAL_REPETIDAS', 5)
+    muestra = {
+        'duracion': duracion,
+        'tiempo_sql': registro.tiempo,
+        'consultas': registro.total,
+        'duplicadas': registro.duplicadas,
+        'repetidas': registro.repetidas(umbral),
+    }
+    with _lock:
+        muestras = _muestras.get(vista)
+        if muestras is None or muestras.maxlen != ventana:
+            muestras = _muestras[vista] = deque(muestras or (), maxlen=ventana)
+        muestras.append(muestra)
+
+        lentas = _lentas.get(vista, []) + [(d, sql[:1000]) for d, sql in registro.mas_lentas(cantidad_lentas)]
+        _lentas[vista] = sorted(lentas, key=lambda consulta: consulta[0], reverse=True)[:cantidad_lentas]
+
+    if muestra['repetidas']:
+        sql, veces = muestra['repetidas'][0]
+        logger.warning('%s: la misma consulta se ejecutó %s veces (posible N+1): %s', vista, veces, sql[:200])
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def resumen():
+    """Estadísticas por vista de las últimas METRICAS_VENTANA peticiones, de la más lenta a la más rápida."""
+    with _lock:
+        copia = {vista: list(muestras) for vista, muestras in _muestras.items()}
+        lentas = {vista: list(consultas) for vista, consultas in _lentas.items()}
+
+    filas = []
+    for vista, muestras in copia.items():
+        duraciones = [m['duracion'] * 1000 for m in muestras]
+        consultas = [m['consultas'] for m in muestras]
+        repetidas = Counter()
+        for m in muestras:
+            for sql, veces in m['repetidas']:
+                repetidas[sql] = max(repetidas[sql], veces)
+        filas.append({
+            'vista': vista,
+            'peticiones': len(muestras),
+            'p50': percentil(duraciones, 50),
+            'p95': percentil(duraciones, 95),
+            'maximo': max(duraciones),
+            'consultas_promedio': sum(consultas) / len(consultas),
+            'consultas_maximo': max(consultas),
+            'tiempo_sql_promedio': sum(m['tiempo_sql'] for m in muestras) * 1000 / len(muestras),
+            'duplicadas': sum(m['duplicadas'] for m in muestras),
+            'repetidas': repetidas.most_common(3),
+            'lentas': [(d * 1000, sql) for d, sql in lentas.get(vista, [])],
+        })
+    return sorted(filas, key=lambda fila: fila['p95'], reverse=True)
+
+
+def reiniciar():
+    with _lock:
+        _muestras.clear()
+        _lentas.clear()
+
+
+class MetricasMiddleware:
+    """
+    Cuenta y cronometra las consultas SQL de cada petición, agrega el encabezado Server-Timing
+    (visible en las herramientas de desarrollo del navegador) y guarda la muestra por nombre
+    de URL, p. ej. 'citas:index'. Se desactiva con METRICAS_ACTIVAS = False.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'METRICAS_ACTIVAS', True):
+            return self.get_response(request)
+
+        registro = RegistroConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(registro))
+            response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else 'sin_resolver'
+        registrar(vista, duracion, registro)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={registro.tiempo * 1000:.1f};desc="{registro.total} consultas"',
+            f'app;dur={(duracion - registro.tiempo) * 1000:.1f}',
+            f'total;dur={duracion * 1000:.1f}',
+        ])
+        return response
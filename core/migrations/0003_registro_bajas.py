@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_trabajos_exportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroBaja',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(help_text='Etiqueta del modelo, p. ej. pacientes.paciente', max_length=100)),
+                ('objeto_id', models.BigIntegerField()),
+                ('eliminado_en', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Registro de Baja',
+                'verbose_name_plural': 'Registro de Bajas',
+                'db_table': 'registro_bajas',
+                'ordering': ['-eliminado_en'],
+                'indexes': [models.Index(fields=['modelo', 'eliminado_en'], name='registro_bajas_feed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:47
+
+import core.models
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models
+
+
+def mover_a_privado(apps, schema_editor):
+    # Los PDF ya generados estaban en MEDIA_ROOT con nombres predecibles: se pasan al
+    # almacén privado con nombre aleatorio y se borran de la carpeta pública
+    TrabajoExportacion = apps.get_model('core', 'TrabajoExportacion')
+    publico = FileSystemStorage()
+    for trabajo in TrabajoExportacion.objects.exclude(archivo=''):
+        anterior = trabajo.archivo.name
+        if not publico.exists(anterior):
+            continue
+        with publico.open(anterior, 'rb') as contenido:
+            trabajo.archivo.save(anterior, contenido, save=False)
+        TrabajoExportacion.objects.filter(pk=trabajo.pk).update(archivo=trabajo.archivo.name)
+        publico.delete(anterior)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_tabla_cache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trabajoexportacion',
+            name='archivo',
+            field=models.FileField(blank=True, storage=core.models.almacen_exportaciones, upload_to=core.models.ruta_exportacion),
+        ),
+        migrations.RunPython(mover_a_privado, migrations.RunPython.noop),
+    ]
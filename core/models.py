@@ -1,7 +1,11 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.utils import timezone
 
 
 class PerfilUsuario(models.Model):
@@ -25,13 +29,76 @@ class PerfilUsuario(models.Model):
         verbose_name_plural = 'Perfiles de Usuarios'
 
 
-@receiver(post_save, sender=User)
-def crear_perfil_usuario(sender, instance, created, **kwargs):
-    if created:
-        PerfilUsuario.objects.create(usuario=instance)
 
+def almacen_exportaciones():
+    # Fuera de MEDIA_ROOT: los PDF solo se entregan por la vista descargar_exportacion
+    return FileSystemStorage(location=settings.EXPORTACION_DIR, base_url=None)
+
+
+def ruta_exportacion(trabajo, nombre):
+    # Nombre aleatorio en disco; el nombre legible se guarda en nombre_archivo
+    return timezone.now().strftime('%Y/%m/') + uuid.uuid4().hex + os.path.splitext(nombre)[1]
 
-@receiver(post_save, sender=User)
-def guardar_perfil_usuario(sender, instance, **kwargs):
-    if hasattr(instance, 'perfilusuario'):
-        instance.perfilusuario.save()
+
+class TrabajoExportacion(models.Model):
+    """Reporte PDF encolado para generarse fuera de la petición (ver core.reportes)."""
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_PROCESANDO = 'procesando'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+    ESTADO_OPCIONES = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exportaciones')
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=15, choices=ESTADO_OPCIONES, default=ESTADO_PENDIENTE)
+    archivo = models.FileField(storage=almacen_exportaciones, upload_to=ruta_exportacion, blank=True)
+    nombre_archivo = models.CharField(max_length=200, blank=True)
+    tamano = models.PositiveBigIntegerField(null=True, blank=True, help_text='Tamaño del archivo en bytes')
+    duracion = models.FloatField(null=True, blank=True, help_text='Tiempo de generación en segundos')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    finalizado_en = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} - {self.get_estado_display()}"
+
+    @property
+    def terminado(self):
+        return self.estado in (self.ESTADO_COMPLETADO, self.ESTADO_ERROR)
+
+    class Meta:
+        db_table = 'trabajos_exportacion'
+        verbose_name = 'Trabajo de Exportación'
+        verbose_name_plural = 'Trabajos de Exportación'
+        ordering = ['-created_at']
+        indexes = [
+            # El worker toma los pendientes en orden de llegada
+            models.Index(fields=['estado', 'created_at'], name='exportacion_cola_idx'),
+        ]
+
+class RegistroBaja(models.Model):
+    """Lápida de una fila eliminada, para el feed de cambios (ver core.cambios)."""
+    modelo = models.CharField(max_length=100, help_text='Etiqueta del modelo, p. ej. pacientes.paciente')
+    objeto_id = models.BigIntegerField()
+    eliminado_en = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} eliminado el {self.eliminado_en:%d/%m/%Y %H:%M}"
+
+    class Meta:
+        db_table = 'registro_bajas'
+        verbose_name = 'Registro de Baja'
+        verbose_name_plural = 'Registro de Bajas'
+        ordering = ['-eliminado_en']
+        indexes = [
+            # El feed lee las bajas de un modelo en una ventana de tiempo
+            models.Index(fields=['modelo', 'eliminado_en'], name='registro_bajas_feed_idx'),
+        ]
@@ -0,0 +1,191 @@
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+SALT_CURSOR = 'core.paginacion'
+
+ADELANTE = 'n'
+ATRAS = 'p'
+
+
+class CursorInvalido(Exception):
+    pass
+
+
+def total_aproximado(queryset):
+    """
+    Filas de la tabla según las estadísticas de PostgreSQL (pg_class.reltuples), sin recorrerla.
+    Solo tiene sentido para un queryset sin filtros; en otro caso, o si la tabla aún no fue
+    analizada o la base no es PostgreSQL, devuelve None.
+    """
+    if queryset.query.where:
+        return None
+    conexion = connections[queryset.db]
+    if conexion.vendor != 'postgresql':
+        return None
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        fila = cursor.fetchone()
+    if fila is None or fila[0] < 0:
+        return None
+    return fila[0]
+
+
+class PaginaKeyset:
+    """Una página de KeysetPaginator; se recorre como la lista de objetos."""
+
+    def __init__(self, object_list, paginator, cursor_anterior, cursor_siguiente):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def total(self):
+        return self.paginator.total
+
+
+class KeysetPaginator:
+    """
+    Paginación por clave (keyset) en lugar de OFFSET: cada página continúa a partir de los valores
+    de orden de la última fila vista, así que el costo no crece con la profundidad y no hace falta
+    un COUNT(*).
+
+    `orden` es la secuencia de campos del ORDER BY (con '-' para descendente) y debe terminar en
+    un campo único, normalmente 'id' o '-id', para que el orden sea total. Los campos no pueden
+    ser nulos. Los cursores son opacos y van firmados, así que no se pueden manipular.
+
+    `total` puede ser None (no se cuenta), 'aproximado' (pg_class.reltuples, solo sin filtros) o
+    'exacto' (COUNT(*)).
+    """
+
+    def __init__(self, queryset, orden, per_page=10, total=None):
+        self.queryset = queryset.order_by(*orden)
+        self.orden = tuple(orden)
+        self.per_page = per_page
+        self.modo_total = total
+        self._total = None
+        self._campos = [queryset.model._meta.get_field(self._nombre(campo)) for campo in self.orden]
+
+    @staticmethod
+    def _nombre(campo):
+        return campo.lstrip('-')
+
+    @property
+    def total(self):
+        if self._total is None and self.modo_total:
+            if self.modo_total == 'exacto':
+                self._total = self.queryset.count()
+            else:
+                self._total = total_aproximado(self.queryset)
+        return self._total
+
+    # --- Cursores --- #
+
+    @staticmethod
+    def _valor(campo, objeto):
+        # Admite instancias y también filas de .values(), que no instancian el modelo
+        if isinstance(objeto, dict):
+            valor = objeto[campo.attname] if campo.attname in objeto else objeto[campo.name]
+        else:
+            valor = campo.value_from_object(objeto)
+        return valor.isoformat() if hasattr(valor, 'isoformat') else str(valor)
+
+    def _valores(self, objeto):
+        return [self._valor(campo, objeto) for campo in self._campos]
+
+    def _codificar(self, objeto, direccion):
+        return signing.dumps([direccion, self._valores(objeto)], salt=SALT_CURSOR, compress=True)
+
+    def _decodificar(self, cursor):
+        try:
+            direccion, valores = signing.loads(
+                cursor, salt=SALT_CURSOR,
+                max_age=getattr(settings, 'PAGINACION_CURSOR_MAX_EDAD', None),
+            )
+            if direccion not in (ADELANTE, ATRAS) or len(valores) != len(self._campos):
+                raise ValueError
+            return direccion, [campo.to_python(valor) for campo, valor in zip(self._campos, valores)]
+        except (signing.BadSignature, ValueError, TypeError):
+            raise CursorInvalido(cursor)
+
+    def _despues_de(self, valores, direccion):
+        """
+        Condición (a, b, c) > (x, y, z) respetando la dirección de cada campo:
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z). El primer término se repite
+        como a >= x para que PostgreSQL pueda usar el índice como rango.
+        """
+        condicion = Q()
+        iguales = {}
+        for campo, valor in zip(self.orden, valores):
+            nombre = self._nombre(campo)
+            ascendente = not campo.startswith('-')
+            if direccion == ATRAS:
+                ascendente = not ascendente
+            condicion |= Q(**iguales, **{f'{nombre}__{"gt" if ascendente else "lt"}': valor})
+            iguales[nombre] = valor
+
+        primero = self.orden[0]
+        ascendente = not primero.startswith('-')
+        if direccion == ATRAS:
+            ascendente = not ascendente
+        rango = Q(**{f'{self._nombre(primero)}__{"gte" if ascendente else "lte"}': valores[0]})
+        return rango & condicion
+
+    def get_page(self, cursor=None):
+        """Devuelve la página que sigue (o precede) al cursor; un cursor vacío o inválido da la primera."""
+        direccion, valores = ADELANTE, None
+        if cursor:
+            try:
+                direccion, valores = self._decodificar(cursor)
+            except CursorInvalido:
+                pass
+
+        queryset = self.queryset
+        if direccion == ATRAS:
+            queryset = queryset.reverse()
+        if valores is not None:
+            queryset = queryset.filter(self._despues_de(valores, direccion))
+
+        # Una fila de más indica si hay otra página en esa dirección
+        filas = list(queryset[:self.per_page + 1])
+        hay_mas = len(filas) > self.per_page
+        filas = filas[:self.per_page]
+
+        if direccion == ATRAS:
+            filas.reverse()
+            hay_anterior, hay_siguiente = hay_mas, True
+        else:
+            hay_anterior, hay_siguiente = valores is not None, hay_mas
+
+        if not filas:
+            # Las filas del cursor ya no existen (borradas o editadas): se vuelve al principio
+            return self.get_page() if valores is not None else PaginaKeyset([], self, None, None)
+        return PaginaKeyset(
+            filas,
+            self,
+            self._codificar(filas[0], ATRAS) if hay_anterior else None,
+            self._codificar(filas[-1], ADELANTE) if hay_siguiente else None,
+        )
@@ -0,0 +1,170 @@
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from .metricas import percentil
+
+# `url` es el nombre de la URL; `kwargs` puede ser una función que recibe nada y devuelve los kwargs
+Escenario = namedtuple('Escenario', ['nombre', 'url', 'parametros', 'kwargs'], defaults=(None, None))
+
+EXPORTACIONES = [
+    'pacientes:exportar_pacientes_pdf', 'pacientes:exportar_pacientes_excel',
+    'citas:exportar_citas_pdf', 'citas:exportar_citas_excel',
+    'historiales:exportar_historiales_pdf', 'historiales:exportar_historiales_excel',
+    'inventario:exportar_categorias_pdf', 'inventario:exportar_categorias_excel',
+    'inventario:exportar_proveedores_pdf', 'inventario:exportar_proveedores_excel',
+    'inventario:exportar_medicamentos_pdf', 'inventario:exportar_medicamentos_excel',
+    'inventario:exportar_inventario_pdf', 'inventario:exportar_inventario_excel',
+    'inventario:exportar_stock_pdf', 'inventario:exportar_stock_excel',
+]
+
+
+def _primer_historial():
+    from historiales.models import HistorialMedico
+    historial_id = HistorialMedico.objects.order_by('id').values_list('id', flat=True).first()
+    return {'historial_id': historial_id} if historial_id else None
+
+
+ESCENARIOS = [
+    Escenario('dashboard', 'core:dashboard'),
+    Escenario('citas.index', 'citas:index'),
+    Escenario('search_all', 'core:search_all', {'q': 'González'}),
+    Escenario('stock_medicamentos', 'inventario:stock_medicamentos'),
+    Escenario('historiales.index', 'historiales:index'),
+    Escenario('exportar_historial_individual_pdf', 'historiales:exportar_historial_individual_pdf',
+              kwargs=_primer_historial),
+] + [Escenario(url.split(':')[1], url) for url in EXPORTACIONES]
+
+
+def _pedir(cliente, url, parametros):
+    response = cliente.get(url, parametros or {})
+    # Las exportaciones se envían en bloques: hay que consumirlas para medir el trabajo completo
+    if response.streaming:
+        tamano = sum(len(bloque) for bloque in response.streaming_content)
+    else:
+        tamano = len(response.content)
+    response.close()
+    return response.status_code, tamano
+
+
+@contextmanager
+def contar_consultas():
+    """
+    Cuenta las consultas SQL de todas las conexiones, incluidas las que se abren en otros hilos
+    durante la medición (la búsqueda global reparte sus categorías en un pool de hilos, cada uno
+    con su conexión). Produce una lista de un elemento con el total acumulado.
+    """
+    total = [0]
+    candado = threading.Lock()
+    instaladas = []
+
+    def contar(execute, sql, params, many, context):
+        with candado:
+            total[0] += 1
+        return execute(sql, params, many, context)
+
+    def instalar(conexion):
+        with candado:
+            if contar not in conexion.execute_wrappers:
+                conexion.execute_wrappers.append(contar)
+                instaladas.append(conexion)
+
+    def al_conectar(sender, connection, **kwargs):
+        instalar(connection)
+
+    # Conexiones de este hilo; las de otros hilos se enganchan al abrirse (CONN_MAX_AGE = 0
+    # hace que los hilos de la búsqueda abran una conexión nueva en cada tarea)
+    for alias in connections:
+        instalar(connections[alias])
+    connection_created.connect(al_conectar)
+    try:
+        yield total
+    finally:
+        connection_created.disconnect(al_conectar)
+        with candado:
+            for conexion in instaladas:
+                if contar in conexion.execute_wrappers:
+                    conexion.execute_wrappers.remove(contar)
+
+
+def medir(cliente, escenario, repeticiones=10, calentamiento=1, con_cache=False):
+    """
+    Ejecuta el escenario con el cliente de pruebas y devuelve latencias (ms), consultas SQL y
+    memoria pico de Python (KiB, con tracemalloc en una pasada aparte para no distorsionar los
+    tiempos). Sin `con_cache` se vacía la caché antes de cada petición: se mide el camino frío.
+    """
+    kwargs = escenario.kwargs() if callable(escenario.kwargs) else escenario.kwargs
+    if callable(escenario.kwargs) and kwargs is None:
+        return {'omitido': 'sin datos para el escenario'}
+    url = reverse(escenario.url, kwargs=kwargs)
+
+    for _ in range(calentamiento):
+        _pedir(cliente, url, escenario.parametros)
+
+    tiempos, consultas, fallos = [], [], set()
+    for _ in range(repeticiones):
+        if not con_cache:
+            cache.clear()
+        with contar_consultas() as capturadas:
+            inicio = time.perf_counter()
+            status, tamano = _pedir(cliente, url, escenario.parametros)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(capturadas[0])
+        if status != 200:
+            fallos.add(status)
+
+    if not con_cache:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        _pedir(cliente, url, escenario.parametros)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    resultado = {
+        'url': url,
+        'status': status,
+        'bytes': tamano,
+        'repeticiones': repeticiones,
+        'p50_ms': round(percentil(tiempos, 50), 2),
+        'p95_ms': round(percentil(tiempos, 95), 2),
+        'max_ms': round(max(tiempos), 2),
+        'media_ms': round(statistics.fmean(tiempos), 2),
+        'consultas': max(consultas),
+        'memoria_pico_kib': round(pico / 1024, 1),
+    }
+    # Una respuesta de error suele ser más rápida y con menos consultas: no puede pasar por una mejora
+    if fallos:
+        resultado['fallo'] = f"HTTP {', '.join(str(codigo) for codigo in sorted(fallos))}"
+    return resultado
+
+
+def comparar(resultados, base, tolerancia=0.25):
+    """
+    Compara contra una ejecución anterior y devuelve las regresiones como texto. Latencia y
+    memoria admiten `tolerancia` (proporción) por el ruido de la medición; las consultas no,
+    porque son deterministas y una consulta más suele ser un N+1 nuevo.
+    """
+    regresiones = []
+    for nombre, actual in resultados.items():
+        if 'fallo' in actual:
+            regresiones.append(f"{nombre}: {actual['fallo']}")
+            continue
+        anterior = base.get(nombre)
+        if not anterior or 'omitido' in actual or 'omitido' in anterior or 'fallo' in anterior:
+            continue
+        if actual['consultas'] > anterior['consultas']:
+            regresiones.append(f"{nombre}: consultas {anterior['consultas']} -> {actual['consultas']}")
+        for metrica in ('p95_ms', 'memoria_pico_kib'):
+            if actual[metrica] > anterior[metrica] * (1 + tolerancia):
+                regresiones.append(f'{nombre}: {metrica} {anterior[metrica]} -> {actual[metrica]}')
+    return regresiones
@@ -0,0 +1,215 @@
+import datetime
+import logging
+import time
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from xhtml2pdf import pisa
+
+from . import cache_reportes
+from .models import TrabajoExportacion
+
+logger = logging.getLogger(__name__)
+
+# `contexto` es la ruta a una función que recibe los parámetros del trabajo y devuelve el contexto
+# de la plantilla; `archivo` se formatea con ese contexto y la fecha de generación.
+Reporte = namedtuple('Reporte', ['titulo', 'plantilla', 'contexto', 'archivo'])
+
+REPORTES_PDF = {
+    'citas': Reporte('Reporte de citas', 'citas/pdf_template.html',
+                     'citas.reportes.contexto_citas', 'reporte_citas_{fecha}.pdf'),
+    'pacientes': Reporte('Dossier de pacientes', 'pacientes/pdf_template.html',
+                         'pacientes.reportes.contexto_pacientes', 'dossier_pacientes_{fecha}.pdf'),
+    'historial': Reporte('Historial médico', 'historiales/pdf_template.html',
+                         'historiales.reportes.contexto_historial', 'historial_{historial.paciente.numero_documento}_{fecha}.pdf'),
+    'historiales': Reporte('Reporte de historiales', 'historiales/pdf/historiales_template.html',
+                           'historiales.reportes.contexto_historiales', 'reporte_historiales_{fecha}.pdf'),
+    'stock': Reporte('Reporte de stock', 'inventario/pdf/stock_template.html',
+                     'inventario.reportes.contexto_stock', 'reporte_stock_{fecha}.pdf'),
+    'medicamentos': Reporte('Reporte de medicamentos', 'inventario/pdf/medicamentos_template.html',
+                            'inventario.reportes.contexto_medicamentos', 'reporte_medicamentos_{fecha}.pdf'),
+    'proveedores': Reporte('Reporte de proveedores', 'inventario/pdf/proveedores_template.html',
+                           'inventario.reportes.contexto_proveedores', 'reporte_proveedores_{fecha}.pdf'),
+    'categorias': Reporte('Reporte de categorías', 'inventario/pdf/categorias_template.html',
+                          'inventario.reportes.contexto_categorias', 'reporte_categorias_{fecha}.pdf'),
+    'inventario': Reporte('Reporte de inventario', 'inventario/pdf/inventario_template.html',
+                          'inventario.reportes.contexto_inventario', 'reporte_inventario_{fecha}.pdf'),
+}
+
+
+class ErrorReporte(Exception):
+    pass
+
+
+def generar_pdf(tipo, parametros=None):
+    """Renderiza el reporte y devuelve (contenido, nombre_archivo). Lanza ErrorReporte si pisa falla."""
+    reporte = REPORTES_PDF[tipo]
+    context = import_string(reporte.contexto)(parametros or {})
+    context.update({
+        'logo_path': str(settings.BASE_DIR / 'static/img/logo.png'),
+        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M'),
+    })
+
+    html = get_template(reporte.plantilla).render(context)
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+    if pdf.err:
+        raise ErrorReporte("Error al generar el PDF.")
+
+    nombre = reporte.archivo.format(fecha=datetime.datetime.now().strftime("%Y%m%d"), **context)
+    return result.getvalue(), nombre
+
+
+def _cache_activa():
+    return getattr(settings, 'REPORTES_CACHE_ACTIVA', True)
+
+
+def pdf_cacheado(tipo, parametros=None):
+    """
+    Devuelve la entrada de core.cache_reportes para el reporte, generándolo solo si los datos
+    cambiaron desde la última vez (o si la entrada fue desalojada).
+    """
+    clave, ultima_modificacion = cache_reportes.calcular_clave('pdf', tipo, parametros)
+    entrada = cache_reportes.obtener(clave)
+    if entrada is None:
+        contenido, nombre = generar_pdf(tipo, parametros)
+        entrada = cache_reportes.guardar(
+            clave, ultima_modificacion, nombre, 'application/pdf',
+            lambda archivo: archivo.write(contenido),
+        )
+    return entrada
+
+
+def respuesta_pdf(request, tipo, parametros=None):
+    """Genera el reporte dentro de la petición, como hacían originalmente las vistas de exportación."""
+    try:
+        if _cache_activa():
+            return cache_reportes.responder(request, pdf_cacheado(tipo, parametros))
+        contenido, nombre = generar_pdf(tipo, parametros)
+    except ErrorReporte as e:
+        return HttpResponse(str(e), status=400)
+    response = HttpResponse(contenido, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+
+def exportar_pdf(request, tipo, parametros=None):
+    """
+    Punto de entrada de las vistas exportar_*_pdf. Si el reporte ya está en la caché para la
+    versión actual de los datos se sirve directamente; si no, se encola y se redirige a la página
+    de seguimiento, o se genera en la petición si EXPORTACION_PDF_EN_SEGUNDO_PLANO es False.
+    """
+    if not getattr(settings, 'EXPORTACION_PDF_EN_SEGUNDO_PLANO', True):
+        return respuesta_pdf(request, tipo, parametros)
+    if _cache_activa():
+        clave, _ = cache_reportes.calcular_clave('pdf', tipo, parametros)
+        entrada = cache_reportes.obtener(clave)
+        if entrada is not None:
+            return cache_reportes.responder(request, entrada)
+    trabajo = TrabajoExportacion.objects.create(usuario=request.user, tipo=tipo, parametros=parametros or {})
+    return redirect('core:detalle_exportacion', pk=trabajo.pk)
+
+
+def reclamar_trabajos(limite):
+    """
+    Marca como 'procesando' hasta `limite` trabajos pendientes y devuelve sus ids.
+    SKIP LOCKED permite varios workers sobre la misma cola sin tomar el mismo trabajo.
+    """
+    with transaction.atomic():
+        ids = list(
+            TrabajoExportacion.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado=TrabajoExportacion.ESTADO_PENDIENTE)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limite]
+        )
+        if ids:
+            # El intento se cuenta al reclamarlo: así también cuentan los que tumban al worker
+            TrabajoExportacion.objects.filter(id__in=ids).update(
+                estado=TrabajoExportacion.ESTADO_PROCESANDO,
+                iniciado_en=timezone.now(),
+                intentos=F('intentos') + 1,
+            )
+    return ids
+
+
+def devolver_a_la_cola(trabajos):
+    """
+    Devuelve a la cola los trabajos 'procesando' del queryset. Los que ya agotaron
+    EXPORTACION_MAX_INTENTOS se marcan con error: un reporte que cuelga o mata al proceso
+    no se reintenta sin fin. Devuelve (devueltos, fallidos).
+    """
+    maximo = getattr(settings, 'EXPORTACION_MAX_INTENTOS', 3)
+    trabajos = trabajos.filter(estado=TrabajoExportacion.ESTADO_PROCESANDO)
+    fallidos = trabajos.filter(intentos__gte=maximo).update(
+        estado=TrabajoExportacion.ESTADO_ERROR,
+        error=f'Se agotaron los {maximo} intentos sin que el proceso terminara el reporte',
+        finalizado_en=timezone.now(),
+    )
+    devueltos = trabajos.filter(intentos__lt=maximo).update(
+        estado=TrabajoExportacion.ESTADO_PENDIENTE,
+        iniciado_en=None,
+    )
+    return devueltos, fallidos
+
+
+def liberar_trabajos_colgados():
+    """Devuelve a la cola los trabajos que quedaron 'procesando' más allá del tiempo máximo (worker caído)."""
+    limite = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'EXPORTACION_TIEMPO_MAXIMO', 600))
+    return devolver_a_la_cola(TrabajoExportacion.objects.filter(iniciado_en__lt=limite))
+
+
+def ejecutar_trabajo(trabajo_id):
+    """Genera el PDF de un trabajo ya reclamado y guarda archivo, tamaño y duración."""
+    trabajo = TrabajoExportacion.objects.get(pk=trabajo_id)
+    inicio = time.monotonic()
+    try:
+        if _cache_activa():
+            entrada = pdf_cacheado(trabajo.tipo, trabajo.parametros)
+            with open(entrada.ruta, 'rb') as archivo:
+                contenido, nombre = archivo.read(), entrada.nombre_archivo
+        else:
+            contenido, nombre = generar_pdf(trabajo.tipo, trabajo.parametros)
+    except Exception as e:
+        logger.exception('Error al generar la exportación %s', trabajo_id)
+        TrabajoExportacion.objects.filter(pk=trabajo_id).update(
+            estado=TrabajoExportacion.ESTADO_ERROR,
+            error=str(e) or e.__class__.__name__,
+            duracion=time.monotonic() - inicio,
+            finalizado_en=timezone.now(),
+        )
+        return TrabajoExportacion.ESTADO_ERROR
+
+    trabajo.archivo.save(nombre, ContentFile(contenido), save=False)
+    trabajo.nombre_archivo = nombre
+    trabajo.tamano = len(contenido)
+    trabajo.duracion = time.monotonic() - inicio
+    trabajo.estado = TrabajoExportacion.ESTADO_COMPLETADO
+    trabajo.finalizado_en = timezone.now()
+    trabajo.save(update_fields=['archivo', 'nombre_archivo', 'tamano', 'duracion', 'estado', 'finalizado_en'])
+    return trabajo.estado
+
+
+def purgar_trabajos_antiguos():
+    """Elimina los trabajos terminados (y sus archivos) con más de EXPORTACION_RETENCION_DIAS."""
+    limite = timezone.now() - datetime.timedelta(days=getattr(settings, 'EXPORTACION_RETENCION_DIAS', 7))
+    antiguos = TrabajoExportacion.objects.filter(
+        estado__in=[TrabajoExportacion.ESTADO_COMPLETADO, TrabajoExportacion.ESTADO_ERROR],
+        finalizado_en__lt=limite,
+    )
+    total = 0
+    for trabajo in antiguos.iterator():
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.delete()
+        total += 1
+    return total
@@ -0,0 +1,127 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+
+from .models import PerfilUsuario
+
+# Rol -> grupo de Django que lo acompaña
+GRUPOS = {
+    'admin': 'Administradores',
+    'medico': 'Medicos',
+    'recepcionista': 'Recepcionistas',
+}
+ROL_POR_DEFECTO = PerfilUsuario._meta.get_field('rol').default
+
+
+class PerfilBackend(ModelBackend):
+    """
+    ModelBackend que carga el perfil junto con el usuario de la sesión (un JOIN en la misma
+    consulta). Así request.user.perfilusuario ya está en memoria y comprobar el rol en
+    decoradores, mixins, admin y plantillas no agrega consultas. Al leerse en cada petición,
+    un cambio de rol se aplica de inmediato sin nada que invalidar.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('perfilusuario').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def rol_de(user):
+    """Rol del perfil del usuario, o None si no está autenticado o no tiene perfil."""
+    if not user.is_authenticated:
+        return None
+    perfil = getattr(user, 'perfilusuario', None)
+    return perfil.rol if perfil is not None else None
+
+
+def rol(request):
+    """request.rol si RolMiddleware está activo; si no (p. ej. RequestFactory), se calcula."""
+    if hasattr(request, 'rol'):
+        return request.rol
+    return rol_de(request.user)
+
+
+def tiene_rol(request, roles):
+    """True si el usuario es superusuario o su rol está entre `roles`."""
+    return request.user.is_superuser or rol(request) in roles
+
+
+class RolMiddleware:
+    """Expone el rol del usuario como request.rol. Va después de AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.rol = SimpleLazyObject(lambda: rol_de(request.user))
+        return self.get_response(request)
+
+
+# --- Asignación de roles --- #
+
+def _clave_grupo(nombre):
+    return f'core:roles:grupo:{nombre}'
+
+
+def grupo_id(rol):
+    """Id del grupo del rol, cacheado; el grupo se crea la primera vez que hace falta."""
+    nombre = GRUPOS[rol]
+    clave = _clave_grupo(nombre)
+    id_grupo = cache.get(clave)
+    if id_grupo is None:
+        id_grupo = Group.objects.get_or_create(name=nombre)[0].id
+        # Solo se cachea si la transacción confirma: un rollback desharía la creación del grupo
+        transaction.on_commit(lambda: cache.set(clave, id_grupo, timeout=None))
+    return id_grupo
+
+
+def invalidar_grupos():
+    """Descarta los ids cacheados (un grupo renombrado o borrado deja de ser válido)."""
+    cache.delete_many([_clave_grupo(nombre) for nombre in GRUPOS.values()])
+
+
+def sincronizar_grupo(usuario, rol):
+    """
+    Deja al usuario solo en el grupo de su rol tocando únicamente lo que difiere: una lectura
+    de sus grupos y, si hace falta, un DELETE de los sobrantes y un INSERT del que falta.
+    Devuelve True si hubo que escribir.
+    """
+    objetivo = grupo_id(rol)
+    actuales = set(usuario.groups.values_list('id', flat=True))
+    if actuales == {objetivo}:
+        return False
+    sobrantes = actuales - {objetivo}
+    if sobrantes:
+        usuario.groups.remove(*sobrantes)
+    if objetivo not in actuales:
+        usuario.groups.add(objetivo)
+    return True
+
+
+def asignar_rol(usuario, rol):
+    """
+    Único punto para asignar un rol: crea o actualiza el perfil y su grupo en una transacción,
+    sin escribir nada si ya estaban al día. El grupo lo sincroniza la señal post_save del perfil
+    (core.signals), que también cubre los cambios hechos desde el admin.
+    Devuelve True si hubo cambios.
+    """
+    if rol not in GRUPOS:
+        raise ValueError(f'Rol no válido: {rol}')
+    with transaction.atomic():
+        perfil = getattr(usuario, 'perfilusuario', None)
+        if perfil is None:
+            PerfilUsuario.objects.create(usuario=usuario, rol=rol)
+            return True
+        if perfil.rol != rol:
+            perfil.rol = rol
+            perfil.save(update_fields=['rol', 'updated_at'])
+            return True
+        # Perfil al día: solo se corrige el grupo si quedó desalineado (p. ej. nombres antiguos)
+        return sincronizar_grupo(usuario, rol)
@@ -1,25 +1,115 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import User, Group
 from django.dispatch import receiver
 from .models import PerfilUsuario
+from .roles import ROL_POR_DEFECTO, asignar_rol, invalidar_grupos, sincronizar_grupo
+
+
+@receiver(post_save, sender=User)
+def crear_perfil_usuario(sender, instance, created, **kwargs):
+    """
+    Crea el perfil de cada usuario nuevo. Si la vista fijó `rol_inicial` en la instancia antes
+    de guardarla, el perfil nace con ese rol y no hay que corregirlo después.
+    """
+    if created:
+        asignar_rol(instance, getattr(instance, 'rol_inicial', ROL_POR_DEFECTO))
 
 
 @receiver(post_save, sender=PerfilUsuario)
-def actualizar_grupo_por_rol(sender, instance, **kwargs):
+def actualizar_grupo_por_rol(sender, instance, update_fields=None, **kwargs):
     """
-    Actualiza el grupo del usuario cuando se cambia su rol
+    Actualiza el grupo del usuario cuando se cambia su rol (desde core.roles.asignar_rol o el admin)
     """
-    usuario = instance.usuario
-    
-    # Limpiar grupos anteriores
-    usuario.groups.clear()
-    
-    # Asignar al grupo correspondiente según el rol
-    if instance.rol == 'admin':
-        grupo, created = Group.objects.get_or_create(name='Administradores')
-    elif instance.rol == 'medico':
-        grupo, created = Group.objects.get_or_create(name='Medicos')
-    else:  # recepcionista
-        grupo, created = Group.objects.get_or_create(name='Recepcionistas')
-    
-    usuario.groups.add(grupo)
\ No newline at end of file
+    if update_fields is not None and 'rol' not in update_fields:
+        return
+    sincronizar_grupo(instance.usuario, instance.rol)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidar_ids_grupos(sender, instance, **kwargs):
+    transaction.on_commit(invalidar_grupos)
+
+
+# --- Invalidación de las estadísticas del dashboard ---
+
+from django.utils import timezone
+from pacientes.models import Paciente
+from citas.models import Cita
+from citas.catalogos import id_estado
+from historiales.models import HistorialMedico
+from . import estadisticas
+
+
+def _es_pendiente(cita):
+    return cita.estado_id == id_estado(estadisticas.ESTADO_PENDIENTE)
+
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def actualizar_estadisticas_paciente(sender, instance, created=False, **kwargs):
+    delta = 1 if created else -1 if kwargs.get('signal') is post_delete else 0
+
+    def aplicar():
+        if delta:
+            estadisticas.ajustar(estadisticas.CLAVE_TOTAL_PACIENTES, delta)
+        # Los nombres de pacientes aparecen en ambos listados
+        estadisticas.invalidar(estadisticas.CLAVE_ULTIMOS_PACIENTES, estadisticas.CLAVE_ULTIMAS_CITAS)
+
+    transaction.on_commit(aplicar)
+
+
+@receiver(post_save, sender=HistorialMedico)
+@receiver(post_delete, sender=HistorialMedico)
+def actualizar_estadisticas_historial(sender, instance, created=False, **kwargs):
+    delta = 1 if created else -1 if kwargs.get('signal') is post_delete else 0
+    if delta:
+        transaction.on_commit(lambda: estadisticas.ajustar(estadisticas.CLAVE_TOTAL_HISTORIALES, delta))
+
+
+@receiver(post_save, sender=Cita)
+@receiver(post_delete, sender=Cita)
+def actualizar_estadisticas_cita(sender, instance, created=False, **kwargs):
+    borrada = kwargs.get('signal') is post_delete
+    hoy = timezone.localdate()
+
+    if created or borrada:
+        # Alta o baja: se conoce el efecto exacto sobre cada contador
+        delta = 1 if created else -1
+        es_hoy = instance.fecha == hoy
+        es_pendiente = _es_pendiente(instance)
+
+        def aplicar():
+            if es_hoy:
+                estadisticas.ajustar(estadisticas.clave_citas_hoy(hoy), delta)
+            if es_pendiente:
+                estadisticas.ajustar(estadisticas.CLAVE_CITAS_PENDIENTES, delta)
+            estadisticas.invalidar(estadisticas.CLAVE_ULTIMAS_CITAS)
+    else:
+        # Una edición puede cambiar fecha o estado: se recalculan al próximo acceso
+        def aplicar():
+            estadisticas.invalidar(
+                estadisticas.clave_citas_hoy(hoy),
+                estadisticas.CLAVE_CITAS_PENDIENTES,
+                estadisticas.CLAVE_ULTIMAS_CITAS,
+            )
+
+    transaction.on_commit(aplicar)
+
+
+# --- Lápidas para el feed de cambios ---
+
+from .cambios import modelos_rastreados
+from .models import RegistroBaja
+
+
+def registrar_baja(sender, instance, **kwargs):
+    # Se escribe en la misma transacción que el DELETE: si este se revierte, la lápida también
+    RegistroBaja.objects.create(modelo=sender._meta.label_lower, objeto_id=instance.pk)
+
+
+# Se conecta por modelo y no de forma global: un receptor sin sender desactivaría el
+# borrado rápido (fast delete) de todos los modelos del proyecto
+for _etiqueta in modelos_rastreados():
+    post_delete.connect(registrar_baja, sender=_etiqueta, dispatch_uid=f'registrar_baja_{_etiqueta}')
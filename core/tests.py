@@ -1,3 +1,32 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from .roles import asignar_rol
+
+# Caché local en las pruebas: con DatabaseCache cada lectura de la caché también sería una consulta
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class RolesConsultasTests(TestCase):
+    """El rol llega con el usuario de la sesión: comprobarlo no cuesta consultas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrador = User.objects.create_user('administrador', 'admin@example.com', 'clave-segura')
+        asignar_rol(cls.administrador, 'admin')
+        cls.recepcionista = User.objects.create_user('recepcion', 'recepcion@example.com', 'clave-segura')
+        asignar_rol(cls.recepcionista, 'recepcionista')
+
+    def test_vista_con_rol_sin_consultas_de_autorizacion(self):
+        self.client.force_login(self.administrador)
+        # Sesión y usuario (con su perfil en la misma consulta); la vista no consulta la base
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('core:metricas'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_rol_no_permitido(self):
+        self.client.force_login(self.recepcionista)
+        response = self.client.get(reverse('core:metricas'))
+        self.assertRedirects(response, reverse('core:acceso_denegado'), fetch_redirect_response=False)
@@ -0,0 +1,118 @@
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Códigos SQLSTATE de PostgreSQL que indican que la transacción puede repetirse
+CODIGOS_REINTENTABLES = {
+    '40001',  # serialization_failure
+    '40P01',  # deadlock_detected
+}
+
+# Vistas decoradas con atomic_con_reintentos, para poder listar sus contadores
+VISTAS_REGISTRADAS = set()
+
+PREFIJO_CACHE = 'transacciones'
+
+
+def es_conflicto_serializacion(exc):
+    """Indica si la excepción es un conflicto de concurrencia que vale la pena reintentar."""
+    causa = getattr(exc, '__cause__', None)
+    return isinstance(exc, OperationalError) and getattr(causa, 'pgcode', None) in CODIGOS_REINTENTABLES
+
+
+def _incrementar(nombre, contador):
+    clave = f'{PREFIJO_CACHE}:{nombre}:{contador}'
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 1, timeout=None)
+
+
+def estadisticas_reintentos():
+    """Devuelve {vista: {'reintentos': n, 'abortos': n}} para todas las vistas registradas."""
+    estadisticas = {}
+    for nombre in sorted(VISTAS_REGISTRADAS):
+        valores = cache.get_many([
+            f'{PREFIJO_CACHE}:{nombre}:reintentos',
+            f'{PREFIJO_CACHE}:{nombre}:abortos',
+        ])
+        estadisticas[nombre] = {
+            'reintentos': valores.get(f'{PREFIJO_CACHE}:{nombre}:reintentos', 0),
+            'abortos': valores.get(f'{PREFIJO_CACHE}:{nombre}:abortos', 0),
+        }
+    return estadisticas
+
+
+def _mensajes_pendientes(request):
+    storage = getattr(request, '_messages', None)
+    return getattr(storage, '_queued_messages', None)
+
+
+def atomic_con_reintentos(func=None, *, nombre=None, max_intentos=None, espera_base=None,
+                          espera_maxima=None, aislamiento=None, using=DEFAULT_DB_ALIAS):
+    """
+    Reemplazo de `transaction.atomic` para vistas que escriben en la base de datos.
+
+    Si la transacción falla por un conflicto de serialización o un deadlock, se repite la vista
+    completa con espera exponencial acotada y jitter. Cada reintento y cada aborto definitivo se
+    contabiliza por vista (ver `estadisticas_reintentos`).
+
+    `aislamiento` permite bajar una vista concreta a otro nivel, por ejemplo 'READ COMMITTED'.
+    Solo se reintenta cuando la vista abre la transacción más externa.
+    """
+    if max_intentos is None:
+        max_intentos = getattr(settings, 'TRANSACCIONES_MAX_INTENTOS', 5)
+    if espera_base is None:
+        espera_base = getattr(settings, 'TRANSACCIONES_ESPERA_BASE', 0.05)
+    if espera_maxima is None:
+        espera_maxima = getattr(settings, 'TRANSACCIONES_ESPERA_MAXIMA', 1.0)
+
+    def decorator(view_func):
+        nombre_vista = nombre or f'{view_func.__module__}.{view_func.__qualname__}'
+        VISTAS_REGISTRADAS.add(nombre_vista)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            # Dentro de una transacción ajena no se puede repetir solo una parte
+            if connections[using].in_atomic_block:
+                with transaction.atomic(using=using):
+                    return view_func(request, *args, **kwargs)
+
+            mensajes = _mensajes_pendientes(request)
+            mensajes_iniciales = len(mensajes) if mensajes is not None else 0
+
+            for intento in range(1, max_intentos + 1):
+                try:
+                    with transaction.atomic(using=using):
+                        if aislamiento:
+                            with connections[using].cursor() as cursor:
+                                cursor.execute(f'SET TRANSACTION ISOLATION LEVEL {aislamiento}')
+                        return view_func(request, *args, **kwargs)
+                except OperationalError as exc:
+                    if not es_conflicto_serializacion(exc):
+                        raise
+                    if intento == max_intentos:
+                        _incrementar(nombre_vista, 'abortos')
+                        logger.error('%s abortada tras %s intentos por conflicto de serialización', nombre_vista, intento)
+                        raise
+                    _incrementar(nombre_vista, 'reintentos')
+                    logger.warning('%s: conflicto de serialización, reintento %s de %s', nombre_vista, intento, max_intentos - 1)
+
+                    # Descartar los mensajes que dejó el intento fallido
+                    if mensajes is not None:
+                        del mensajes[mensajes_iniciales:]
+
+                    espera = min(espera_maxima, espera_base * (2 ** (intento - 1)))
+                    time.sleep(random.uniform(0, espera))
+        return _wrapped_view
+
+    if func is not None:
+        return decorator(func)
+    return decorator
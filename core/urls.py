@@ -9,6 +9,7 @@ urlpatterns = [
     path('contact/', views.ContactView.as_view(), name='contact'),
     path('acceso-denegado/', views.AccesoDenegadoView.as_view(), name='acceso_denegado'),
     path('search/', views.search_all, name='search_all'),
+    path('search/sugerencias/', views.search_typeahead, name='search_typeahead'),
     path('login/', views.CustomLoginView.as_view(), name='login'),
     path('logout/', views.CustomLogoutView.as_view(), name='logout'),
     path('signup/', views.SignUpView.as_view(), name='signup'),
@@ -19,4 +20,10 @@ urlpatterns = [
     path('usuarios/<int:pk>/cambiar-contrasena/', views.UsuarioSetPasswordView.as_view(), name='cambiar_contrasena'),
     path('usuarios/<int:user_id>/cambiar-rol/', views.cambiar_rol, name='cambiar_rol'),
     path('perfil/', views.PerfilView.as_view(), name='perfil'),
+    path('exportaciones/', views.lista_exportaciones, name='lista_exportaciones'),
+    path('exportaciones/<int:pk>/', views.detalle_exportacion, name='detalle_exportacion'),
+    path('exportaciones/<int:pk>/estado/', views.estado_exportacion, name='estado_exportacion'),
+    path('exportaciones/<int:pk>/descargar/', views.descargar_exportacion, name='descargar_exportacion'),
+    path('transacciones/estadisticas/', views.estadisticas_transacciones, name='estadisticas_transacciones'),
+    path('metricas/', views.metricas_rendimiento, name='metricas'),
 ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import TemplateView, CreateView, ListView
 from django.contrib.auth.views import LoginView, LogoutView
-from django.contrib.auth.models import User, Group
+from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.contrib import messages
@@ -11,6 +11,11 @@ from pacientes.models import Paciente
 from citas.models import Cita
 from historiales.models import HistorialMedico
 from .models import PerfilUsuario
+from .estadisticas import obtener_estadisticas
+from .busqueda import buscar
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Q
 
@@ -21,23 +26,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Estadísticas para el dashboard
-        context['total_pacientes'] = Paciente.objects.count()
-        context['citas_hoy'] = Cita.objects.filter(
-            fecha=timezone.now().date()
-        ).count()
-        context['citas_pendientes'] = Cita.objects.filter(
-            estado__nombre='Programada'
-        ).count()
-        context['total_historiales'] = HistorialMedico.objects.count()
-        
-        # Últimas citas
-        context['ultimas_citas'] = Cita.objects.select_related(
-            'paciente', 'estado', 'motivo'
-        ).order_by('-fecha')[:5]
-        
-        # Últimos pacientes
-        context['ultimos_pacientes'] = Paciente.objects.order_by('-created_at')[:5]
+        # Estadísticas y listados del dashboard, servidos desde la caché
+        context.update(obtener_estadisticas())
         
         return context
 
@@ -69,65 +59,65 @@ def handler500(request):
 @login_required
 def search_all(request):
     query = request.GET.get('q', '')
-    results = {
-        'pacientes': [],
-        'citas': [],
-        'historiales': []
-    }
-    
-    if query:
-        # Buscar en pacientes (nombre, apellido, número de documento)
-        results['pacientes'] = Paciente.objects.filter(
-            Q(nombre__icontains=query) |
-            Q(apellido__icontains=query) |
-            Q(numero_documento__icontains=query)
-        )
-        
-        # Buscar en citas (paciente asociado, motivo)
-        # Primero obtengo los IDs de pacientes que coinciden
-        paciente_ids = Paciente.objects.filter(
-            Q(nombre__icontains=query) |
-            Q(apellido__icontains=query)
-        ).values_list('id', flat=True)
-        
-        results['citas'] = Cita.objects.filter(
-            Q(paciente_id__in=paciente_ids) |
-            Q(motivo__nombre__icontains=query) |
-            Q(motivo__descripcion__icontains=query)
-        ).select_related('paciente', 'estado', 'motivo')
-        
-        # Buscar en historiales (paciente asociado, información médica)
-        # Primero obtengo los IDs de pacientes que coinciden
-        paciente_ids_historial = Paciente.objects.filter(
-            Q(nombre__icontains=query) |
-            Q(apellido__icontains=query)
-        ).values_list('id', flat=True)
-        
-        results['historiales'] = HistorialMedico.objects.filter(
-            Q(paciente_id__in=paciente_ids_historial) |
-            Q(alergias__nombre__icontains=query) |
-            Q(enfermedades_preexistentes__nombre__icontains=query) |
-            Q(medicamentos_actuales__nombre__icontains=query)
-        ).select_related('paciente').distinct()
     
-    # Limitar resultados para evitar páginas muy largas
-    results['pacientes'] = results['pacientes'][:10]
-    results['citas'] = results['citas'][:10]
-    results['historiales'] = results['historiales'][:10]
+    # Las tres categorías en paralelo; los totales son los conteos reales, no solo lo mostrado
+    busqueda = buscar(query, limite=10)
     
     context = {
         'query': query,
-        'results': results,
-        'total_results': sum([
-            len(results['pacientes']),
-            len(results['citas']), 
-            len(results['historiales'])
-        ])
+        'results': busqueda['resultados'],
+        'totales': busqueda['totales'],
+        'total_results': sum(busqueda['totales'].values())
     }
     
     return render(request, 'core/search_results.html', context)
 
 
+@login_required
+def search_typeahead(request):
+    """Sugerencias JSON para el buscador global, limitadas por SEARCH_TYPEAHEAD_PRESUPUESTO_MS."""
+    busqueda = buscar(
+        request.GET.get('q', ''),
+        limite=5,
+        presupuesto_ms=getattr(settings, 'SEARCH_TYPEAHEAD_PRESUPUESTO_MS', 300),
+    )
+    resultados = busqueda['resultados']
+    
+    return JsonResponse({
+        'pacientes': [
+            {
+                'id': paciente.id,
+                'nombre': f"{paciente.nombre} {paciente.apellido}",
+                'cedula': paciente.numero_documento,
+                'url': reverse('pacientes:show', args=[paciente.id]),
+            }
+            for paciente in resultados['pacientes']
+        ],
+        'citas': [
+            {
+                'id': cita.id,
+                'paciente': f"{cita.paciente.nombre} {cita.paciente.apellido}",
+                'fecha': cita.fecha.isoformat(),
+                'hora_inicio': cita.hora_inicio.strftime('%H:%M'),
+                'motivo': cita.motivo.nombre,
+                'url': reverse('citas:show', args=[cita.id]),
+            }
+            for cita in resultados['citas']
+        ],
+        'historiales': [
+            {
+                'id': historial.id,
+                'paciente': f"{historial.paciente.nombre} {historial.paciente.apellido}",
+                'url': reverse('historiales:show', args=[historial.id]),
+            }
+            for historial in resultados['historiales']
+        ],
+        'totales': busqueda['totales'],
+        'incompletas': busqueda['incompletas'],
+        'duracion_ms': busqueda['duracion_ms'],
+    })
+
+
 from .forms import LoginForm
 
 class CustomLoginView(LoginView):
@@ -148,8 +138,11 @@ from django.http import HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.shortcuts import render
 from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth.models import User, Group
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.decorators import method_decorator
 from .models import PerfilUsuario
+from .transacciones import atomic_con_reintentos
 from django.contrib import messages
 
 
@@ -178,27 +171,21 @@ class CustomUserCreationForm(UserCreationForm):
         }
 
 
+@method_decorator(atomic_con_reintentos(nombre='core.views.SignUpView'), name='post')
 class SignUpView(CreateView):
     form_class = CustomUserCreationForm
     success_url = reverse_lazy('core:login')
     template_name = 'registration/signup.html'
     
     def form_valid(self, form):
-        # Guardar el usuario
-        user = form.save()
-        
-        # Actualizar el rol en el perfil existente (creado por la señal)
-        perfil = user.perfilusuario
-        perfil.rol = 'recepcionista'
-        perfil.save()
-        
-        # Asignar al grupo de Recepcionistas por defecto
-        grupo, created = Group.objects.get_or_create(name='Recepcionistas')
-        user.groups.add(grupo)
+        # CreateView guarda el usuario una sola vez; el perfil y el grupo los crea la señal post_save
+        form.instance.rol_inicial = 'recepcionista'
+        with transaction.atomic():
+            response = super().form_valid(form)
         
         messages.success(self.request, 'Usuario registrado exitosamente. Contacta con un administrador para que te asigne el rol adecuado.')
         
-        return super().form_valid(form)
+        return response
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -207,29 +194,23 @@ class SignUpView(CreateView):
 
 
 from .decorators import AdminRequiredMixin, admin_required
+from .roles import asignar_rol
 from .forms import AdminUserCreationForm, AdminUserChangeForm
 from django.views.generic import CreateView, ListView, UpdateView, DeleteView, FormView
 from django.contrib.auth.forms import SetPasswordForm
 
 
+@method_decorator(atomic_con_reintentos(nombre='core.views.UsuarioCreateView'), name='post')
 class UsuarioCreateView(AdminRequiredMixin, CreateView):
     form_class = AdminUserCreationForm
     template_name = 'registration/usuario_form.html'
     success_url = reverse_lazy('core:lista_usuarios')
 
     def form_valid(self, form):
-        response = super().form_valid(form)
-        rol = form.cleaned_data.get('rol')
-        
-        perfil = self.object.perfilusuario
-        perfil.rol = rol
-        perfil.save()
-        
-        grupo_nombre = rol.capitalize() if rol != 'recepcionista' else 'Recepcionista'
-        grupo, created = Group.objects.get_or_create(name=grupo_nombre)
-        
-        self.object.groups.clear()
-        self.object.groups.add(grupo)
+        # La señal post_save crea el perfil y el grupo ya con este rol (ver core.roles)
+        form.instance.rol_inicial = form.cleaned_data.get('rol')
+        with transaction.atomic():
+            response = super().form_valid(form)
         
         messages.success(self.request, f'Usuario {self.object.username} creado exitosamente.')
         return response
@@ -240,25 +221,20 @@ class UsuarioCreateView(AdminRequiredMixin, CreateView):
         return context
 
 
+@method_decorator(atomic_con_reintentos(nombre='core.views.UsuarioUpdateView'), name='post')
 class UsuarioUpdateView(AdminRequiredMixin, UpdateView):
     model = User
     form_class = AdminUserChangeForm
     template_name = 'registration/usuario_form.html'
     success_url = reverse_lazy('core:lista_usuarios')
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('perfilusuario')
+
     def form_valid(self, form):
-        response = super().form_valid(form)
-        rol = form.cleaned_data.get('rol')
-        
-        perfil = self.object.perfilusuario
-        perfil.rol = rol
-        perfil.save()
-        
-        grupo_nombre = rol.capitalize() if rol != 'recepcionista' else 'Recepcionista'
-        grupo, created = Group.objects.get_or_create(name=grupo_nombre)
-        
-        self.object.groups.clear()
-        self.object.groups.add(grupo)
+        with transaction.atomic():
+            response = super().form_valid(form)
+            asignar_rol(self.object, form.cleaned_data.get('rol'))
         
         messages.success(self.request, f'Usuario {self.object.username} actualizado exitosamente.')
         return response
@@ -269,6 +245,7 @@ class UsuarioUpdateView(AdminRequiredMixin, UpdateView):
         return context
 
 
+@method_decorator(atomic_con_reintentos(nombre='core.views.UsuarioDeleteView'), name='post')
 class UsuarioDeleteView(AdminRequiredMixin, DeleteView):
     model = User
     template_name = 'registration/usuario_confirm_delete.html'
@@ -288,6 +265,7 @@ class UsuarioDeleteView(AdminRequiredMixin, DeleteView):
         return context
 
 
+@method_decorator(atomic_con_reintentos(nombre='core.views.UsuarioSetPasswordView'), name='post')
 class UsuarioSetPasswordView(AdminRequiredMixin, FormView):
     form_class = SetPasswordForm
     template_name = 'registration/usuario_set_password.html'
@@ -323,21 +301,14 @@ class UsuarioListView(AdminRequiredMixin, ListView):
 
 
 @admin_required
+@atomic_con_reintentos
 def cambiar_rol(request, user_id):
-    usuario = get_object_or_404(User, id=user_id)
+    usuario = get_object_or_404(User.objects.select_related('perfilusuario'), id=user_id)
     
     if request.method == 'POST':
         nuevo_rol = request.POST.get('rol')
         if nuevo_rol in [rol[0] for rol in PerfilUsuario.ROL_OPCIONES]:
-            perfil_usuario = usuario.perfilusuario
-            perfil_usuario.rol = nuevo_rol
-            perfil_usuario.save()
-            
-            usuario.groups.clear()
-            grupo_nombre = nuevo_rol.capitalize() if nuevo_rol != 'recepcionista' else 'Recepcionista'
-            grupo, created = Group.objects.get_or_create(name=grupo_nombre)
-            usuario.groups.add(grupo)
-            
+            asignar_rol(usuario, nuevo_rol)
             messages.success(request, f'Rol de {usuario.username} actualizado a {nuevo_rol}.')
         else:
             messages.error(request, 'Rol no válido.')
@@ -348,4 +319,96 @@ def cambiar_rol(request, user_id):
         'usuario': usuario,
         'roles': PerfilUsuario.ROL_OPCIONES
     }
-    return render(request, 'registration/cambiar_rol.html', context)
\ No newline at end of file
+    return render(request, 'registration/cambiar_rol.html', context)
+
+
+from .transacciones import estadisticas_reintentos
+
+
+@admin_required
+def estadisticas_transacciones(request):
+    """Reintentos y abortos por conflicto de serialización, por vista."""
+    return JsonResponse({'vistas': estadisticas_reintentos()})
+
+
+from . import metricas
+
+
+@admin_required
+def metricas_rendimiento(request):
+    """Consultas SQL y latencia por vista, según core.metricas.MetricasMiddleware."""
+    if request.method == 'POST':
+        metricas.reiniciar()
+        messages.success(request, 'Métricas reiniciadas.')
+        return redirect('core:metricas')
+    return render(request, 'core/metricas.html', {
+        'filas': metricas.resumen(),
+        'ventana': getattr(settings, 'METRICAS_VENTANA', 200),
+        'activas': getattr(settings, 'METRICAS_ACTIVAS', True),
+    })
+
+
+from django.http import FileResponse, Http404
+from .models import TrabajoExportacion
+from .reportes import REPORTES_PDF
+
+
+def _trabajo_del_usuario(request, pk):
+    # Cada usuario ve solo sus exportaciones; los superusuarios, todas
+    trabajos = TrabajoExportacion.objects.all()
+    if not request.user.is_superuser:
+        trabajos = trabajos.filter(usuario=request.user)
+    return get_object_or_404(trabajos, pk=pk)
+
+
+def _datos_trabajo(trabajo):
+    return {
+        'id': trabajo.id,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'terminado': trabajo.terminado,
+        'nombre_archivo': trabajo.nombre_archivo,
+        'tamano': trabajo.tamano,
+        'duracion': trabajo.duracion,
+        'error': trabajo.error,
+        'created_at': trabajo.created_at.isoformat(),
+        'finalizado_en': trabajo.finalizado_en.isoformat() if trabajo.finalizado_en else None,
+        'url_descarga': reverse('core:descargar_exportacion', args=[trabajo.id]) if trabajo.estado == TrabajoExportacion.ESTADO_COMPLETADO else None,
+    }
+
+
+@login_required
+def lista_exportaciones(request):
+    trabajos = TrabajoExportacion.objects.filter(usuario=request.user)[:50]
+    for trabajo in trabajos:
+        trabajo.titulo = REPORTES_PDF[trabajo.tipo].titulo if trabajo.tipo in REPORTES_PDF else trabajo.tipo
+    return render(request, 'core/exportaciones.html', {'trabajos': trabajos})
+
+
+@login_required
+def detalle_exportacion(request, pk):
+    trabajo = _trabajo_del_usuario(request, pk)
+    reporte = REPORTES_PDF.get(trabajo.tipo)
+    return render(request, 'core/exportacion_detalle.html', {
+        'trabajo': trabajo,
+        'titulo': reporte.titulo if reporte else trabajo.tipo,
+    })
+
+
+@login_required
+def estado_exportacion(request, pk):
+    """Estado del trabajo en JSON, para consultar periódicamente desde la página de seguimiento."""
+    return JsonResponse(_datos_trabajo(_trabajo_del_usuario(request, pk)))
+
+
+@login_required
+def descargar_exportacion(request, pk):
+    trabajo = _trabajo_del_usuario(request, pk)
+    if trabajo.estado != TrabajoExportacion.ESTADO_COMPLETADO or not trabajo.archivo:
+        raise Http404("La exportación no está disponible.")
+    return FileResponse(
+        trabajo.archivo.open('rb'),
+        as_attachment=True,
+        filename=trabajo.nombre_archivo,
+        content_type='application/pdf',
+    )
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiales', '0002_alergia_enfermedad_alter_historialmedico_options_and_more'),
+        ('inventario', '0004_indice_paginacion'),
+        ('pacientes', '0006_busqueda_trigram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historialmedico',
+            index=models.Index(fields=['-updated_at', '-id'], name='historiales_updated_440ca2_idx'),
+        ),
+    ]
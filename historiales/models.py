@@ -53,3 +53,7 @@ class HistorialMedico(models.Model):
         db_table = 'historiales_medicos'
         verbose_name = 'Historial Médico'
         verbose_name_plural = 'Historiales Médicos'
+        indexes = [
+            # Orden del listado de historiales (paginación por clave)
+            models.Index(fields=['-updated_at', '-id']),
+        ]
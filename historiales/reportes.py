@@ -0,0 +1,13 @@
+from .models import HistorialMedico
+
+
+def contexto_historial(parametros):
+    return {
+        'historial': HistorialMedico.objects.select_related('paciente').get(id=parametros['historial_id']),
+    }
+
+
+def contexto_historiales(parametros):
+    return {
+        'historiales': HistorialMedico.objects.select_related('paciente').prefetch_related('alergias', 'enfermedades_preexistentes', 'medicamentos_actuales').all(),
+    }
@@ -1,17 +1,13 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db import transaction
 from django.db.models import Q
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from io import BytesIO
 import datetime
-from sistema_medico.settings import BASE_DIR
 
 from django.contrib.auth.decorators import login_required
 
+from core.transacciones import atomic_con_reintentos
+from core.paginacion import KeysetPaginator
 from core.decorators import medico_required
 
 from .models import HistorialMedico, Alergia, Enfermedad
@@ -25,11 +21,10 @@ import json
 def index(request):
     historiales_list = HistorialMedico.objects.select_related('paciente').prefetch_related(
         'alergias', 'enfermedades_preexistentes', 'medicamentos_actuales'
-    ).order_by('-updated_at')
+    )
     
-    paginator = Paginator(historiales_list, 10)
-    page_number = request.GET.get('page')
-    historiales = paginator.get_page(page_number)
+    paginator = KeysetPaginator(historiales_list, ('-updated_at', '-id'), 10, total='aproximado')
+    historiales = paginator.get_page(request.GET.get('cursor'))
     
     return render(request, 'historiales/index.html', {'historiales': historiales})
 
@@ -38,7 +33,7 @@ from inventario.forms import MedicamentoModalForm
 # ... (existing code) ...
 
 @medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def create(request):
     if request.method == 'POST':
         form = HistorialMedicoForm(request.POST)
@@ -65,7 +60,7 @@ def show(request, historial_id):
     return render(request, 'historiales/show.html', {'historial': historial})
 
 @medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def edit(request, historial_id):
     historial = get_object_or_404(HistorialMedico, id=historial_id)
     
@@ -84,7 +79,7 @@ def edit(request, historial_id):
     return render(request, 'historiales/edit.html', {'form': form, 'historial': historial, 'medicamento_form': medicamento_form})
 
 @medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def destroy(request, historial_id):
     historial = get_object_or_404(HistorialMedico, id=historial_id)
     
@@ -119,8 +114,8 @@ def search(request):
         'query': query
     })
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from core.exportaciones import exportar_excel, tamano_lote
+from core.reportes import exportar_pdf
 
 import os
 
@@ -129,111 +124,44 @@ import os
 @medico_required
 def exportar_historial_individual_pdf(request, historial_id):
     historial = get_object_or_404(HistorialMedico, id=historial_id)
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'historial': historial,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('historiales/pdf_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="historial_{}_{}.pdf"'.format(historial.paciente.numero_documento, datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'historial', {'historial_id': historial.id})
 
 @medico_required
 def exportar_historiales_pdf(request):
-    historiales = HistorialMedico.objects.select_related('paciente').prefetch_related('alergias', 'enfermedades_preexistentes', 'medicamentos_actuales').all()
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'historiales': historiales,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('historiales/pdf/historiales_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="reporte_historiales_{}.pdf"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'historiales')
 
 @medico_required
 def exportar_historiales_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="listado_historiales_{}.xlsx"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Historiales Médicos"
-    ws.freeze_panes = 'A2'
-    
-    headers = ['Paciente', 'Cédula', 'Fecha de Creación', 'Última Actualización', 'Alergias', 'Enfermedades Preexistentes', 'Medicamentos Actuales']
-    ws.append(headers)
-    
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="0d6efd", end_color="0d6efd", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-
-    historiales = HistorialMedico.objects.select_related('paciente').prefetch_related('alergias', 'enfermedades_preexistentes', 'medicamentos_actuales').all()
-
-    for historial in historiales:
-        alergias = ", ".join([a.nombre for a in historial.alergias.all()]) or "N/A"
-        enfermedades = ", ".join([e.nombre for e in historial.enfermedades_preexistentes.all()]) or "N/A"
-        medicamentos = ", ".join([m.nombre for m in historial.medicamentos_actuales.all()]) or "N/A"
-        
-        ws.append([
-            str(historial.paciente),
-            historial.paciente.numero_documento,
-            historial.created_at.strftime('%d/%m/%Y %H:%M'),
-            historial.updated_at.strftime('%d/%m/%Y %H:%M'),
-            alergias,
-            enfermedades,
-            medicamentos
-        ])
-
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
+    historiales = HistorialMedico.objects.select_related('paciente').prefetch_related('alergias', 'enfermedades_preexistentes', 'medicamentos_actuales').order_by('pk')
+
+    def filas():
+        # iterator() con chunk_size resuelve los prefetch por lote en lugar de cargar todo el listado
+        for historial in historiales.iterator(chunk_size=tamano_lote()):
+            alergias = ", ".join([a.nombre for a in historial.alergias.all()]) or "N/A"
+            enfermedades = ", ".join([e.nombre for e in historial.enfermedades_preexistentes.all()]) or "N/A"
+            medicamentos = ", ".join([m.nombre for m in historial.medicamentos_actuales.all()]) or "N/A"
+            yield [
+                str(historial.paciente),
+                historial.paciente.numero_documento,
+                historial.created_at.strftime('%d/%m/%Y %H:%M'),
+                historial.updated_at.strftime('%d/%m/%Y %H:%M'),
+                alergias,
+                enfermedades,
+                medicamentos
+            ]
 
-    wb.save(response)
-    return response
+    headers = ['Paciente', 'Cédula', 'Fecha de Creación', 'Última Actualización', 'Alergias', 'Enfermedades Preexistentes', 'Medicamentos Actuales']
+    return exportar_excel(
+        'listado_historiales_{}.xlsx'.format(datetime.datetime.now().strftime("%Y%m%d")),
+        "Historiales Médicos", headers, filas(), centrar=True,
+        request=request, tipo='historiales',
+    )
 
 
 # Vistas para AJAX
 @login_required
 @require_POST
+@atomic_con_reintentos
 def crear_alergia_ajax(request):
     try:
         data = json.loads(request.body)
@@ -253,6 +181,7 @@ def crear_alergia_ajax(request):
 
 @login_required
 @require_POST
+@atomic_con_reintentos
 def crear_enfermedad_ajax(request):
     try:
         data = json.loads(request.body)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Categoria, Proveedor, Medicamento, Inventario, MovimientoInventario
+from .models import Categoria, Proveedor, Medicamento, Inventario, MovimientoInventario, StockMedicamento
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -28,4 +28,10 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
     list_display = ('medicamento', 'tipo', 'cantidad', 'fecha', 'usuario')
     list_filter = ('tipo', 'fecha', 'medicamento__categoria')
     search_fields = ('medicamento__nombre', 'usuario')
-    readonly_fields = ('fecha',)
\ No newline at end of file
+    readonly_fields = ('fecha',)
+
+@admin.register(StockMedicamento)
+class StockMedicamentoAdmin(admin.ModelAdmin):
+    list_display = ('medicamento', 'cantidad', 'updated_at')
+    search_fields = ('medicamento__nombre', 'medicamento__codigo')
+    readonly_fields = ('medicamento', 'cantidad', 'updated_at')
\ No newline at end of file
@@ -0,0 +1,83 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+
+# Secuencia de PostgreSQL que alimenta los códigos MED-XXXX
+SECUENCIA_CODIGOS = 'inventario_medicamento_codigo_seq'
+
+
+def prefijo_codigo():
+    return getattr(settings, 'MEDICAMENTO_CODIGO_PREFIJO', 'MED-')
+
+
+def ancho_codigo():
+    return getattr(settings, 'MEDICAMENTO_CODIGO_ANCHO', 4)
+
+
+def formatear_codigo(numero):
+    return f'{prefijo_codigo()}{numero:0{ancho_codigo()}d}'
+
+
+def siguiente_codigo():
+    """
+    Reserva el siguiente código de medicamento con un único nextval().
+    Las secuencias no participan de la transacción, así que dos altas simultáneas
+    nunca reciben el mismo número ni generan conflictos de serialización.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [SECUENCIA_CODIGOS])
+        numero = cursor.fetchone()[0]
+    return formatear_codigo(numero)
+
+
+def reservar_codigos(cantidad):
+    """Reserva `cantidad` códigos consecutivos de la secuencia en una sola consulta (cargas masivas)."""
+    if cantidad <= 0:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [SECUENCIA_CODIGOS, cantidad])
+        return [formatear_codigo(numero) for numero, in cursor.fetchall()]
+
+
+def asignar_codigos_pendientes():
+    """
+    Asigna código a todos los medicamentos con código vacío en una sola sentencia UPDATE,
+    respetando el orden de sus ids. Devuelve la cantidad de filas actualizadas.
+    """
+    from .models import Medicamento
+
+    tabla = connection.ops.quote_name(Medicamento._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {tabla} AS m
+            SET codigo = %s || lpad(p.numero::text, greatest(%s, length(p.numero::text)), '0')
+            FROM (
+                SELECT o.id, nextval(%s) AS numero
+                FROM (SELECT id FROM {tabla} WHERE codigo = '' ORDER BY id) AS o
+            ) AS p
+            WHERE m.id = p.id
+            """,
+            [prefijo_codigo(), ancho_codigo(), SECUENCIA_CODIGOS],
+        )
+        return cursor.rowcount
+
+
+def sincronizar_secuencia():
+    """
+    Coloca la secuencia después del mayor código existente con el prefijo actual,
+    por ejemplo tras cargar datos con códigos asignados a mano.
+    """
+    from .models import Medicamento
+
+    tabla = connection.ops.quote_name(Medicamento._meta.db_table)
+    patron = '^' + re.escape(prefijo_codigo()) + '([0-9]+)$'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT setval(%s, COALESCE(MAX(substring(codigo from %s)::bigint), 0) + 1, false)
+            FROM {tabla}
+            """,
+            [SECUENCIA_CODIGOS, patron],
+        )
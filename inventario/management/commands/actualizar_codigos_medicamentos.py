@@ -1,26 +1,30 @@
 from django.core.management.base import BaseCommand
-from inventario.models import Medicamento
+from django.db import transaction
+from inventario.codigos import asignar_codigos_pendientes, sincronizar_secuencia
 
 class Command(BaseCommand):
     help = 'Actualiza los códigos de los medicamentos existentes'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sincronizar',
+            action='store_true',
+            help='Reinicia la secuencia de códigos después del mayor código ya asignado',
+        )
+
     def handle(self, *args, **options):
-        # Obtener todos los medicamentos sin código o con código vacío
-        medicamentos = Medicamento.objects.filter(codigo='').order_by('id')
-        
+        with transaction.atomic():
+            if options['sincronizar']:
+                sincronizar_secuencia()
+                self.stdout.write(self.style.NOTICE('Secuencia de códigos sincronizada'))
+
+            # Asignar todos los códigos pendientes en una sola sentencia
+            actualizados = asignar_codigos_pendientes()
+
         self.stdout.write(
-            self.style.NOTICE(f'Encontrados {medicamentos.count()} medicamentos sin código')
+            self.style.NOTICE(f'Códigos asignados a {actualizados} medicamentos')
         )
         
-        # Actualizar cada medicamento para generar su código
-        for medicamento in medicamentos:
-            # Forzar la regeneración del código
-            medicamento.codigo = ''  # Vaciar el código para forzar la regeneración
-            medicamento.save()
-            self.stdout.write(
-                self.style.SUCCESS(f'Actualizado: {medicamento.nombre} -> {medicamento.codigo}')
-            )
-        
         self.stdout.write(
             self.style.SUCCESS('Todos los medicamentos han sido actualizados con códigos')
-        )
\ No newline at end of file
+        )
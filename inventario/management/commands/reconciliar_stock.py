@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventario.models import Medicamento, StockMedicamento
+
+class Command(BaseCommand):
+    help = 'Verifica (y opcionalmente reconstruye) el saldo de stock a partir del historial de movimientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help='Reescribe los saldos que no coincidan con el historial de movimientos',
+        )
+
+    def handle(self, *args, **options):
+        corregir = options['corregir']
+
+        with transaction.atomic():
+            calculados = StockMedicamento.saldos_desde_movimientos()
+            registrados = dict(StockMedicamento.objects.values_list('medicamento_id', 'cantidad'))
+            medicamentos = Medicamento.objects.values_list('id', 'nombre').order_by('id')
+
+            diferencias = []
+            for medicamento_id, nombre in medicamentos:
+                esperado = calculados.get(medicamento_id, 0)
+                actual = registrados.get(medicamento_id)
+                if actual != esperado:
+                    diferencias.append((medicamento_id, nombre, actual, esperado))
+
+            for medicamento_id, nombre, actual, esperado in diferencias:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'{nombre} (id {medicamento_id}): saldo registrado {actual if actual is not None else "inexistente"}, '
+                        f'según movimientos {esperado}'
+                    )
+                )
+
+            if not diferencias:
+                self.stdout.write(self.style.SUCCESS(f'Saldos verificados: {len(medicamentos)} medicamentos sin diferencias'))
+                return
+
+            if not corregir:
+                self.stdout.write(
+                    self.style.NOTICE(f'{len(diferencias)} saldos con diferencias. Ejecute con --corregir para reconstruirlos')
+                )
+                return
+
+            existentes = [
+                StockMedicamento(medicamento_id=medicamento_id, cantidad=esperado)
+                for medicamento_id, _, actual, esperado in diferencias if actual is not None
+            ]
+            faltantes = [
+                StockMedicamento(medicamento_id=medicamento_id, cantidad=esperado)
+                for medicamento_id, _, actual, esperado in diferencias if actual is None
+            ]
+            StockMedicamento.objects.bulk_update(existentes, ['cantidad'], batch_size=1000)
+            StockMedicamento.objects.bulk_create(faltantes, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f'{len(diferencias)} saldos reconstruidos desde el historial de movimientos'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def poblar_saldos(apps, schema_editor):
+    """
+    Calcula el saldo inicial de cada medicamento a partir del historial de movimientos.
+    """
+    Medicamento = apps.get_model('inventario', 'Medicamento')
+    MovimientoInventario = apps.get_model('inventario', 'MovimientoInventario')
+    StockMedicamento = apps.get_model('inventario', 'StockMedicamento')
+
+    totales = {
+        fila['medicamento']: (fila['entradas'] or 0) - (fila['salidas'] or 0)
+        for fila in MovimientoInventario.objects.values('medicamento').annotate(
+            entradas=Sum('cantidad', filter=Q(tipo='entrada')),
+            salidas=Sum('cantidad', filter=Q(tipo='salida')),
+        ).order_by()
+    }
+
+    StockMedicamento.objects.bulk_create(
+        [
+            StockMedicamento(medicamento_id=medicamento_id, cantidad=totales.get(medicamento_id, 0))
+            for medicamento_id in Medicamento.objects.values_list('id', flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMedicamento',
+            fields=[
+                ('medicamento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='saldo', serialize=False, to='inventario.medicamento')),
+                ('cantidad', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Stock de Medicamento',
+                'verbose_name_plural': 'Stock de Medicamentos',
+                'db_table': 'inventario_stock',
+            },
+        ),
+        migrations.RunPython(poblar_saldos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:05
+
+import re
+
+from django.conf import settings
+from django.db import migrations
+
+
+def sincronizar_secuencia(apps, schema_editor):
+    """
+    Inicia la secuencia después del mayor código MED-XXXX ya asignado.
+    """
+    prefijo = getattr(settings, 'MEDICAMENTO_CODIGO_PREFIJO', 'MED-')
+    patron = '^' + re.escape(prefijo) + '([0-9]+)$'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT setval('inventario_medicamento_codigo_seq',
+                          COALESCE(MAX(substring(codigo from %s)::bigint), 0) + 1, false)
+            FROM inventario_medicamentos
+            """,
+            [patron],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0002_stockmedicamento'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE SEQUENCE IF NOT EXISTS inventario_medicamento_codigo_seq',
+            'DROP SEQUENCE IF EXISTS inventario_medicamento_codigo_seq',
+        ),
+        migrations.RunPython(sincronizar_secuencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0003_secuencia_codigos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['-fecha', '-id'], name='inventario__fecha_0657bc_idx'),
+        ),
+    ]
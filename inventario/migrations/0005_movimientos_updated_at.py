@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:49
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def updated_at_desde_fecha(apps, schema_editor):
+    # Los movimientos existentes no se han editado desde que se registraron
+    MovimientoInventario = apps.get_model('inventario', 'MovimientoInventario')
+    MovimientoInventario.objects.update(updated_at=F('fecha'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_indice_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(updated_at_desde_fecha, migrations.RunPython.noop),
+    ]
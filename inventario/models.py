@@ -1,7 +1,11 @@
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import Case, CharField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from datetime import date
 
+from .codigos import siguiente_codigo
+
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
     descripcion = models.TextField(blank=True, null=True)
@@ -33,7 +37,45 @@ class Proveedor(models.Model):
         verbose_name = 'Proveedor'
         verbose_name_plural = 'Proveedores'
 
+class MedicamentoQuerySet(models.QuerySet):
+    def with_stock(self):
+        """
+        Anota `stock` y `estado` (agotado/bajo/normal) en SQL, de modo que filtrar,
+        ordenar y paginar por stock se resuelva en la base de datos.
+        """
+        return self.annotate(
+            stock=Coalesce(F('saldo__cantidad'), Value(0)),
+        ).annotate(
+            estado=Case(
+                When(stock__lte=0, then=Value('agotado')),
+                When(stock__lte=F('stock_minimo'), then=Value('bajo')),
+                default=Value('normal'),
+                output_field=CharField(),
+            ),
+        )
+
+    def para_stock(self, parametros):
+        """
+        Consulta de la vista de stock y de sus exportaciones: filtro por `estado` y orden por
+        `orden` tomados de `parametros` (request.GET o el dict guardado en un trabajo de exportación).
+        """
+        medicamentos = self.with_stock().select_related('categoria', 'proveedor')
+        estado = parametros.get('estado')
+        if estado in Medicamento.ESTADOS_STOCK:
+            medicamentos = medicamentos.filter(estado=estado)
+        orden = ORDENES_STOCK.get(parametros.get('orden'), ORDENES_STOCK['nombre'])
+        return medicamentos.order_by(*orden)
+
+# Órdenes admitidos en el listado de stock
+ORDENES_STOCK = {
+    'nombre': ('nombre',),
+    'stock': ('stock', 'nombre'),
+    '-stock': ('-stock', 'nombre'),
+}
+
 class Medicamento(models.Model):
+    ESTADOS_STOCK = ('agotado', 'bajo', 'normal')
+    
     nombre = models.CharField(max_length=200)
     descripcion = models.TextField(blank=True, null=True)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
@@ -44,37 +86,38 @@ class Medicamento(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = MedicamentoQuerySet.as_manager()
+    
     def save(self, *args, **kwargs):
+        es_nuevo = self._state.adding
         # Generar código automáticamente si no se proporciona o está vacío
         if not self.codigo:
-            # Contar cuántos medicamentos existen
-            count = Medicamento.objects.count()
-            # Generar el siguiente código
-            self.codigo = f'MED-{count + 1:04d}'
-            
-            # Verificar que el código sea único
-            while Medicamento.objects.filter(codigo=self.codigo).exists():
-                count += 1
-                self.codigo = f'MED-{count + 1:04d}'
+            self.codigo = siguiente_codigo()
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Todo medicamento nace con su saldo en cero
+            if es_nuevo:
+                StockMedicamento.objects.get_or_create(medicamento=self)
     
     def __str__(self):
         return f"{self.nombre} ({self.codigo})"
     
     @property
     def stock_actual(self):
-        # Calcular el stock real a partir de los movimientos de inventario
-        entradas = self.movimientoinventario_set.filter(tipo='entrada').aggregate(total=Sum('cantidad'))['total'] or 0
-        salidas = self.movimientoinventario_set.filter(tipo='salida').aggregate(total=Sum('cantidad'))['total'] or 0
-        return entradas - salidas
+        # Leer el saldo mantenido por los movimientos de inventario
+        try:
+            return self.saldo.cantidad
+        except StockMedicamento.DoesNotExist:
+            return 0
     
     @property
     def estado_stock(self):
         # Determinar el estado del stock
-        if self.stock_actual <= 0:
+        stock = self.stock_actual
+        if stock <= 0:
             return 'agotado'
-        elif self.stock_actual <= self.stock_minimo:
+        elif stock <= self.stock_minimo:
             return 'bajo'
         else:
             return 'normal'
@@ -122,6 +165,44 @@ class Inventario(models.Model):
         verbose_name = 'Existencia'
         verbose_name_plural = 'Existencias'
 
+class StockMedicamento(models.Model):
+    # Saldo acumulado por medicamento; se actualiza junto con cada MovimientoInventario
+    medicamento = models.OneToOneField(Medicamento, on_delete=models.CASCADE, primary_key=True, related_name='saldo')
+    cantidad = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.medicamento.nombre}: {self.cantidad} unidades"
+    
+    @classmethod
+    def aplicar(cls, medicamento_id, delta):
+        """Suma `delta` al saldo del medicamento dentro de la transacción en curso."""
+        if not delta:
+            return
+        actualizados = cls.objects.filter(medicamento_id=medicamento_id).update(
+            cantidad=F('cantidad') + delta,
+            updated_at=timezone.now(),  # update() no aplica auto_now; la huella de reportes depende de este campo
+        )
+        if not actualizados:
+            cls.objects.create(medicamento_id=medicamento_id, cantidad=delta)
+    
+    @staticmethod
+    def saldos_desde_movimientos():
+        """Recalcula {medicamento_id: saldo} desde el historial completo en una sola consulta."""
+        filas = MovimientoInventario.objects.values('medicamento').annotate(
+            entradas=Sum('cantidad', filter=Q(tipo='entrada')),
+            salidas=Sum('cantidad', filter=Q(tipo='salida')),
+        ).order_by()
+        return {
+            fila['medicamento']: (fila['entradas'] or 0) - (fila['salidas'] or 0)
+            for fila in filas
+        }
+    
+    class Meta:
+        db_table = 'inventario_stock'
+        verbose_name = 'Stock de Medicamento'
+        verbose_name_plural = 'Stock de Medicamentos'
+
 class MovimientoInventario(models.Model):
     TIPO_MOVIMIENTO = [
         ('entrada', 'Entrada'),
@@ -134,11 +215,36 @@ class MovimientoInventario(models.Model):
     fecha = models.DateTimeField(auto_now_add=True)
     descripcion = models.TextField(blank=True, null=True)
     usuario = models.CharField(max_length=100)  # En una implementación real, sería una ForeignKey a User
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.tipo} de {self.cantidad} {self.medicamento.nombre}"
     
+    @property
+    def delta(self):
+        # Efecto del movimiento sobre el saldo del medicamento
+        return self.cantidad if self.tipo == 'entrada' else -self.cantidad
+    
+    def save(self, *args, **kwargs):
+        # El movimiento y el saldo se escriben en la misma transacción
+        with transaction.atomic():
+            if not self._state.adding:
+                anterior = MovimientoInventario.objects.filter(pk=self.pk).first()
+                if anterior:
+                    StockMedicamento.aplicar(anterior.medicamento_id, -anterior.delta)
+            super().save(*args, **kwargs)
+            StockMedicamento.aplicar(self.medicamento_id, self.delta)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            StockMedicamento.aplicar(self.medicamento_id, -self.delta)
+            return super().delete(*args, **kwargs)
+    
     class Meta:
         db_table = 'inventario_movimientos'
         verbose_name = 'Movimiento de Inventario'
-        verbose_name_plural = 'Movimientos de Inventario'
\ No newline at end of file
+        verbose_name_plural = 'Movimientos de Inventario'
+        indexes = [
+            # Orden del listado de movimientos (paginación por clave)
+            models.Index(fields=['-fecha', '-id']),
+        ]
\ No newline at end of file
@@ -0,0 +1,21 @@
+from .models import Categoria, Proveedor, Medicamento, Inventario
+
+
+def contexto_stock(parametros):
+    return {'medicamentos': Medicamento.objects.para_stock(parametros)}
+
+
+def contexto_medicamentos(parametros):
+    return {'medicamentos': Medicamento.objects.select_related('categoria', 'proveedor').all().order_by('nombre')}
+
+
+def contexto_proveedores(parametros):
+    return {'proveedores': Proveedor.objects.all().order_by('nombre')}
+
+
+def contexto_categorias(parametros):
+    return {'categorias': Categoria.objects.all().order_by('nombre')}
+
+
+def contexto_inventario(parametros):
+    return {'inventario': Inventario.objects.select_related('medicamento').all().order_by('-created_at')}
@@ -3,20 +3,18 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from io import BytesIO
 import datetime
-from sistema_medico.settings import BASE_DIR
 import json
 
 from django.contrib.auth.decorators import login_required
 
+from core.transacciones import atomic_con_reintentos
+from core.paginacion import KeysetPaginator
 from core.decorators import personal_medico_required
 
-from .models import Categoria, Proveedor, Medicamento, Inventario, MovimientoInventario
+from .models import Categoria, Proveedor, Medicamento, Inventario, MovimientoInventario, StockMedicamento
 from .forms import CategoriaForm, ProveedorForm, MedicamentoForm, InventarioForm, MedicamentoModalForm, CategoriaModalForm, ProveedorModalForm, MovimientoSalidaForm
 
 # Vistas para Categorías
@@ -29,6 +27,7 @@ def listar_categorias(request):
     return render(request, 'inventario/categorias/listar.html', {'categorias': categorias})
 
 @personal_medico_required
+@atomic_con_reintentos
 def crear_categoria(request):
     if request.method == 'POST':
         form = CategoriaForm(request.POST)
@@ -41,6 +40,7 @@ def crear_categoria(request):
     return render(request, 'inventario/categorias/formulario.html', {'form': form, 'titulo': 'Crear Categoría'})
 
 @personal_medico_required
+@atomic_con_reintentos
 def editar_categoria(request, categoria_id):
     categoria = get_object_or_404(Categoria, id=categoria_id)
     if request.method == 'POST':
@@ -54,6 +54,7 @@ def editar_categoria(request, categoria_id):
     return render(request, 'inventario/categorias/formulario.html', {'form': form, 'titulo': 'Editar Categoría'})
 
 @personal_medico_required
+@atomic_con_reintentos
 def eliminar_categoria(request, categoria_id):
     categoria = get_object_or_404(Categoria, id=categoria_id)
     if request.method == 'POST':
@@ -72,6 +73,7 @@ def listar_proveedores(request):
     return render(request, 'inventario/proveedores/listar.html', {'proveedores': proveedores})
 
 @personal_medico_required
+@atomic_con_reintentos
 def crear_proveedor(request):
     if request.method == 'POST':
         form = ProveedorForm(request.POST)
@@ -84,6 +86,7 @@ def crear_proveedor(request):
     return render(request, 'inventario/proveedores/formulario.html', {'form': form, 'titulo': 'Crear Proveedor'})
 
 @personal_medico_required
+@atomic_con_reintentos
 def editar_proveedor(request, proveedor_id):
     proveedor = get_object_or_404(Proveedor, id=proveedor_id)
     if request.method == 'POST':
@@ -97,6 +100,7 @@ def editar_proveedor(request, proveedor_id):
     return render(request, 'inventario/proveedores/formulario.html', {'form': form, 'titulo': 'Editar Proveedor'})
 
 @personal_medico_required
+@atomic_con_reintentos
 def eliminar_proveedor(request, proveedor_id):
     proveedor = get_object_or_404(Proveedor, id=proveedor_id)
     if request.method == 'POST':
@@ -115,6 +119,7 @@ def listar_medicamentos(request):
     return render(request, 'inventario/medicamentos/listar.html', {'medicamentos': medicamentos})
 
 @personal_medico_required
+@atomic_con_reintentos
 def crear_medicamento(request):
     if request.method == 'POST':
         form = MedicamentoForm(request.POST)
@@ -128,6 +133,7 @@ def crear_medicamento(request):
     return render(request, 'inventario/medicamentos/formulario.html', {'form': form, 'titulo': 'Crear Medicamento'})
 
 @personal_medico_required
+@atomic_con_reintentos
 def editar_medicamento(request, medicamento_id):
     medicamento = get_object_or_404(Medicamento, id=medicamento_id)
     if request.method == 'POST':
@@ -141,6 +147,7 @@ def editar_medicamento(request, medicamento_id):
     return render(request, 'inventario/medicamentos/formulario.html', {'form': form, 'titulo': 'Editar Medicamento'})
 
 @personal_medico_required
+@atomic_con_reintentos
 def eliminar_medicamento(request, medicamento_id):
     medicamento = get_object_or_404(Medicamento, id=medicamento_id)
     if request.method == 'POST':
@@ -162,6 +169,7 @@ def listar_inventario(request):
     })
 
 @personal_medico_required
+@atomic_con_reintentos
 def crear_inventario(request):
     if request.method == 'POST':
         form = InventarioForm(request.POST)
@@ -169,7 +177,7 @@ def crear_inventario(request):
             # Guardar la existencia de inventario
             inventario = form.save()
             
-            # Crear el movimiento de inventario correspondiente
+            # Crear el movimiento de inventario correspondiente (actualiza el saldo)
             MovimientoInventario.objects.create(
                 medicamento=inventario.medicamento,
                 tipo='entrada',
@@ -185,6 +193,7 @@ def crear_inventario(request):
     return render(request, 'inventario/inventario/formulario.html', {'form': form, 'titulo': 'Agregar Existencia'})
 
 @personal_medico_required
+@atomic_con_reintentos
 def editar_inventario(request, inventario_id):
     inventario = get_object_or_404(Inventario, id=inventario_id)
     if request.method == 'POST':
@@ -198,6 +207,7 @@ def editar_inventario(request, inventario_id):
     return render(request, 'inventario/inventario/formulario.html', {'form': form, 'titulo': 'Editar Existencia'})
 
 @personal_medico_required
+@atomic_con_reintentos
 def eliminar_inventario(request, inventario_id):
     inventario = get_object_or_404(Inventario, id=inventario_id)
     if request.method == 'POST':
@@ -209,294 +219,108 @@ def eliminar_inventario(request, inventario_id):
 # Vista para mostrar stock total por medicamento
 @personal_medico_required
 def stock_medicamentos(request):
-    medicamentos_list = Medicamento.objects.select_related('categoria', 'proveedor').all().order_by('nombre')
-    for medicamento in medicamentos_list:
-        medicamento.stock = medicamento.stock_actual
-        medicamento.estado = medicamento.estado_stock
+    medicamentos_list = Medicamento.objects.para_stock(request.GET)
     
     paginator = Paginator(medicamentos_list, 10)
     page_number = request.GET.get('page')
     medicamentos = paginator.get_page(page_number)
     
-    return render(request, 'inventario/stock_medicamentos.html', {'medicamentos': medicamentos})
+    return render(request, 'inventario/stock_medicamentos.html', {
+        'medicamentos': medicamentos,
+        'estado': request.GET.get('estado', ''),
+        'orden': request.GET.get('orden', ''),
+    })
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from core.exportaciones import exportar_excel, tamano_lote
+from core.reportes import exportar_pdf
 
 # --- Vistas de Exportación --- #
 
 @personal_medico_required
 def exportar_stock_pdf(request):
-    medicamentos = Medicamento.objects.select_related('categoria', 'proveedor').all().order_by('nombre')
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'medicamentos': medicamentos,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('inventario/pdf/stock_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="reporte_stock_{}.pdf"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'stock', {
+        'estado': request.GET.get('estado', ''),
+        'orden': request.GET.get('orden', ''),
+    })
 
 @personal_medico_required
 def exportar_medicamentos_pdf(request):
-    medicamentos = Medicamento.objects.select_related('categoria', 'proveedor').all().order_by('nombre')
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'medicamentos': medicamentos,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('inventario/pdf/medicamentos_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="reporte_medicamentos_{}.pdf"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'medicamentos')
 
 @personal_medico_required
 def exportar_proveedores_pdf(request):
-    proveedores = Proveedor.objects.all().order_by('nombre')
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'proveedores': proveedores,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('inventario/pdf/proveedores_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="reporte_proveedores_{}.pdf"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'proveedores')
 
 @personal_medico_required
 def exportar_categorias_pdf(request):
-    categorias = Categoria.objects.all().order_by('nombre')
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'categorias': categorias,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('inventario/pdf/categorias_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="reporte_categorias_{}.pdf"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'categorias')
 
 @personal_medico_required
 def exportar_inventario_pdf(request):
-    inventario = Inventario.objects.select_related('medicamento').all().order_by('-created_at')
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'inventario': inventario,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('inventario/pdf/inventario_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="reporte_inventario_{}.pdf"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'inventario')
 
 @personal_medico_required
 def exportar_stock_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="reporte_stock_{}.xlsx"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Stock de Medicamentos"
-    ws.freeze_panes = 'A2'
+    medicamentos = Medicamento.objects.para_stock(request.GET)
+    filas = (
+        [med.codigo, med.nombre, med.categoria.nombre, med.stock, med.stock_minimo, med.estado]
+        for med in medicamentos.iterator(chunk_size=tamano_lote())
+    )
     headers = ['Código', 'Medicamento', 'Categoría', 'Stock Actual', 'Stock Mínimo', 'Estado']
-    ws.append(headers)
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="198754", end_color="198754", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-    medicamentos = Medicamento.objects.all().order_by('nombre')
-    for med in medicamentos:
-        ws.append([med.codigo, med.nombre, med.categoria.nombre, med.stock_actual, med.stock_minimo, med.estado_stock])
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except: pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-    wb.save(response)
-    return response
+    return exportar_excel(
+        'reporte_stock_{}.xlsx'.format(datetime.datetime.now().strftime("%Y%m%d")),
+        "Stock de Medicamentos", headers, filas, color_encabezado="198754",
+        request=request, tipo='stock',
+        parametros={'estado': request.GET.get('estado', ''), 'orden': request.GET.get('orden', '')},
+    )
 
 @personal_medico_required
 def exportar_medicamentos_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="listado_medicamentos_{}.xlsx"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Medicamentos"
-    ws.freeze_panes = 'A2'
-    headers = ['Código', 'Nombre', 'Descripción', 'Categoría', 'Proveedor', 'Precio Unitario', 'Stock Mínimo']
-    ws.append(headers)
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="0d6efd", end_color="0d6efd", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
     medicamentos = Medicamento.objects.select_related('categoria', 'proveedor').all().order_by('nombre')
-    for med in medicamentos:
-        ws.append([med.codigo, med.nombre, med.descripcion, med.categoria.nombre, med.proveedor.nombre, med.precio_unitario, med.stock_minimo])
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except: pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-    wb.save(response)
-    return response
+    filas = (
+        [med.codigo, med.nombre, med.descripcion, med.categoria.nombre, med.proveedor.nombre, med.precio_unitario, med.stock_minimo]
+        for med in medicamentos.iterator(chunk_size=tamano_lote())
+    )
+    headers = ['Código', 'Nombre', 'Descripción', 'Categoría', 'Proveedor', 'Precio Unitario', 'Stock Mínimo']
+    return exportar_excel(
+        'listado_medicamentos_{}.xlsx'.format(datetime.datetime.now().strftime("%Y%m%d")),
+        "Medicamentos", headers, filas,
+        request=request, tipo='medicamentos',
+    )
 
 @personal_medico_required
 def exportar_proveedores_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="listado_proveedores_{}.xlsx"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Proveedores"
-    ws.freeze_panes = 'A2'
-    headers = ['Nombre', 'Contacto', 'Teléfono', 'Email', 'Dirección']
-    ws.append(headers)
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="0d6efd", end_color="0d6efd", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
     proveedores = Proveedor.objects.all().order_by('nombre')
-    for p in proveedores:
-        ws.append([p.nombre, p.contacto, p.telefono, p.email, p.direccion])
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except: pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-    wb.save(response)
-    return response
+    filas = (
+        [p.nombre, p.contacto, p.telefono, p.email, p.direccion]
+        for p in proveedores.iterator(chunk_size=tamano_lote())
+    )
+    headers = ['Nombre', 'Contacto', 'Teléfono', 'Email', 'Dirección']
+    return exportar_excel(
+        'listado_proveedores_{}.xlsx'.format(datetime.datetime.now().strftime("%Y%m%d")),
+        "Proveedores", headers, filas,
+        request=request, tipo='proveedores',
+    )
 
 @personal_medico_required
 def exportar_categorias_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="listado_categorias_{}.xlsx"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Categorías"
-    ws.freeze_panes = 'A2'
-    headers = ['Nombre', 'Descripción']
-    ws.append(headers)
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="0d6efd", end_color="0d6efd", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
     categorias = Categoria.objects.all().order_by('nombre')
-    for cat in categorias:
-        ws.append([cat.nombre, cat.descripcion])
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except: pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-    wb.save(response)
-    return response
+    filas = (
+        [cat.nombre, cat.descripcion]
+        for cat in categorias.iterator(chunk_size=tamano_lote())
+    )
+    headers = ['Nombre', 'Descripción']
+    return exportar_excel(
+        'listado_categorias_{}.xlsx'.format(datetime.datetime.now().strftime("%Y%m%d")),
+        "Categorías", headers, filas,
+        request=request, tipo='categorias',
+    )
 
 @personal_medico_required
 def exportar_inventario_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="reporte_inventario_{}.xlsx"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Inventario"
-    ws.freeze_panes = 'A2'
-    headers = ['Medicamento', 'Código', 'Lote', 'Cantidad', 'Fecha de Ingreso', 'Fecha de Caducidad', 'Estado']
-    ws.append(headers)
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="0d6efd", end_color="0d6efd", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
     inventario = Inventario.objects.select_related('medicamento').all().order_by('-created_at')
-    for item in inventario:
-        ws.append([
+    filas = (
+        [
             item.medicamento.nombre,
             item.medicamento.codigo,
             item.lote or 'N/A',
@@ -504,31 +328,27 @@ def exportar_inventario_excel(request):
             item.created_at.strftime('%d/%m/%Y'),
             item.fecha_caducidad.strftime('%d/%m/%Y') if item.fecha_caducidad else 'N/A',
             item.estado
-        ])
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except: pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-    wb.save(response)
-    return response
+        ]
+        for item in inventario.iterator(chunk_size=tamano_lote())
+    )
+    headers = ['Medicamento', 'Código', 'Lote', 'Cantidad', 'Fecha de Ingreso', 'Fecha de Caducidad', 'Estado']
+    return exportar_excel(
+        'reporte_inventario_{}.xlsx'.format(datetime.datetime.now().strftime("%Y%m%d")),
+        "Inventario", headers, filas,
+        request=request, tipo='inventario',
+    )
 
 
 # Vistas para Movimientos
 @personal_medico_required
 def listar_movimientos(request):
-    movimientos_list = MovimientoInventario.objects.select_related('medicamento').all().order_by('-fecha')
-    paginator = Paginator(movimientos_list, 10)
-    page_number = request.GET.get('page')
-    movimientos = paginator.get_page(page_number)
+    movimientos_list = MovimientoInventario.objects.select_related('medicamento').all()
+    paginator = KeysetPaginator(movimientos_list, ('-fecha', '-id'), 10, total='aproximado')
+    movimientos = paginator.get_page(request.GET.get('cursor'))
     return render(request, 'inventario/movimientos/listar.html', {'movimientos': movimientos})
 
 @personal_medico_required
+@atomic_con_reintentos
 def crear_salida_inventario(request):
     if request.method == 'POST':
         form = MovimientoSalidaForm(request.POST)
@@ -537,16 +357,20 @@ def crear_salida_inventario(request):
             cantidad = form.cleaned_data['cantidad']
             descripcion = form.cleaned_data['descripcion']
 
-            MovimientoInventario.objects.create(
-                medicamento=medicamento,
-                tipo='salida',
-                cantidad=cantidad,
-                descripcion=descripcion,
-                usuario=request.user.username
-            )
-            
-            messages.success(request, f'Salida de {cantidad} unidad(es) de {medicamento.nombre} registrada exitosamente.')
-            return redirect('inventario:listar_movimientos')
+            # Bloquear el saldo para que dos salidas simultáneas no lo dejen en negativo
+            saldo = StockMedicamento.objects.select_for_update().filter(medicamento=medicamento).first()
+            disponible = saldo.cantidad if saldo else 0
+            if cantidad <= disponible:
+                MovimientoInventario.objects.create(
+                    medicamento=medicamento,
+                    tipo='salida',
+                    cantidad=cantidad,
+                    descripcion=descripcion,
+                    usuario=request.user.username
+                )
+                messages.success(request, f'Salida de {cantidad} unidad(es) de {medicamento.nombre} registrada exitosamente.')
+                return redirect('inventario:listar_movimientos')
+            form.add_error(None, f"No hay suficiente stock para '{medicamento.nombre}'. Stock actual: {disponible}.")
     else:
         form = MovimientoSalidaForm()
     
@@ -564,6 +388,7 @@ def index(request):
 # Vista para creación de medicamentos vía AJAX
 @login_required
 @require_POST
+@atomic_con_reintentos
 def crear_medicamento_ajax(request):
     data = request.POST.copy()
 
@@ -589,6 +414,7 @@ def crear_medicamento_ajax(request):
 
 @login_required
 @require_POST
+@atomic_con_reintentos
 def crear_categoria_ajax(request):
     try:
         data = json.loads(request.body)
@@ -604,6 +430,7 @@ def crear_categoria_ajax(request):
 
 @login_required
 @require_POST
+@atomic_con_reintentos
 def crear_proveedor_ajax(request):
     try:
         data = json.loads(request.body)
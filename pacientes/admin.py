@@ -1,4 +1,14 @@
-from django.contrib import admin
+import io
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .forms import ImportarPacientesForm
+from .importacion import ErrorImportacion, escribir_errores, importar
 from .models import Paciente, TipoDocumento, Pais, Estado, Ciudad, TipoTelefono, Direccion, Telefono
 
 @admin.register(TipoDocumento)
@@ -34,6 +44,58 @@ class PacienteAdmin(admin.ModelAdmin):
     list_filter = ('genero',)
     search_fields = ('nombre', 'apellido', 'numero_documento')
     readonly_fields = ('created_at', 'updated_at')
+    change_list_template = 'admin/pacientes/paciente/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='pacientes_paciente_importar'),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        """Sube un CSV/XLSX y lo importa con pacientes.importacion (lo mismo que `importar_pacientes`)."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        resultado = None
+        form = ImportarPacientesForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            tipo = form.cleaned_data['tipo_telefono']
+            try:
+                resultado = importar(
+                    archivo, archivo.name,
+                    omitir_existentes=form.cleaned_data['omitir_existentes'],
+                    tipo_telefono_defecto=tipo.nombre if tipo else None,
+                    simular=form.cleaned_data['simular'],
+                )
+            except ErrorImportacion as e:
+                form.add_error('archivo', str(e))
+            else:
+                accion = 'serían importados (simulación)' if form.cleaned_data['simular'] else 'importados'
+                messages.success(request, f'{resultado.filas} filas leídas, {resultado.creados} pacientes {accion}.')
+                if resultado.errores:
+                    messages.warning(request, f'{len(resultado.errores)} filas rechazadas.')
+                    if form.cleaned_data['descargar_errores']:
+                        return self._informe_errores(resultado)
+
+        limite = getattr(settings, 'IMPORTACION_ERRORES_VISIBLES', 200)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar pacientes',
+            'form': form,
+            'resultado': resultado,
+            'errores': resultado.errores[:limite] if resultado else [],
+        }
+        return TemplateResponse(request, 'admin/pacientes/paciente/importar.html', context)
+
+    def _informe_errores(self, resultado):
+        destino = io.StringIO()
+        escribir_errores(destino, resultado)
+        # BOM para que Excel abra el CSV como UTF-8
+        response = HttpResponse('\ufeff' + destino.getvalue(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="errores_importacion_pacientes.csv"'
+        return response
 
 @admin.register(Direccion)
 class DireccionAdmin(admin.ModelAdmin):
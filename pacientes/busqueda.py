@@ -0,0 +1,56 @@
+import re
+import unicodedata
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .models import Paciente, SinAcento
+
+# Cédula escrita solo con dígitos o con prefijo de nacionalidad (V-12345678, E12345678)
+PATRON_CEDULA = re.compile(r'^(?:[VvEe]-?)?(\d+)$')
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos, igual que SinAcento(Lower(...)) en la base de datos."""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def buscar_pacientes(query, queryset=None):
+    """
+    Busca pacientes por nombre, apellido o cédula y los devuelve ordenados por relevancia.
+
+    - Una cédula (solo dígitos) se resuelve por igualdad o prefijo sobre los índices que Django
+      crea para el campo único numero_documento (incluido el varchar_pattern_ops para LIKE).
+    - Un texto se compara sin acentos palabra por palabra, por subcadena o similitud de
+      trigramas, usando los índices GIN de pg_trgm.
+    """
+    pacientes = Paciente.objects.all() if queryset is None else queryset
+    query = (query or '').strip()
+    if not query:
+        return pacientes.none()
+
+    cedula = PATRON_CEDULA.match(query)
+    if cedula:
+        digitos = cedula.group(1)
+        if len(digitos) == Paciente._meta.get_field('numero_documento').max_length:
+            return pacientes.filter(numero_documento=digitos)
+        return pacientes.filter(numero_documento__startswith=digitos).order_by('numero_documento')
+
+    termino = normalizar(query)
+    pacientes = pacientes.annotate(
+        nombre_normalizado=SinAcento(Lower('nombre')),
+        apellido_normalizado=SinAcento(Lower('apellido')),
+    )
+    for palabra in termino.split():
+        pacientes = pacientes.filter(
+            Q(nombre_normalizado__contains=palabra) |
+            Q(apellido_normalizado__contains=palabra) |
+            Q(nombre_normalizado__trigram_word_similar=palabra) |
+            Q(apellido_normalizado__trigram_word_similar=palabra)
+        )
+
+    return pacientes.annotate(
+        relevancia=TrigramWordSimilarity(termino, 'nombre_normalizado') + TrigramWordSimilarity(termino, 'apellido_normalizado'),
+    ).order_by('-relevancia', 'apellido', 'nombre')
@@ -104,6 +104,16 @@ class PacienteForm(forms.ModelForm):
         return cleaned_data
 
 
+class PacienteImportacionForm(PacienteForm):
+    """
+    PacienteForm para validar filas de la importación masiva. La unicidad de la cédula no se
+    consulta fila por fila: la importación la comprueba por lotes contra la base y el archivo.
+    """
+
+    def validate_unique(self):
+        pass
+
+
 class DireccionForm(forms.ModelForm):
     class Meta:
         model = Direccion
@@ -136,6 +146,14 @@ class DireccionForm(forms.ModelForm):
     # Eliminamos las validaciones clean_ciudad y clean que dependían de la ciudad aquí
 
 
+def validar_numero_telefono(numero):
+    """Reglas del número de teléfono, compartidas con la importación masiva (pacientes.importacion)."""
+    if len(numero) != 11:
+        raise ValidationError('El número de teléfono debe tener exactamente 11 dígitos.')
+    if not numero.isdigit():
+        raise ValidationError('El número de teléfono solo debe contener dígitos.')
+
+
 class TelefonoForm(forms.ModelForm):
     class Meta:
         model = Telefono
@@ -159,10 +177,7 @@ class TelefonoForm(forms.ModelForm):
         numero = self.cleaned_data.get('numero')
         # La validación solo se aplica si se ingresa un número
         if numero:
-            if len(numero) != 11:
-                raise ValidationError('El número de teléfono debe tener exactamente 11 dígitos.')
-            if not numero.isdigit():
-                raise ValidationError('El número de teléfono solo debe contener dígitos.')
+            validar_numero_telefono(numero)
         # Si no se ingresa número y el campo no es obligatorio, se permite pasar
         return numero
 
@@ -185,4 +200,25 @@ class TipoTelefonoForm(forms.ModelForm):
         fields = ['nombre']
         widgets = {
             'nombre': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: Móvil, Casa, Trabajo'}),
-        }
\ No newline at end of file
+        }
+
+class ImportarPacientesForm(forms.Form):
+    """Carga masiva de pacientes desde el admin (ver pacientes.importacion)."""
+    archivo = forms.FileField(label='Archivo CSV o XLSX')
+    tipo_telefono = forms.ModelChoiceField(
+        queryset=TipoTelefono.objects.all(), required=False, label='Tipo de teléfono por defecto',
+        help_text='Se usa en las filas con teléfono pero sin tipo.'
+    )
+    omitir_existentes = forms.BooleanField(
+        required=False, label='Omitir cédulas ya registradas', help_text='Si no, se reportan como error.'
+    )
+    simular = forms.BooleanField(required=False, label='Solo validar (no guardar)')
+    descargar_errores = forms.BooleanField(
+        required=False, label='Descargar el informe de errores en CSV', help_text='Si hay filas rechazadas.'
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+            raise ValidationError('Formato no soportado: use un archivo .csv o .xlsx.')
+        return archivo
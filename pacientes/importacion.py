@@ -0,0 +1,331 @@
+import csv
+import datetime
+import io
+import itertools
+import unicodedata
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from core import estadisticas
+from .forms import PacienteImportacionForm, validar_numero_telefono
+from .models import Ciudad, Direccion, Paciente, Telefono, TipoTelefono
+
+# Encabezado normalizado del archivo -> campo. Se aceptan variantes habituales de las planillas.
+ALIAS = {
+    'cedula': 'numero_documento', 'numero_documento': 'numero_documento', 'documento': 'numero_documento',
+    'nombre': 'nombre', 'nombres': 'nombre',
+    'apellido': 'apellido', 'apellidos': 'apellido',
+    'fecha_nacimiento': 'fecha_nacimiento', 'fecha_de_nacimiento': 'fecha_nacimiento',
+    'genero': 'genero', 'sexo': 'genero',
+    'email': 'email', 'correo': 'email', 'correo_electronico': 'email',
+    'direccion': 'direccion', 'ciudad': 'ciudad', 'estado': 'estado', 'codigo_postal': 'codigo_postal',
+    'telefono': 'telefono', 'tipo_telefono': 'tipo_telefono',
+    'telefono_2': 'telefono_2', 'tipo_telefono_2': 'tipo_telefono_2',
+}
+OBLIGATORIAS = ('numero_documento', 'nombre', 'apellido', 'fecha_nacimiento')
+TELEFONOS = (('telefono', 'tipo_telefono'), ('telefono_2', 'tipo_telefono_2'))
+
+
+class ErrorImportacion(ValueError):
+    """El archivo no se puede procesar (formato o encabezados); los errores de fila van al informe."""
+
+
+@dataclass
+class Resultado:
+    filas: int = 0
+    creados: int = 0
+    omitidos: int = 0
+    errores: list = field(default_factory=list)  # [(fila, cédula, mensaje)]
+
+    def error(self, fila, cedula, mensaje):
+        self.errores.append((fila, cedula or '', mensaje))
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos ni espacios sobrantes: 'Teléfono 2' -> 'telefono_2'."""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return '_'.join(texto.lower().split())
+
+
+def tamano_lote():
+    return getattr(settings, 'IMPORTACION_TAMANO_LOTE', 1000)
+
+
+# --- Lectura --- #
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    primera = texto.readline()
+    # Excel en español exporta con punto y coma
+    delimitador = ';' if primera.count(';') > primera.count(',') else ','
+    yield from csv.reader(itertools.chain([primera], texto), delimiter=delimitador)
+
+
+def _filas_xlsx(archivo):
+    from openpyxl import load_workbook
+
+    # read_only: las filas se leen del XML a medida que se piden, sin cargar la hoja completa
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.worksheets[0].iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre):
+    """
+    Genera (número de fila, {campo: valor}) de un CSV o XLSX abierto en modo binario. La
+    primera fila son los encabezados; las columnas desconocidas se ignoran.
+    """
+    extension = nombre.rsplit('.', 1)[-1].lower() if '.' in nombre else ''
+    if extension == 'csv':
+        filas = _filas_csv(archivo)
+    elif extension in ('xlsx', 'xlsm'):
+        filas = _filas_xlsx(archivo)
+    else:
+        raise ErrorImportacion('Formato no soportado: use un archivo .csv o .xlsx.')
+
+    encabezados = next(filas, None)
+    if not encabezados:
+        raise ErrorImportacion('El archivo está vacío.')
+    campos = [ALIAS.get(normalizar(encabezado)) if encabezado is not None else None for encabezado in encabezados]
+    faltantes = [campo for campo in OBLIGATORIAS if campo not in campos]
+    if faltantes:
+        raise ErrorImportacion(f'Faltan columnas obligatorias: {", ".join(faltantes)}.')
+
+    for numero, valores in enumerate(filas, start=2):
+        if not any(valor not in (None, '') for valor in valores):
+            continue
+        yield numero, {campo: valor for campo, valor in zip(campos, valores) if campo}
+
+
+# --- Validación --- #
+
+def _texto(valor, digitos=None):
+    """
+    Celda a texto; los números enteros de Excel (p. ej. 12345678.0) se escriben sin decimales.
+    Solo con `digitos` se reponen los ceros a la izquierda que Excel quita: vale para los teléfonos,
+    que siempre empiezan por 0. Una cédula no se rellena: si no tiene 8 dígitos, la rechaza el formulario.
+    """
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    if isinstance(valor, int) and digitos:
+        return str(valor).zfill(digitos)
+    return str(valor).strip()
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime.datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, datetime.date):
+        return valor.isoformat()
+    return _texto(valor)
+
+
+def _genero(valor):
+    # 'M', 'F', 'Masculino', 'femenino'...
+    return _texto(valor)[:1].upper()
+
+
+class Mapas:
+    """Ciudades y tipos de teléfono en memoria: resolver una fila no consulta la base."""
+
+    def __init__(self, tipo_telefono_defecto=None):
+        self.ciudades = {}
+        self.ciudades_por_estado = {}
+        for id_ciudad, ciudad, estado in Ciudad.objects.values_list('id', 'nombre', 'estado__nombre'):
+            self.ciudades.setdefault(normalizar(ciudad), []).append(id_ciudad)
+            self.ciudades_por_estado[(normalizar(ciudad), normalizar(estado))] = id_ciudad
+        self.tipos_telefono = {normalizar(nombre): id_tipo for id_tipo, nombre in TipoTelefono.objects.values_list('id', 'nombre')}
+        self.tipo_defecto = None
+        if tipo_telefono_defecto:
+            self.tipo_defecto = self.tipos_telefono.get(normalizar(tipo_telefono_defecto))
+            if self.tipo_defecto is None:
+                raise ErrorImportacion(f'No existe el tipo de teléfono "{tipo_telefono_defecto}".')
+
+    def ciudad(self, nombre, estado):
+        if estado:
+            id_ciudad = self.ciudades_por_estado.get((normalizar(nombre), normalizar(estado)))
+            if id_ciudad is None:
+                raise ValidationError(f'No existe la ciudad "{nombre}" en el estado "{estado}".')
+            return id_ciudad
+        candidatas = self.ciudades.get(normalizar(nombre), [])
+        if not candidatas:
+            raise ValidationError(f'No existe la ciudad "{nombre}".')
+        if len(candidatas) > 1:
+            raise ValidationError(f'Hay varias ciudades "{nombre}": indique el estado.')
+        return candidatas[0]
+
+    def tipo_telefono(self, nombre):
+        if not nombre:
+            if self.tipo_defecto is None:
+                raise ValidationError('Falta el tipo de teléfono.')
+            return self.tipo_defecto
+        id_tipo = self.tipos_telefono.get(normalizar(nombre))
+        if id_tipo is None:
+            raise ValidationError(f'No existe el tipo de teléfono "{nombre}".')
+        return id_tipo
+
+
+def validar_fila(datos, mapas):
+    """
+    Valida una fila con las reglas de PacienteForm y de los teléfonos y devuelve
+    (Paciente sin guardar, datos de dirección o None, [(tipo_id, número)]).
+    Lanza ValidationError con todos los mensajes de la fila.
+    """
+    form = PacienteImportacionForm(data={
+        'numero_documento': _texto(datos.get('numero_documento')),
+        'nombre': _texto(datos.get('nombre')),
+        'apellido': _texto(datos.get('apellido')),
+        'fecha_nacimiento': _fecha(datos.get('fecha_nacimiento')),
+        'genero': _genero(datos.get('genero')) or 'M',
+        'email': _texto(datos.get('email')),
+    })
+    mensajes = [] if form.is_valid() else [
+        f'{form.fields[campo].label}: {" ".join(errores)}' if campo in form.fields else ' '.join(errores)
+        for campo, errores in form.errors.items()
+    ]
+
+    direccion = None
+    texto_direccion, nombre_ciudad = _texto(datos.get('direccion')), _texto(datos.get('ciudad'))
+    if texto_direccion or nombre_ciudad:
+        try:
+            if not texto_direccion:
+                raise ValidationError('Debe ingresar una dirección cuando selecciona una ciudad.')
+            if not nombre_ciudad:
+                raise ValidationError('Falta la ciudad de la dirección.')
+            codigo_postal = _texto(datos.get('codigo_postal'))
+            if len(codigo_postal) > 4:
+                raise ValidationError('El código postal no debe exceder los 4 caracteres.')
+            direccion = {
+                'ciudad_id': mapas.ciudad(nombre_ciudad, _texto(datos.get('estado'))),
+                'direccion': texto_direccion[:255],
+                'codigo_postal': codigo_postal or None,
+            }
+        except ValidationError as e:
+            mensajes.extend(f'Dirección: {mensaje}' for mensaje in e.messages)
+
+    telefonos = []
+    for campo_numero, campo_tipo in TELEFONOS:
+        numero = _texto(datos.get(campo_numero), digitos=11)
+        if not numero:
+            continue
+        try:
+            validar_numero_telefono(numero)
+            tipo_id = mapas.tipo_telefono(_texto(datos.get(campo_tipo)))
+        except ValidationError as e:
+            mensajes.extend(f'Teléfono: {mensaje}' for mensaje in e.messages)
+            continue
+        # unique_together (paciente, numero): el mismo número dos veces se carga una sola
+        if all(numero != existente for _, existente in telefonos):
+            telefonos.append((tipo_id, numero))
+
+    if mensajes:
+        raise ValidationError(mensajes)
+    return form.instance, direccion, telefonos
+
+
+# --- Carga --- #
+
+def _insertar(lote):
+    """Inserta un lote de (fila, paciente, dirección, teléfonos) con bulk_create, en una transacción."""
+    with transaction.atomic():
+        pacientes = Paciente.objects.bulk_create([paciente for _, paciente, _, _ in lote])
+        Direccion.objects.bulk_create([
+            Direccion(paciente=paciente, **direccion)
+            for paciente, (_, _, direccion, _) in zip(pacientes, lote) if direccion
+        ])
+        Telefono.objects.bulk_create([
+            Telefono(paciente=paciente, tipo_telefono_id=tipo_id, numero=numero, es_principal=indice == 0)
+            for paciente, (_, _, _, telefonos) in zip(pacientes, lote)
+            for indice, (tipo_id, numero) in enumerate(telefonos)
+        ])
+    return len(pacientes)
+
+
+def _cargar_lote(lote, resultado, omitir_existentes, simular):
+    # La unicidad de la cédula se comprueba contra la base una vez por lote, no por fila
+    existentes = set(Paciente.objects.filter(
+        numero_documento__in=[paciente.numero_documento for _, paciente, _, _ in lote]
+    ).values_list('numero_documento', flat=True))
+    nuevos = []
+    for item in lote:
+        cedula = item[1].numero_documento
+        if cedula in existentes:
+            if omitir_existentes:
+                resultado.omitidos += 1
+            else:
+                resultado.error(item[0], cedula, 'Ya existe un paciente con esta cédula.')
+        else:
+            nuevos.append(item)
+    if not nuevos:
+        return
+    if simular:
+        resultado.creados += len(nuevos)
+        return
+
+    try:
+        creados = _insertar(nuevos)
+    except IntegrityError:
+        # Otro proceso cargó alguna cédula entretanto: se reintenta fila por fila para aislar
+        # las que fallan sin perder el resto del lote
+        creados = 0
+        for item in nuevos:
+            try:
+                creados += _insertar([item])
+            except IntegrityError as e:
+                resultado.error(item[0], item[1].numero_documento, f'No se pudo guardar: {e}')
+    resultado.creados += creados
+
+    if creados:
+        # bulk_create no emite post_save: se ajustan aquí las estadísticas del dashboard
+        def aplicar():
+            estadisticas.ajustar(estadisticas.CLAVE_TOTAL_PACIENTES, creados)
+            estadisticas.invalidar(estadisticas.CLAVE_ULTIMOS_PACIENTES, estadisticas.CLAVE_ULTIMAS_CITAS)
+
+        transaction.on_commit(aplicar)
+
+
+def importar(archivo, nombre, omitir_existentes=False, tipo_telefono_defecto=None, simular=False):
+    """
+    Importa pacientes de un CSV/XLSX. Las filas inválidas se anotan en Resultado.errores y el
+    resto se carga en lotes de IMPORTACION_TAMANO_LOTE; un error de fila nunca aborta la carga.
+    Con `simular` se valida todo (también contra la base) sin escribir: `creados` cuenta los
+    pacientes que se habrían cargado.
+    """
+    mapas = Mapas(tipo_telefono_defecto)
+    resultado = Resultado()
+    maximo = tamano_lote()
+    vistos = set()
+    lote = []
+    for numero, datos in leer_filas(archivo, nombre):
+        resultado.filas += 1
+        try:
+            paciente, direccion, telefonos = validar_fila(datos, mapas)
+        except ValidationError as e:
+            resultado.error(numero, _texto(datos.get('numero_documento')), ' | '.join(e.messages))
+            continue
+        if paciente.numero_documento in vistos:
+            resultado.error(numero, paciente.numero_documento, 'Cédula repetida en el archivo.')
+            continue
+        vistos.add(paciente.numero_documento)
+
+        lote.append((numero, paciente, direccion, telefonos))
+        if len(lote) >= maximo:
+            _cargar_lote(lote, resultado, omitir_existentes, simular)
+            lote = []
+    if lote:
+        _cargar_lote(lote, resultado, omitir_existentes, simular)
+    return resultado
+
+
+def escribir_errores(destino, resultado):
+    """Informe CSV de las filas rechazadas (fila, cédula, error)."""
+    escritor = csv.writer(destino)
+    escritor.writerow(['fila', 'cedula', 'error'])
+    escritor.writerows(resultado.errores)
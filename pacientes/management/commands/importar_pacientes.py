@@ -0,0 +1,58 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.importacion import ErrorImportacion, escribir_errores, importar
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa pacientes (con dirección y hasta dos teléfonos) desde un CSV o XLSX. '
+        'Valida cada fila con las reglas del formulario de pacientes, carga por lotes con bulk_create '
+        'y deja las filas rechazadas en un informe CSV sin detener la carga.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Archivo .csv o .xlsx; la primera fila son los encabezados')
+        parser.add_argument('--errores', help='Ruta del informe CSV de filas rechazadas')
+        parser.add_argument('--omitir-existentes', action='store_true',
+                            help='Saltar las cédulas ya registradas en vez de reportarlas como error')
+        parser.add_argument('--tipo-telefono', help='Tipo de teléfono para las filas que no lo indican, p. ej. "Móvil"')
+        parser.add_argument('--simular', action='store_true', help='Solo validar, sin guardar nada')
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        if not ruta.exists():
+            raise CommandError(f'No existe el archivo {ruta}')
+
+        inicio = time.monotonic()
+        try:
+            with ruta.open('rb') as archivo:
+                resultado = importar(
+                    archivo, ruta.name,
+                    omitir_existentes=options['omitir_existentes'],
+                    tipo_telefono_defecto=options['tipo_telefono'],
+                    simular=options['simular'],
+                )
+        except ErrorImportacion as e:
+            raise CommandError(str(e))
+
+        accion = 'válidos (simulación, nada guardado)' if options['simular'] else 'importados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.filas} filas leídas, {resultado.creados} pacientes {accion} '
+            f'en {time.monotonic() - inicio:.1f} s'
+        ))
+        if resultado.omitidos:
+            self.stdout.write(self.style.NOTICE(f'{resultado.omitidos} cédulas ya registradas omitidas'))
+        if resultado.errores:
+            self.stdout.write(self.style.WARNING(f'{len(resultado.errores)} filas rechazadas'))
+            if options['errores']:
+                with open(options['errores'], 'w', encoding='utf-8', newline='') as destino:
+                    escribir_errores(destino, resultado)
+                self.stdout.write(self.style.NOTICE(f'Informe de errores en {options["errores"]}'))
+            else:
+                for fila, cedula, mensaje in resultado.errores[:20]:
+                    self.stdout.write(f'  Fila {fila} ({cedula or "sin cédula"}): {mensaje}')
+                if len(resultado.errores) > 20:
+                    self.stdout.write('  ... use --errores para obtener el informe completo')
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:40
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+import django.db.models.functions.text
+import pacientes.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0005_populate_venezuela_data'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        # unaccent() es STABLE; este envoltorio IMMUTABLE permite usarlo en índices
+        migrations.RunSQL(
+            """
+            CREATE OR REPLACE FUNCTION inmutable_unaccent(text) RETURNS text
+            AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+            LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+            """,
+            'DROP FUNCTION IF EXISTS inmutable_unaccent(text)',
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(pacientes.models.SinAcento(django.db.models.functions.text.Lower('nombre')), name='gin_trgm_ops'), name='pacientes_nombre_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(pacientes.models.SinAcento(django.db.models.functions.text.Lower('apellido')), name='gin_trgm_ops'), name='pacientes_apellido_trgm'),
+        ),
+    ]
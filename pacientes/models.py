@@ -1,6 +1,16 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Lower
 from django.core.exceptions import ValidationError
 
+class SinAcento(models.Func):
+    """
+    unaccent() envuelto en una función IMMUTABLE (creada en la migración 0006) para poder
+    usarlo en índices de expresión: 'Pérez' y 'perez' se comparan igual.
+    """
+    function = 'inmutable_unaccent'
+    output_field = models.TextField()
+
 class TipoDocumento(models.Model):
     nombre = models.CharField(max_length=50, unique=True)
     descripcion = models.TextField(blank=True, null=True)
@@ -108,6 +118,9 @@ class Paciente(models.Model):
         indexes = [
             models.Index(fields=['apellido', 'nombre']),
             models.Index(fields=['fecha_nacimiento']),
+            # Búsqueda por subcadena/similitud sin acentos (pg_trgm)
+            GinIndex(OpClass(SinAcento(Lower('nombre')), name='gin_trgm_ops'), name='pacientes_nombre_trgm'),
+            GinIndex(OpClass(SinAcento(Lower('apellido')), name='gin_trgm_ops'), name='pacientes_apellido_trgm'),
         ]
         verbose_name = 'Paciente'
         verbose_name_plural = 'Pacientes'
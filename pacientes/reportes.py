@@ -0,0 +1,7 @@
+from .models import Paciente
+
+
+def contexto_pacientes(parametros):
+    return {
+        'pacientes': Paciente.objects.all().select_related('direccion__ciudad__estado__pais').prefetch_related('telefonos__tipo_telefono').order_by('apellido', 'nombre'),
+    }
@@ -2,38 +2,34 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.db import transaction
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from io import BytesIO
+from django.http import JsonResponse
 import datetime
 import json
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from core.exportaciones import exportar_excel, tamano_lote
+from core.reportes import exportar_pdf
 
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
 from .models import Paciente, Pais, Estado, Ciudad, Direccion, Telefono
+from .busqueda import buscar_pacientes
 from .forms import PacienteForm, DireccionFormSet, TelefonoFormSet, TipoTelefonoForm
-from sistema_medico.settings import BASE_DIR
+from core.transacciones import atomic_con_reintentos, es_conflicto_serializacion
+from core.paginacion import KeysetPaginator
 from core.decorators import personal_medico_required
 
 # --- Vistas CRUD y de Búsqueda --- #
 
 @personal_medico_required
 def index(request):
-    pacientes_list = Paciente.objects.all().order_by('apellido', 'nombre')
-    paginator = Paginator(pacientes_list, 10)
-    page_number = request.GET.get('page')
-    pacientes = paginator.get_page(page_number)
+    paginator = KeysetPaginator(Paciente.objects.all(), ('apellido', 'nombre', 'id'), 10, total='aproximado')
+    pacientes = paginator.get_page(request.GET.get('cursor'))
     return render(request, 'pacientes/index.html', {'pacientes': pacientes})
 
 @personal_medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def create(request):
     if request.method == 'POST':
         paciente_form = PacienteForm(request.POST)
@@ -84,7 +80,7 @@ def show(request, paciente_id):
     })
 
 @personal_medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def edit(request, paciente_id):
     paciente = get_object_or_404(Paciente, id=paciente_id)
     if request.method == 'POST':
@@ -122,7 +118,7 @@ def edit(request, paciente_id):
     })
 
 @personal_medico_required
-@transaction.atomic
+@atomic_con_reintentos
 def destroy(request, paciente_id):
     paciente = get_object_or_404(Paciente, id=paciente_id)
     if request.method == 'POST':
@@ -135,9 +131,10 @@ def destroy(request, paciente_id):
 @personal_medico_required
 def search(request):
     query = request.GET.get('q', '')
-    pacientes = Paciente.objects.all().order_by('apellido', 'nombre')
     if query:
-        pacientes = pacientes.filter(Q(nombre__icontains=query) | Q(apellido__icontains=query) | Q(numero_documento__icontains=query))
+        pacientes = buscar_pacientes(query)
+    else:
+        pacientes = Paciente.objects.all().order_by('apellido', 'nombre')
     paginator = Paginator(pacientes, 10)
     page_number = request.GET.get('page')
     pacientes_page = paginator.get_page(page_number)
@@ -160,6 +157,7 @@ def cargar_ciudades(request):
 @login_required
 @require_http_methods(["POST"])
 @csrf_exempt
+@atomic_con_reintentos
 def crear_tipo_telefono_ajax(request):
     try:
         data = json.loads(request.body)
@@ -177,6 +175,9 @@ def crear_tipo_telefono_ajax(request):
                 'errors': form.errors
             }, status=400)
     except Exception as e:
+        # Los conflictos de serialización se reintentan en atomic_con_reintentos
+        if es_conflicto_serializacion(e):
+            raise
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -186,75 +187,33 @@ def crear_tipo_telefono_ajax(request):
 
 @personal_medico_required
 def exportar_pacientes_pdf(request):
-    pacientes = Paciente.objects.all().select_related('direccion__ciudad__estado__pais').prefetch_related('telefonos__tipo_telefono').order_by('apellido', 'nombre')
-    logo_path = str(BASE_DIR / 'static/img/logo.png')
-    
-    context = {
-        'pacientes': pacientes,
-        'logo_path': logo_path,
-        'generation_date': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    }
-
-    template = get_template('pacientes/pdf_template.html')
-    html = template.render(context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="dossier_pacientes_{}.pdf"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-        return response
-    
-    return HttpResponse("Error al generar el PDF.", status=400)
+    return exportar_pdf(request, 'pacientes')
 
 @personal_medico_required
 def exportar_pacientes_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="listado_pacientes_{}.xlsx"'.format(datetime.datetime.now().strftime("%Y%m%d"))
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Pacientes"
-    ws.freeze_panes = 'A2'
-    headers = ['Cédula', 'Nombre', 'Apellido', 'Fecha de Nacimiento', 'Edad', 'Género', 'Email', 'Dirección', 'Ciudad', 'Estado', 'País', 'Teléfonos']
-    ws.append(headers)
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="0d6efd", end_color="0d6efd", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
     pacientes = Paciente.objects.all().select_related('direccion__ciudad__estado__pais').prefetch_related('telefonos').order_by('apellido', 'nombre')
-    for paciente in pacientes:
-        direccion_obj = paciente.direccion
-        dir_completa, ciudad, estado, pais = "N/A", "N/A", "N/A", "N/A"
-        if direccion_obj:
-            dir_completa = direccion_obj.direccion
-            if direccion_obj.ciudad:
-                ciudad = direccion_obj.ciudad.nombre
-                if direccion_obj.ciudad.estado:
-                    estado = direccion_obj.ciudad.estado.nombre
-                    if direccion_obj.ciudad.estado.pais:
-                        pais = direccion_obj.ciudad.estado.pais.nombre
-        telefonos = ", ".join([t.numero for t in paciente.telefonos.all()])
-        ws.append([
-            paciente.numero_documento, paciente.nombre, paciente.apellido, paciente.fecha_nacimiento, paciente.edad,
-            paciente.get_genero_display(), paciente.email or 'N/A', dir_completa, ciudad, estado, pais, telefonos
-        ])
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-    wb.save(response)
-    return response
\ No newline at end of file
+
+    def filas():
+        for paciente in pacientes.iterator(chunk_size=tamano_lote()):
+            direccion_obj = paciente.direccion
+            dir_completa, ciudad, estado, pais = "N/A", "N/A", "N/A", "N/A"
+            if direccion_obj:
+                dir_completa = direccion_obj.direccion
+                if direccion_obj.ciudad:
+                    ciudad = direccion_obj.ciudad.nombre
+                    if direccion_obj.ciudad.estado:
+                        estado = direccion_obj.ciudad.estado.nombre
+                        if direccion_obj.ciudad.estado.pais:
+                            pais = direccion_obj.ciudad.estado.pais.nombre
+            telefonos = ", ".join([t.numero for t in paciente.telefonos.all()])
+            yield [
+                paciente.numero_documento, paciente.nombre, paciente.apellido, paciente.fecha_nacimiento, paciente.edad,
+                paciente.get_genero_display(), paciente.email or 'N/A', dir_completa, ciudad, estado, pais, telefonos
+            ]
+
+    headers = ['Cédula', 'Nombre', 'Apellido', 'Fecha de Nacimiento', 'Edad', 'Género', 'Email', 'Dirección', 'Ciudad', 'Estado', 'País', 'Teléfonos']
+    return exportar_excel(
+        'listado_pacientes_{}.xlsx'.format(datetime.datetime.now().strftime("%Y%m%d")),
+        "Pacientes", headers, filas(), centrar=True,
+        request=request, tipo='pacientes',
+    )
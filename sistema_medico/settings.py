@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'pacientes',
     'citas',
@@ -52,11 +53,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para que el tiempo medido incluya al resto de middlewares
+    'core.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.roles.RolMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -111,6 +115,121 @@ DATABASES = {
 }
 
 
+# Caché compartida por todos los procesos del servidor: las invalidaciones (versiones de
+# catálogos, estadísticas, disponibilidad, grupos de roles) deben verlas todos los workers.
+# En producción, Redis (REDIS_URL, p. ej. redis://localhost:6379/1): no consulta la base y su
+# incr() es atómico, así los contadores del dashboard se ajustan sin recontar. Sin REDIS_URL se
+# usa una tabla de la base (la crea la migración core.0004): cada acceso a la caché es una
+# consulta y los contadores se recalculan en vez de incrementarse (ver core.estadisticas.ajustar).
+# Nunca LocMemCache: es por proceso y cada worker serviría datos invalidados en otro.
+REDIS_URL = os.getenv('REDIS_URL', config('REDIS_URL', default=''))
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'sistema_medico',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_sistema_medico',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
+
+# Reintentos ante conflictos de serialización (ver core.transacciones)
+TRANSACCIONES_MAX_INTENTOS = 5
+TRANSACCIONES_ESPERA_BASE = 0.05  # segundos
+TRANSACCIONES_ESPERA_MAXIMA = 1.0  # segundos
+
+
+# Vigencia de las estadísticas cacheadas del dashboard (ver core.estadisticas)
+DASHBOARD_CACHE_TIMEOUT = 3600  # segundos
+
+
+# Contadores por estado del listado de citas; 0 desactiva la caché
+CITAS_ESTADISTICAS_TTL = 30  # segundos
+
+# Agenda: horario de atención por día de la semana (0 = lunes) y reglas de los turnos
+CITAS_HORARIO = {
+    0: [('08:00', '12:00'), ('13:00', '17:00')],
+    1: [('08:00', '12:00'), ('13:00', '17:00')],
+    2: [('08:00', '12:00'), ('13:00', '17:00')],
+    3: [('08:00', '12:00'), ('13:00', '17:00')],
+    4: [('08:00', '12:00'), ('13:00', '17:00')],
+}
+CITAS_DURACION_POR_DEFECTO = 30  # minutos, si el tipo de cita no tiene duración estimada
+CITAS_INTERVALO_TURNOS = 15  # minutos entre el inicio de dos turnos consecutivos
+CITAS_CAPACIDAD = 1  # citas simultáneas que puede atender el servicio
+CITAS_ESTADOS_LIBRES = ('Cancelada',)  # estados que no ocupan horario
+CITAS_DISPONIBILIDAD_MAX_DIAS = 31
+CITAS_DISPONIBILIDAD_CACHE_TIMEOUT = 300  # segundos; red de seguridad si se pierde una invalidación
+CITAS_CAMBIO_MASIVO_MAXIMO = 500  # citas por petición de cambio de estado masivo
+CITAS_CALENDARIO_MAX_DIAS = 62  # días que puede abarcar el calendario (JSON e ICS)
+
+# Vigencia de los catálogos cacheados (estados, tipos de cita, ...)
+CATALOGOS_CACHE_TIMEOUT = 3600  # segundos
+CATALOGOS_REVISION_VERSION = 5  # segundos entre lecturas de la versión en la caché compartida
+
+
+# Búsqueda global (ver core.busqueda)
+BUSQUEDA_CONCURRENTE = False  # True: categorías en paralelo, cada una con su conexión (no en pruebas)
+BUSQUEDA_MAX_HILOS = 6
+SEARCH_TYPEAHEAD_PRESUPUESTO_MS = 300
+
+# Exportaciones a Excel (libros write-only recorriendo los querysets por lotes)
+EXPORTACION_TAMANO_LOTE = 2000
+EXPORTACION_MUESTRA_ANCHOS = 200  # filas usadas para calcular el ancho de las columnas
+
+# Cola de reportes PDF (se procesa con `python manage.py procesar_exportaciones`)
+EXPORTACION_PDF_EN_SEGUNDO_PLANO = True  # False: generar el PDF dentro de la petición
+EXPORTACION_PROCESOS = 2
+EXPORTACION_INTERVALO = 2.0  # segundos entre consultas a la cola
+EXPORTACION_TIEMPO_MAXIMO = 600  # segundos antes de devolver a la cola un trabajo colgado
+EXPORTACION_MAX_INTENTOS = 3  # intentos antes de marcar con error un trabajo que cuelga o mata al proceso
+EXPORTACION_RETENCION_DIAS = 7
+# Archivos con datos de pacientes: fuera de MEDIA_ROOT, que se sirve públicamente
+EXPORTACION_DIR = BASE_DIR / 'privado' / 'exportaciones'
+
+# Caché en disco de reportes PDF/Excel, indexada por la huella de los datos de origen
+REPORTES_CACHE_ACTIVA = True
+REPORTES_CACHE_DIR = BASE_DIR / 'privado' / 'cache_reportes'
+REPORTES_CACHE_TAMANO_MAXIMO = 200 * 1024 * 1024  # bytes; se desalojan los menos usados
+
+# API de solo lectura (core.api)
+API_LIMITE_POR_DEFECTO = 100  # filas por página si no se indica ?limite=
+API_LIMITE_MAXIMO = 1000
+
+# Feed de cambios (core.cambios)
+CAMBIOS_MARGEN = 5  # segundos de holgura bajo la transacción abierta más antigua (diferencia de relojes)
+CAMBIOS_RETENCION_DIAS = 30  # antigüedad máxima de las lápidas de filas eliminadas
+
+# Instrumentación de consultas y latencia por vista (core.metricas)
+METRICAS_ACTIVAS = True
+METRICAS_VENTANA = 200  # últimas peticiones que se conservan por vista
+METRICAS_CONSULTAS_LENTAS = 5  # sentencias más lentas que se conservan por vista
+METRICAS_UMBRAL_REPETIDAS = 5  # veces que debe repetirse una consulta para señalarla como posible N+1
+
+
+# Importación masiva de pacientes (pacientes.importacion)
+IMPORTACION_TAMANO_LOTE = 1000  # pacientes por bulk_create
+IMPORTACION_ERRORES_VISIBLES = 200  # errores listados en la página del admin; el resto, en el informe CSV
+
+
+# Autenticación
+# PerfilBackend carga el perfil (y su rol) en la misma consulta que el usuario de la sesión.
+# ModelBackend se mantiene para las sesiones iniciadas antes de su introducción, que guardan
+# su ruta: siguen válidas (con una consulta más por petición) hasta que el usuario vuelva a entrar.
+AUTHENTICATION_BACKENDS = [
+    'core.roles.PerfilBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -154,6 +273,10 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Códigos automáticos de medicamentos (MED-0001, MED-0002, ...)
+MEDICAMENTO_CODIGO_PREFIJO = 'MED-'
+MEDICAMENTO_CODIGO_ANCHO = 4
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
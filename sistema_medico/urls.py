@@ -21,6 +21,9 @@ from django.conf import settings
 from django.conf.urls.static import static
 from types import MethodType
 
+from core import api
+from core.roles import rol
+
 def has_admin_permission(self, request):
     """
     Custom permission check for the admin site.
@@ -34,12 +37,8 @@ def has_admin_permission(self, request):
     if request.user.is_superuser:
         return True
     
-    # Custom role check for other staff members
-    if hasattr(request.user, 'perfilusuario') and request.user.perfilusuario.rol == 'admin':
-        return True
-        
-    # Deny access otherwise
-    return False
+    # Custom role check for other staff members (request.rol is loaded with the user, no extra query)
+    return rol(request) == 'admin'
 
 # Monkey-patch the has_permission method of the default admin site
 admin.site.has_permission = MethodType(has_admin_permission, admin.site)
@@ -51,6 +50,7 @@ urlpatterns = [
     path('citas/', include('citas.urls', namespace='citas')),
     path('historiales/', include('historiales.urls', namespace='historiales')),
     path('inventario/', include('inventario.urls', namespace='inventario')),
+    path(f'api/{api.VERSION}/', include('core.api_urls', namespace=f'api_{api.VERSION}')),
     path('accounts/', include('django.contrib.auth.urls')),
 ]
 